@@ -5,10 +5,15 @@ Works around dependency conflicts for all LLM providers
 """
 
 import os
+import sys
 from typing import Optional
 from dotenv import load_dotenv
 from langfuse import Langfuse
 
+# Prompt budgets live with the LangChain implementation
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'langchain_lucy'))
+from prompt_budget import PromptBudget
+
 # Load environment variables
 load_dotenv()
 
@@ -63,8 +68,14 @@ class LLMConfig:
                 )
                 self.provider_name = "Google Gemini"
                 
+            elif self.provider == "fake":
+                # Deterministic offline model for perf tests (see langchain_lucy/fake_llm.py)
+                from langchain_lucy.fake_llm import FakeChatModel
+                self.llm = FakeChatModel.from_env()
+                self.provider_name = "Fake LLM"
+                
             else:
-                raise ValueError(f"Unsupported LLM provider: {self.provider}. Supported: openai, anthropic, gemini")
+                raise ValueError(f"Unsupported LLM provider: {self.provider}. Supported: openai, anthropic, gemini, fake")
             
             return self.llm
             
@@ -80,21 +91,33 @@ class LucyAgent:
         self.llm_config.provider = llm_provider
         self.llm = self.llm_config.setup_llm()
         self.conversation_history = []
+        self.budget = PromptBudget()
         
-    def _call_llm(self, prompt):
-        """Unified LLM calling method"""
+    def _call_llm(self, agent, prompt):
+        """Unified LLM calling method; replies are capped at the agent's output budget"""
+        max_tokens = self.budget.max_output_tokens(agent)
+        prompt_tokens = self.budget.measure(agent, prompt)
         try:
             if self.llm_config.provider == "openai":
                 # Use direct OpenAI API
                 response = self.llm.chat.completions.create(
                     model="gpt-4o-mini",
                     messages=[{"role": "user", "content": prompt}],
-                    temperature=0.7
+                    temperature=0.7,
+                    max_tokens=max_tokens
                 )
-                return response.choices[0].message.content
+                content = response.choices[0].message.content
+                usage = response.usage
+                self.budget.record(agent, usage.prompt_tokens if usage else prompt_tokens,
+                                   usage.completion_tokens if usage else self.budget.count(content or ""))
+                return content
             else:
                 # Use LangChain for other providers
-                response = self.llm.invoke(prompt)
+                llm = self.llm.bind(max_tokens=max_tokens) if hasattr(self.llm, "bind") else self.llm
+                response = llm.invoke(prompt)
+                usage = getattr(response, "usage_metadata", None) or {}
+                self.budget.record(agent, usage.get("input_tokens") or prompt_tokens,
+                                   usage.get("output_tokens") or self.budget.count(response.content))
                 return response.content
         except Exception as e:
             return f"LLM call error: {str(e)}"
@@ -104,7 +127,7 @@ class LucyAgent:
         if self.llm is None:
             return "Error: LLM not configured properly"
             
-        prompt = f"""
+        prompt = self.budget.fit("photo_verifier", """
         You are Lucy's Photo Verification Specialist. Analyze this customer input for photo verification needs:
         
         Customer: {user_input}
@@ -116,16 +139,16 @@ class LucyAgent:
         4. Request specific location if not provided
         
         Respond as if you're guiding the customer through photo submission.
-        """
+        """, user_input=user_input)
         
-        return self._call_llm(prompt)
+        return self._call_llm("photo_verifier", prompt)
     
     def business_coach(self, user_input):
         """Simulate business coaching agent"""
         if self.llm is None:
             return "Error: LLM not configured properly"
             
-        prompt = f"""
+        prompt = self.budget.fit("business_coach", """
         You are Lucy's Business Development Coach. Help this customer with business goal setting:
         
         Customer: {user_input}
@@ -139,16 +162,16 @@ class LucyAgent:
         6. Loan Uses: Identify top 1-3 loan uses and confirm readiness
         
         Always deliver value before asking for information. Create tangible assets like promo copy, templates, or quick calculations.
-        """
+        """, user_input=user_input)
         
-        return self._call_llm(prompt)
+        return self._call_llm("business_coach", prompt)
     
     def underwriter(self, user_input):
         """Simulate loan underwriting agent"""
         if self.llm is None:
             return "Error: LLM not configured properly"
             
-        prompt = f"""
+        prompt = self.budget.fit("underwriter", """
         You are Lucy's Loan Underwriting Specialist. Assess this customer for loan eligibility:
         
         Customer: {user_input}
@@ -161,9 +184,9 @@ class LucyAgent:
         5. Generate formal offer with all required fields populated
         
         Critical path: B1 → B4 → E4b → E6 → L3 → L5 must be complete before offering.
-        """
+        """, user_input=user_input)
         
-        return self._call_llm(prompt)
+        return self._call_llm("underwriter", prompt)
     
     def run_lucy_workflow(self, user_input):
         """Run the complete Lucy workflow"""
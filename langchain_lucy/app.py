@@ -4,24 +4,48 @@ FastAPI backend for Lucy LangChain implementation
 Provides REST API for seamless customer-facing chat experience
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from typing import List, Optional, Dict, Any, Set, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import json
+import tempfile
+import time
 import uuid
 from datetime import datetime
 
 from lucy_ai import LucyAI, LucyState, LucyTask
+from lucy_logging import get_logger, log_context
+from session_store import SessionCache
+from photo_store import PhotoStore, MultipartPhotoReceiver, PhotoUploadError, PHOTO_ID_PREFIX
+from photo_index import PhotoIndex
+from photo_prep import PhotoPreprocessor
+from jobs import JobQueue
+import journal as session_journal
+import metrics
+
+logger = get_logger("app")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    startup()
+    yield
+    shutdown()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Lucy AI - Loan Officer & Business Partner",
     description="Seamless customer experience with multi-agent backend",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS for frontend integration
@@ -33,34 +57,278 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Lucy AI system
-lucy_ai = None
-try:
-    api_key = os.getenv("OPENAI_API_KEY", "demo-key")
-    print(f"Initializing Lucy AI with API key: {'***' + api_key[-4:] if len(api_key) > 4 else 'demo-key'}")
-    lucy_ai = LucyAI(api_key)
-    print("Lucy AI initialized successfully")
-except Exception as e:
-    print(f"Warning: Lucy AI initialization failed: {e}")
-    # Initialize anyway for demo mode
-    lucy_ai = LucyAI("demo-key")
-
-# In-memory session storage (use Redis in production)
-sessions: Dict[str, LucyState] = {}
+def _route_template(request: Request) -> str:
+    """Resolve the route path template so /session/{session_id} is one series"""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+    return "<unmatched>"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record per-route latency, status counts and in-flight requests"""
+    route = _route_template(request)
+    in_flight = metrics.HTTP_IN_FLIGHT.labels(route)
+    in_flight.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        metrics.HTTP_LATENCY.labels(route, request.method).observe(time.perf_counter() - started)
+        metrics.HTTP_REQUESTS.labels(route, request.method, status).inc()
+
+# Uploaded photos, stored once per content hash and referenced as ph_<hex> IDs
+photo_store = PhotoStore(
+    os.getenv("LUCY_PHOTO_DIR", os.path.join(tempfile.gettempdir(), "lucy-photos")),
+    max_bytes=int(os.getenv("LUCY_PHOTO_MAX_BYTES", str(10 * 1024 * 1024)))
+)
+PHOTO_MAX_FILES = int(os.getenv("LUCY_PHOTO_MAX_FILES", "10"))
+
+# Perceptual hashes of every uploaded photo, for duplicate detection across sessions
+photo_index = PhotoIndex(lambda photo: photo_store.path_for(photo) if photo in photo_store else None)
+
+# Vision-ready copies of uploaded photos, prepared in a process pool and cached
+photo_prep = PhotoPreprocessor(
+    os.path.join(photo_store.directory, "derived"),
+    photo_index.resolve,
+    workers=int(os.getenv("LUCY_PHOTO_PREP_WORKERS", "2")),
+    timeout=float(os.getenv("LUCY_PHOTO_PREP_TIMEOUT", "30"))
+)
+
+# Background workers for slow agent work (photo analysis); LUCY_JOB_WORKERS=0 runs it inline
+JOB_WORKERS = int(os.getenv("LUCY_JOB_WORKERS", "2"))
+jobs = JobQueue(workers=JOB_WORKERS)
+
+# Set by startup(), not at import: photo prep's spawned workers re-import the
+# main script, and must not start job workers or open the journal themselves
+lucy_ai: Optional[LucyAI] = None
+journal: Optional[session_journal.Journal] = None
+_started = False
+# The server's event loop, which owns the per-session side tables below
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Sessions pushed out of memory by the entry or byte budget; they stay in the
+# journal and are reloaded from it on their next request
+_spilled_sessions: Set[str] = set()
+
+def _on_session_evicted(session_id: str, state: LucyState, reason: str):
+    metrics.SESSION_EVICTIONS.labels(reason).inc()
+    logger.info("session evicted", extra={"fields": {"evicted_session_id": session_id, "reason": reason}})
+    _call_on_loop(_forget_session, session_id)
+    if journal is None:
+        return
+    # Only an expired session is gone for good; memory pressure says nothing about the customer
+    if reason == "idle":
+        journal.record_drop(session_id, reason, wait=False)
+    else:
+        _spilled_sessions.add(session_id)
+
+def _load_session(session_id: str) -> Optional[LucyState]:
+    """The stored session, reloaded from the journal if it was evicted under memory pressure
+    (blocking: call from the threadpool)"""
+    state = sessions.get(session_id)
+    if state is None and journal is not None and session_id in _spilled_sessions:
+        _spilled_sessions.discard(session_id)
+        state = journal.load(session_id)
+        if state is not None:
+            sessions[session_id] = state
+            metrics.SESSION_RELOADS.inc()
+            logger.info("session reloaded from journal", extra={"fields": {"reloaded_session_id": session_id}})
+    return state
+
+async def _find_session(session_id: str) -> Optional[LucyState]:
+    """_load_session for the event loop: only a spilled session touches the disk, on the threadpool"""
+    if session_id in _spilled_sessions and session_id not in sessions:
+        return await run_in_threadpool(_load_session, session_id)
+    return sessions.get(session_id)
+
+def _call_on_loop(callback, *args):
+    """Run callback on the event loop; the eviction hook also fires on threadpool threads"""
+    loop = _loop
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if loop is None or loop is running or loop.is_closed():
+        callback(*args)
+    else:
+        loop.call_soon_threadsafe(callback, *args)
+
+# In-memory session storage (use Redis in production), bounded by idle TTL,
+# entry count and an estimated byte budget
+sessions = SessionCache(
+    max_entries=int(os.getenv("LUCY_SESSION_MAX_ENTRIES", "10000")),
+    max_bytes=int(os.getenv("LUCY_SESSION_MAX_BYTES", str(256 * 1024 * 1024))),
+    idle_ttl=float(os.getenv("LUCY_SESSION_IDLE_TTL", str(3 * 24 * 3600))),  # journeys span 2-3 days
+    on_evict=_on_session_evicted
+)
+
+def startup() -> bool:
+    """Create the agents, start the job workers and recover journaled sessions
+
+    Runs once until shutdown(); returns False if the app was already started.
+    """
+    global lucy_ai, journal, _started, _loop
+    if _started:
+        return False
+    _started = True
+    try:
+        _loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _loop = None
+    if JOB_WORKERS > 0:
+        jobs.start()
+    
+    # Initialize Lucy AI system
+    try:
+        api_key = os.getenv("OPENAI_API_KEY", "demo-key")
+        logger.info("initializing lucy ai", extra={"fields": {"api_key": '***' + api_key[-4:] if len(api_key) > 4 else 'demo-key'}})
+        lucy_ai = LucyAI(api_key, photo_index=photo_index, photo_prep=photo_prep,
+                        jobs=jobs if JOB_WORKERS > 0 else None)
+    except Exception as e:
+        logger.warning("lucy ai initialization failed, falling back to demo mode", extra={"fields": {"error": str(e)}})
+        # Initialize anyway for demo mode
+        lucy_ai = LucyAI("demo-key", photo_index=photo_index, photo_prep=photo_prep,
+                        jobs=jobs if JOB_WORKERS > 0 else None)
+    
+    # Optional durable turn journal (LUCY_JOURNAL_DIR); sessions survive a restart
+    journal = session_journal.open_journal()
+    if journal is not None:
+        recovered = journal.recover()
+        journal.start()
+        for session_id, state in recovered.items():
+            sessions[session_id] = state
+            photo_index.add(state.customer_data.photos, state.session_id)
+            lucy_ai.sync_photo_analysis(state)  # re-queue analyses lost with the previous process
+    return True
+
+def shutdown():
+    global journal, _started, _loop
+    jobs.close()
+    photo_prep.close()
+    if journal is not None:
+        journal.close()
+        journal = None
+    _spilled_sessions.clear()
+    _started = False
+    _loop = None
+
+# Serializes turns per session while different sessions run concurrently.
+# Only touched on the event loop; a lock is dropped once no turn holds or
+# waits for it and its session is not stored
+_session_locks: Dict[str, asyncio.Lock] = {}
+_session_lock_users: Dict[str, int] = {}
+
+# Recent responses per session keyed by Idempotency-Key / client_message_id,
+# so a retried request is answered without running another turn
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("LUCY_IDEMPOTENCY_CACHE_SIZE", "32"))
+_recent_responses: Dict[str, "OrderedDict[str, Tuple[Tuple, ChatResponse]]"] = {}
+# Idempotency keys of requests that started a new session, so their retries land in it
+_new_session_keys: "OrderedDict[str, str]" = OrderedDict()
+
+# `Prefer: respond-async` on /chat: a turn still running after `wait` seconds
+# (default LUCY_DEFER_AFTER_S) is answered with 202 and a job to poll
+DEFER_AFTER_S = float(os.getenv("LUCY_DEFER_AFTER_S", "5"))
+
+# Open /session/{id}/events streams: session_id -> (loop, queue) per subscriber
+_event_subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, "asyncio.Queue"]]] = {}
+SSE_KEEPALIVE_S = 15.0
+
+def _publish_job_event(job):
+    """Job listener (runs on worker threads too): push the finished job to the session's streams"""
+    for loop, queue in list(_event_subscribers.get(job.session_id, ())):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, ("job", job.to_dict()))
+        except RuntimeError:
+            pass  # the stream's loop is already closed
+
+jobs.add_listener(_publish_job_event)
+
+# Photo analyses being written into their sessions; held so the tasks are not collected
+_analysis_saves: Set["asyncio.Task"] = set()
+
+def _on_photo_analysis_finished(job):
+    """Job listener: write a finished analysis into its session straight away, so it is
+    journaled even if the customer sends nothing more"""
+    if job.kind == "photo_analysis" and job.session_id and _loop is not None:
+        _call_on_loop(_start_analysis_save, job.session_id)
+
+def _start_analysis_save(session_id: str):
+    task = asyncio.ensure_future(_save_photo_analysis(session_id), loop=_loop)
+    _analysis_saves.add(task)
+    task.add_done_callback(_analysis_saves.discard)
+
+async def _save_photo_analysis(session_id: str):
+    async with _session_lock(session_id):
+        try:
+            await run_in_threadpool(_sync_photo_analysis, session_id)
+        except Exception:
+            logger.exception("saving photo analysis failed", extra={"fields": {"analysis_session_id": session_id}})
+
+def _sync_photo_analysis(session_id: str):
+    """Apply the session's finished analysis and journal it (blocking: call from the threadpool)"""
+    state = _load_session(session_id)
+    if state is None or lucy_ai is None:
+        return
+    before = session_journal.mark(state) if journal is not None else None
+    if not lucy_ai.sync_photo_analysis(state):
+        return
+    if journal is not None:
+        try:
+            journal.record_turn(session_id, before, state)
+        except session_journal.JournalWriteError:
+            # As for a chat turn: fall back to the journaled state, whose next turn retries
+            sessions.pop(session_id, None)
+            _spilled_sessions.add(session_id)
+            raise
+    sessions[session_id] = state
+
+jobs.add_listener(_on_photo_analysis_finished)
 
 # Pydantic models for API
 class ChatMessage(BaseModel):
     message: str
     photos: Optional[List[str]] = None
     session_id: Optional[str] = None
+    client_message_id: Optional[str] = None
+    # Only return what changed this turn: customer_data holds the changed keys
+    # and completed_tasks is null when unchanged
+    delta: bool = False
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
     current_task: str
-    completed_tasks: List[str]
+    completed_tasks: Optional[List[str]]
     customer_data: Dict[str, Any]
     agent_used: Optional[str] = None
+    version: int = 0
+    # Set in delta mode: the session version the changes apply to
+    base_version: Optional[int] = None
+
+class BatchChatRequest(BaseModel):
+    items: List[ChatMessage] = Field(..., min_length=1, max_length=100)
+
+class BatchChatItemResult(BaseModel):
+    index: int
+    session_id: str
+    status_code: int
+    result: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatItemResult]
+    succeeded: int
+    failed: int
+
+class DemoRequest(BaseModel):
+    count: int = Field(1, ge=1, le=200)
+    concurrency: int = Field(1, ge=1, le=32)
 
 class SessionInfo(BaseModel):
     session_id: str
@@ -68,6 +336,21 @@ class SessionInfo(BaseModel):
     completed_tasks: List[str]
     created_at: str
     customer_data: Dict[str, Any]
+    version: int = 0
+    # Background photo analysis: status, and the Photo Income Note once done
+    photo_analysis: Optional[Dict[str, Any]] = None
+
+# Scripted customer journey used by /demo and the load generator
+DEMO_CONVERSATION = [
+    {"message": "Hi, I need a loan for my shop", "photos": None},
+    {"message": "I have a grocery shop in Kawangware Market, Lane 3", "photos": ["demo1.jpg", "demo2.jpg"]},
+    {"message": "I run a small grocery selling household items", "photos": None},
+    {"message": "I love helping my community with fresh food at fair prices", "photos": None},
+    {"message": "I serve 25 customers daily and make 3000 KES per day", "photos": None},
+    {"message": "My challenge is running out of popular items", "photos": None},
+    {"message": "I want to use the loan for more stock and inventory", "photos": None},
+    {"message": "Yes, I'm ready for the offer!", "photos": None}
+]
 
 @app.get("/")
 async def root():
@@ -84,7 +367,12 @@ async def root():
         ],
         "endpoints": {
             "chat": "/chat",
-            "demo": "/demo (POST)",
+            "chat_batch": "/chat/batch (POST)",
+            "photos": "/photos (POST, multipart)",
+            "jobs": "/jobs/{id}",
+            "session_events": "/session/{id}/events (server-sent events)",
+            "demo": "/demo (POST, optional {count, concurrency})",
+            "metrics": "/metrics",
             "frontend": "/app",
             "docs": "/docs"
         }
@@ -96,96 +384,381 @@ async def get_frontend():
     return FileResponse("index.html", media_type="text/html")
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage):
-    """Main chat endpoint - customer sends message, gets Lucy's response"""
+async def chat(message: ChatMessage, idempotency_key: Optional[str] = Header(None),
+               prefer: Optional[str] = Header(None)):
+    """Main chat endpoint - customer sends message, gets Lucy's response
     
-    print(f"Received chat message: {message.message[:50]}...")
+    Retries carrying the same Idempotency-Key header (or client_message_id)
+    get the stored response instead of running the turn again. With
+    `Prefer: respond-async[, wait=N]` a turn that takes longer than N seconds
+    is answered with 202 and a job ID; the turn keeps running and its
+    response is available from /jobs/{id} and /session/{id}/events.
+    """
     
     if not lucy_ai:
-        print("Lucy AI system not available")
+        logger.error("lucy ai system not available")
         raise HTTPException(status_code=503, detail="Lucy AI system not available")
     
-    try:
-        # Get or create session
-        session_id = message.session_id or str(uuid.uuid4())
-        state = sessions.get(session_id)
+    key = idempotency_key or message.client_message_id
+    
+    # Get or create session
+    session_id = _resolve_session_id(message, key)
+    
+    defer_after = _async_preference(prefer)
+    if defer_after is None:
+        return await _run_turn(message, session_id, key)
+    
+    # The turn runs as its own task so it outlives this request if deferred
+    turn = asyncio.ensure_future(_run_turn(message, session_id, key))
+    done, _ = await asyncio.wait({turn}, timeout=defer_after)
+    if done:
+        return turn.result()
+    job = jobs.track("chat_turn", session_id)
+    turn.add_done_callback(lambda finished: _complete_deferred_turn(job, finished))
+    logger.info("chat turn deferred", extra={"fields": {"job_id": job.job_id, "after_s": defer_after}})
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.job_id, "status": job.status, "session_id": session_id},
+        headers={"Location": f"/jobs/{job.job_id}", "Preference-Applied": "respond-async"}
+    )
+
+def _async_preference(prefer: Optional[str]) -> Optional[float]:
+    """Seconds to wait before deferring, if the Prefer header asks for respond-async (RFC 7240)"""
+    if not prefer:
+        return None
+    preferences = [token.strip().lower() for token in prefer.split(",")]
+    if "respond-async" not in preferences:
+        return None
+    for preference in preferences:
+        if preference.startswith("wait="):
+            try:
+                return max(0.0, float(preference[len("wait="):]))
+            except ValueError:
+                break
+    return DEFER_AFTER_S
+
+def _complete_deferred_turn(job, finished: "asyncio.Future"):
+    if finished.cancelled():
+        jobs.complete(job, error="Turn cancelled")
+    elif finished.exception() is not None:
+        error = finished.exception()
+        jobs.complete(job, error=error.detail if isinstance(error, HTTPException) else str(error))
+    else:
+        jobs.complete(job, result=finished.result().model_dump())
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(batch: BatchChatRequest):
+    """Process a burst of gateway messages in one request
+    
+    Different sessions run concurrently; items for the same session run in
+    the order they appear. Each item gets its own result or error.
+    """
+    
+    if not lucy_ai:
+        logger.error("lucy ai system not available")
+        raise HTTPException(status_code=503, detail="Lucy AI system not available")
+    
+    # Group items by session, keeping their order; items without a session_id each start a new one
+    by_session: Dict[str, List[Tuple[int, ChatMessage]]] = {}
+    for index, item in enumerate(batch.items):
+        by_session.setdefault(_resolve_session_id(item, item.client_message_id), []).append((index, item))
+    
+    results: List[Optional[BatchChatItemResult]] = [None] * len(batch.items)
+    
+    async def run_session(session_id: str, items: List[Tuple[int, ChatMessage]]):
+        for index, item in items:
+            try:
+                response = await _run_turn(item, session_id)
+                results[index] = BatchChatItemResult(index=index, session_id=session_id,
+                                                     status_code=200, result=response)
+            except HTTPException as e:
+                results[index] = BatchChatItemResult(index=index, session_id=session_id,
+                                                     status_code=e.status_code, error=e.detail)
+    
+    await asyncio.gather(*(run_session(session_id, items) for session_id, items in by_session.items()))
+    
+    failed = sum(1 for result in results if result.error is not None)
+    return BatchChatResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+def _resolve_session_id(message: ChatMessage, key: Optional[str]) -> str:
+    """The message's session, or a new one (reused when a keyed first message is retried)"""
+    if message.session_id:
+        return message.session_id
+    if not key:
+        return str(uuid.uuid4())
+    session_id = _new_session_keys.get(key)
+    if session_id is None:
+        session_id = _new_session_keys[key] = str(uuid.uuid4())
+        while len(_new_session_keys) > IDEMPOTENCY_CACHE_SIZE * 64:
+            _new_session_keys.popitem(last=False)
+    return session_id
+
+async def _run_turn(message: ChatMessage, session_id: str, key: Optional[str] = None) -> ChatResponse:
+    """Run a turn on the threadpool, one turn at a time per session"""
+    key = key or message.client_message_id
+    unknown = [photo for photo in message.photos or () if photo.startswith(PHOTO_ID_PREFIX) and photo not in photo_store]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown photo IDs: {', '.join(unknown)}")
+    fingerprint = (message.message, tuple(message.photos or ()))
+    async with _session_lock(session_id):
+        # Checked under the lock so a concurrent duplicate waits for the original
+        cached = _recent_responses.get(session_id, {}).get(key) if key else None
+        if cached is not None:
+            if cached[0] != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency key reused with a different message")
+            metrics.IDEMPOTENT_REPLAYS.inc()
+            return cached[1]
         
-        print(f"Session ID: {session_id}, Existing state: {state is not None}")
+        # LucyAI.chat is blocking; keep it off the event loop
+        response = await run_in_threadpool(_chat_turn_with_context, message, session_id)
+        
+        if key:
+            recent = _recent_responses.setdefault(session_id, OrderedDict())
+            recent[key] = (fingerprint, response)
+            if len(recent) > IDEMPOTENCY_CACHE_SIZE:
+                recent.popitem(last=False)
+        return response
+
+@asynccontextmanager
+async def _session_lock(session_id: str):
+    """Hold the session's lock, so turns and other writes to it run one at a time"""
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    _session_lock_users[session_id] = _session_lock_users.get(session_id, 0) + 1
+    try:
+        async with lock:
+            yield
+    finally:
+        _release_session_lock(session_id)
+
+def _release_session_lock(session_id: str):
+    """Drop the session's lock after the last turn using it, unless the session was stored
+    (a first turn that failed, or a session evicted meanwhile, leaves nothing to serialize)"""
+    users = _session_lock_users.pop(session_id) - 1
+    if users:
+        _session_lock_users[session_id] = users
+    elif session_id not in sessions:
+        _session_locks.pop(session_id, None)
+
+def _forget_session(session_id: str):
+    """Drop per-session side tables once a session is deleted or evicted (event loop only)"""
+    if session_id not in _session_lock_users:
+        _session_locks.pop(session_id, None)
+    _recent_responses.pop(session_id, None)
+    for key in [key for key, owner in list(_new_session_keys.items()) if owner == session_id]:
+        _new_session_keys.pop(key, None)
+
+def _chat_turn_with_context(message: ChatMessage, session_id: str) -> ChatResponse:
+    with log_context(session_id=session_id):
+        return _chat_turn(message, session_id)
+
+def _customer_summary(state: LucyState) -> Dict[str, Any]:
+    """Customer fields exposed by the API"""
+    data = state.customer_data
+    return {
+        "business_type": data.business_type,
+        "location": data.location,
+        "what_they_love": data.what_they_love,
+        "daily_customers": data.daily_customers,
+        "daily_sales": data.daily_sales,
+        "challenge": data.challenge,
+        "loan_uses": list(data.loan_uses),
+        "photos_count": len(data.photos)
+    }
+
+def _session_etag(state: LucyState, analysis: Dict[str, Any]) -> str:
+    # A background job finishing changes the session without a new turn
+    return f'"{state.version}-{int(state.created_at * 1000):x}-{analysis.get("status", "none")}"'
+
+def _chat_turn(message: ChatMessage, session_id: str) -> ChatResponse:
+    """Run one chat turn for a session and build the API response"""
+    
+    try:
+        state = _load_session(session_id)
+        before = session_journal.mark(state) if journal is not None else None
+        # The state is updated in place, so take the delta baseline first
+        base = None
+        if message.delta and state is not None:
+            base = (state.version, _customer_summary(state), len(state.customer_data.completed_tasks))
+        logger.debug("chat message received", extra={"fields": {
+            "message_preview": message.message[:50],
+            "existing_session": state is not None
+        }})
         
         # Chat with Lucy
         response, updated_state = lucy_ai.chat(
             message=message.message,
             photos=message.photos,
-            state=state
+            state=state,
+            session_id=session_id
         )
         
-        print(f"Lucy response: {response[:100]}...")
-        print(f"Current task: {updated_state.current_task.value}")
+        logger.info("chat turn completed", extra={"fields": {
+            "current_task": updated_state.current_task.value,
+            "response_chars": len(response)
+        }})
         
-        # Save updated state
+        # Save updated state; with a journal the turn is durable before we answer
+        if journal is not None:
+            try:
+                journal.record_turn(session_id, before, updated_state, message.message, message.photos)
+            except session_journal.JournalWriteError:
+                # The turn changed the session in place: memory must not run ahead of the
+                # journal, so fall back to the last durable state on the next request
+                sessions.pop(session_id, None)
+                if before.exists:
+                    _spilled_sessions.add(session_id)
+                raise
         sessions[session_id] = updated_state
         
         # Determine which agent was used (for analytics)
         agent_used = lucy_ai._route_message(message.message, updated_state.current_task)
         
+        completed_tasks = [task.value for task in updated_state.customer_data.completed_tasks]
+        customer_data = _customer_summary(updated_state)
+        base_version = None
+        if message.delta:
+            # A new session's delta is everything, relative to version 0
+            base_version, base_data, base_completed = base or (0, {}, -1)
+            customer_data = {name: value for name, value in customer_data.items()
+                             if name not in base_data or base_data[name] != value}
+            if len(completed_tasks) == base_completed:
+                completed_tasks = None
+        
         return ChatResponse(
             response=response,
             session_id=session_id,
             current_task=updated_state.current_task.value,
-            completed_tasks=[task.value for task in updated_state.customer_data.completed_tasks],
-            customer_data={
-                "business_type": updated_state.customer_data.business_type,
-                "location": updated_state.customer_data.location,
-                "what_they_love": updated_state.customer_data.what_they_love,
-                "daily_customers": updated_state.customer_data.daily_customers,
-                "daily_sales": updated_state.customer_data.daily_sales,
-                "challenge": updated_state.customer_data.challenge,
-                "loan_uses": updated_state.customer_data.loan_uses,
-                "photos_count": len(updated_state.customer_data.photos)
-            },
-            agent_used=agent_used
+            completed_tasks=completed_tasks,
+            customer_data=customer_data,
+            agent_used=agent_used,
+            version=updated_state.version,
+            base_version=base_version
         )
         
     except Exception as e:
-        print(f"Chat error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        metrics.ERRORS.labels("chat", type(e).__name__).inc()
+        logger.exception("chat processing error")
         raise HTTPException(status_code=500, detail=f"Chat processing error: {str(e)}")
 
+@app.post("/photos")
+async def upload_photos(request: Request):
+    """Upload business photos as multipart/form-data (any field name, one or more files)
+    
+    The body is streamed to disk chunk by chunk, so large uploads never sit in
+    memory. Returns one photo_id per file to pass in /chat's `photos`.
+    """
+    
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and \
+            int(content_length) > photo_store.max_bytes * PHOTO_MAX_FILES + 64 * 1024:
+        raise HTTPException(status_code=413, detail="Upload too large")
+    
+    try:
+        receiver = MultipartPhotoReceiver(photo_store, request.headers.get("content-type", ""), PHOTO_MAX_FILES)
+        async for chunk in request.stream():
+            # Disk writes happen inside the parser callbacks; keep them off the event loop
+            await run_in_threadpool(receiver.feed, chunk)
+        photos = receiver.finish()
+    except PhotoUploadError as e:
+        metrics.PHOTO_UPLOADS.labels("rejected").inc()
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    for photo in photos:
+        metrics.PHOTO_UPLOADS.labels("duplicate" if photo["duplicate"] else "stored").inc()
+        metrics.PHOTO_UPLOAD_BYTES.inc(photo["bytes"])
+    logger.info("photos uploaded", extra={"fields": {
+        "count": len(photos),
+        "bytes": sum(photo["bytes"] for photo in photos),
+        "duplicates": sum(1 for photo in photos if photo["duplicate"])
+    }})
+    return {"photos": photos}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background job or deferred turn, with its result once done"""
+    
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+async def _session_events(session_id: str, request: Request):
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue" = asyncio.Queue()
+    subscriber = (loop, queue)
+    _event_subscribers.setdefault(session_id, []).append(subscriber)
+    try:
+        yield ": connected\n\n"
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event}\nid: {data['job_id']}\ndata: {json.dumps(data)}\n\n"
+    finally:
+        subscribers = _event_subscribers.get(session_id, [])
+        if subscriber in subscribers:
+            subscribers.remove(subscriber)
+        if not subscribers:
+            _event_subscribers.pop(session_id, None)
+
+@app.get("/session/{session_id}/events")
+async def session_events(session_id: str, request: Request):
+    """Server-sent events: a `job` event whenever a deferred turn or photo analysis of the session finishes"""
+    
+    if await _find_session(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return StreamingResponse(_session_events(session_id, request), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/session/{session_id}", response_model=SessionInfo)
-async def get_session(session_id: str):
-    """Get session information"""
+async def get_session(session_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    """Get session information
     
-    if session_id not in sessions:
+    Sends an ETag that changes with every turn; polling clients that send it
+    back in If-None-Match get an empty 304 while nothing has changed.
+    """
+    
+    state = await _find_session(session_id)
+    if state is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    state = sessions[session_id]
+    analysis = lucy_ai.photo_analysis_status(state)
+    etag = _session_etag(state, analysis)
+    if if_none_match and (if_none_match.strip() == "*" or
+                          etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     
     return SessionInfo(
         session_id=session_id,
         current_task=state.current_task.value,
         completed_tasks=[task.value for task in state.customer_data.completed_tasks],
-        created_at=datetime.now().isoformat(),  # In production, store actual creation time
-        customer_data={
-            "business_type": state.customer_data.business_type,
-            "location": state.customer_data.location,
-            "what_they_love": state.customer_data.what_they_love,
-            "daily_customers": state.customer_data.daily_customers,
-            "daily_sales": state.customer_data.daily_sales,
-            "challenge": state.customer_data.challenge,
-            "loan_uses": state.customer_data.loan_uses,
-            "photos_count": len(state.customer_data.photos)
-        }
+        created_at=datetime.fromtimestamp(state.created_at).isoformat(),
+        customer_data=_customer_summary(state),
+        version=state.version,
+        photo_analysis=analysis or None
     )
 
 @app.delete("/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session"""
     
-    if session_id not in sessions:
+    if session_id in _spilled_sessions:
+        _spilled_sessions.discard(session_id)
+        sessions.pop(session_id, None)
+    elif session_id not in sessions:
         raise HTTPException(status_code=404, detail="Session not found")
-    
-    del sessions[session_id]
+    else:
+        del sessions[session_id]
+    _forget_session(session_id)
+    if journal is not None:
+        journal.record_drop(session_id, wait=False)
     
     return {"message": f"Session {session_id} deleted successfully"}
 
@@ -193,6 +766,7 @@ async def delete_session(session_id: str):
 async def list_sessions():
     """List all active sessions"""
     
+    sessions.expire()
     session_list = []
     for session_id, state in sessions.items():
         session_list.append({
@@ -202,101 +776,147 @@ async def list_sessions():
             "business_type": state.customer_data.business_type or "Not specified"
         })
     
-    return {"sessions": session_list, "total": len(session_list)}
+    return {"sessions": session_list, "total": len(session_list), "cache": sessions.stats()}
 
 @app.get("/analytics")
 async def get_analytics():
     """Get system analytics"""
     
+    sessions.expire()
     if not sessions:
-        return {"message": "No sessions yet"}
+        return {"message": "No sessions yet", "session_cache": sessions.stats()}
     
     # Basic analytics
     task_distribution = {}
-    agent_usage = {"photo_verifier": 0, "business_coach": 0, "underwriter": 0}
-    
     for state in sessions.values():
         task = state.current_task.value
         task_distribution[task] = task_distribution.get(task, 0) + 1
-        
-        # Estimate agent usage based on task
-        if state.current_task in [LucyTask.B1]:
-            agent_usage["photo_verifier"] += 1
-        elif state.current_task in [LucyTask.E4A, LucyTask.E4B, LucyTask.E6]:
-            agent_usage["business_coach"] += 1
-        elif state.current_task in [LucyTask.B4, LucyTask.L3, LucyTask.L5, LucyTask.OFFER]:
-            agent_usage["underwriter"] += 1
+    
+    # Agent usage as measured by the agent call counters
+    agent_usage = {"photo_verifier": 0, "business_coach": 0, "underwriter": 0}
+    for (agent, _task), calls in metrics.AGENT_CALLS.collect().items():
+        agent_usage[agent] = agent_usage.get(agent, 0) + int(calls)
     
     return {
         "total_sessions": len(sessions),
         "task_distribution": task_distribution,
         "agent_usage": agent_usage,
+        "session_cache": sessions.stats(),
+        "jobs": jobs.stats(),
         "completion_stats": {
             "reached_offer": sum(1 for s in sessions.values() if s.current_task == LucyTask.OFFER),
             "avg_completed_tasks": sum(len(s.customer_data.completed_tasks) for s in sessions.values()) / len(sessions)
         }
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    
+    sessions.expire()
+    metrics.ACTIVE_SESSIONS.set(len(sessions))
+    metrics.SESSION_RESIDENT_BYTES.set(sessions.resident_bytes)
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+def _run_demo_journey(journey: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], LucyState, List[float]]:
+    """Drive one simulated customer through the journey, timing each turn"""
+    state = None
+    conversation_log = []
+    step_latencies = []
+    
+    for i, turn in enumerate(journey):
+        started = time.perf_counter()
+        response, state = lucy_ai.chat(
+            message=turn["message"],
+            photos=turn["photos"],
+            state=state
+        )
+        step_latencies.append(time.perf_counter() - started)
+        
+        conversation_log.append({
+            "step": i + 1,
+            "customer": turn["message"],
+            "lucy": response,
+            "current_task": state.current_task.value,
+            "completed_tasks": [task.value for task in state.customer_data.completed_tasks]
+        })
+    
+    return conversation_log, state, step_latencies
+
 @app.post("/demo")
-async def run_demo():
-    """Run a demonstration of the complete customer journey"""
+async def run_demo(demo: Optional[DemoRequest] = None):
+    """Run demonstrations of the complete customer journey
+    
+    Runs `count` simulated journeys with at most `concurrency` in flight and
+    returns the first transcript plus aggregate timing and per-step latency.
+    """
     
     if not lucy_ai:
         raise HTTPException(status_code=503, detail="Lucy AI system not available")
     
-    # Simulate a complete customer conversation
-    demo_conversation = [
-        {"message": "Hi, I need a loan for my shop", "photos": None},
-        {"message": "I have a grocery shop in Kawangware Market, Lane 3", "photos": ["demo1.jpg", "demo2.jpg"]},
-        {"message": "I run a small grocery selling household items", "photos": None},
-        {"message": "I love helping my community with fresh food at fair prices", "photos": None},
-        {"message": "I serve 25 customers daily and make 3000 KES per day", "photos": None},
-        {"message": "My challenge is running out of popular items", "photos": None},
-        {"message": "I want to use the loan for more stock and inventory", "photos": None},
-        {"message": "Yes, I'm ready for the offer!", "photos": None}
-    ]
+    demo = demo or DemoRequest()
+    semaphore = asyncio.Semaphore(demo.concurrency)
+    
+    async def run_one():
+        async with semaphore:
+            # LucyAI.chat is blocking, so journeys run on the threadpool
+            return await run_in_threadpool(_run_demo_journey, DEMO_CONVERSATION)
+    
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_one() for _ in range(demo.count)), return_exceptions=True)
+    duration = time.perf_counter() - started
+    
+    completed = [result for result in results if not isinstance(result, Exception)]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if isinstance(result, Exception):
+            errors[type(result).__name__] = errors.get(type(result).__name__, 0) + 1
+            metrics.ERRORS.labels("demo", type(result).__name__).inc()
     
+    if not completed:
+        first_error = next(result for result in results if isinstance(result, Exception))
+        raise HTTPException(status_code=500, detail=f"Demo failed: {str(first_error)}")
+    
+    reached_offer = sum(1 for _, final, _ in completed if final.current_task == LucyTask.OFFER)
+    per_step: Dict[int, List[float]] = {}
+    for _, _, step_latencies in completed:
+        for step, elapsed in enumerate(step_latencies, 1):
+            per_step.setdefault(step, []).append(elapsed)
+    
+    # Store the sample session
+    conversation_log, state, _ = completed[0]
     demo_session_id = f"demo_{uuid.uuid4()}"
-    state = None
-    conversation_log = []
+    sessions[demo_session_id] = state
+    if journal is not None:
+        journal.record_put(demo_session_id, state, wait=False)
     
-    try:
-        for i, turn in enumerate(demo_conversation):
-            response, state = lucy_ai.chat(
-                message=turn["message"],
-                photos=turn["photos"],
-                state=state
-            )
-            
-            conversation_log.append({
-                "step": i + 1,
-                "customer": turn["message"],
-                "lucy": response,
-                "current_task": state.current_task.value,
-                "completed_tasks": [task.value for task in state.customer_data.completed_tasks]
-            })
-        
-        # Store demo session
-        sessions[demo_session_id] = state
-        
-        return {
-            "demo_session_id": demo_session_id,
-            "conversation": conversation_log,
-            "final_state": {
-                "current_task": state.current_task.value,
-                "completed_tasks": [task.value for task in state.customer_data.completed_tasks],
-                "customer_data": {
-                    "business_type": state.customer_data.business_type,
-                    "location": state.customer_data.location,
-                    "daily_sales": state.customer_data.daily_sales,
-                    "loan_uses": state.customer_data.loan_uses
-                }
-            },
-            "success": state.current_task == LucyTask.OFFER
+    return {
+        "demo_session_id": demo_session_id,
+        "conversation": conversation_log,
+        "final_state": {
+            "current_task": state.current_task.value,
+            "completed_tasks": [task.value for task in state.customer_data.completed_tasks],
+            "customer_data": {
+                "business_type": state.customer_data.business_type,
+                "location": state.customer_data.location,
+                "daily_sales": state.customer_data.daily_sales,
+                "loan_uses": state.customer_data.loan_uses
+            }
+        },
+        "success": state.current_task == LucyTask.OFFER,
+        "summary": {
+            "count": demo.count,
+            "concurrency": demo.concurrency,
+            "completed": len(completed),
+            "reached_offer": reached_offer,
+            "success_rate": round(reached_offer / demo.count, 4),
+            "errors": errors,
+            "duration_s": round(duration, 3),
+            "journeys_per_s": round(len(completed) / (duration or 1e-9), 2),
+            "overall": metrics.latency_summary([sample for samples in per_step.values() for sample in samples]),
+            "per_step": {str(step): metrics.latency_summary(samples) for step, samples in sorted(per_step.items())}
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Demo failed: {str(e)}")
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -305,12 +925,12 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = "0.0.0.0"  # Must bind to 0.0.0.0 for Railway
     
-    print(f"🚀 Starting Lucy AI LangChain Backend on {host}:{port}")
-    print("📋 Available endpoints:")
-    print("  POST /chat - Main chat interface")
-    print("  GET /session/{id} - Session info")
-    print("  GET /sessions - List sessions")
-    print("  GET /analytics - System analytics")
-    print("  POST /demo - Run complete demo")
+    logger.info("starting lucy ai langchain backend", extra={"fields": {
+        "host": host,
+        "port": port,
+        "endpoints": ["POST /chat", "POST /chat/batch", "POST /photos", "GET /jobs/{id}",
+                      "GET /session/{id}/events", "GET /session/{id}", "GET /sessions", "GET /analytics",
+                      "GET /metrics", "POST /demo"]
+    }})
     
     uvicorn.run(app, host=host, port=port, log_level="info")
\ No newline at end of file
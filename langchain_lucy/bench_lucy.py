@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the pure-Python parts of a Lucy turn
+Times each hot path, stores baselines in bench_baseline.json and reports the
+change against them; --profile breaks a demo turn down by function
+"""
+
+from typing import Dict, List, Any, Callable, Optional, Sequence, Tuple
+from dataclasses import dataclass
+import argparse
+import copy
+import cProfile
+import io
+import json
+import os
+import pickle
+import platform
+import pstats
+import random
+import statistics
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Per-turn logs would otherwise flood the report; logging cost is still paid
+# up to the level check, as in production with INFO filtering DEBUG events
+os.environ.setdefault("LUCY_LOG_LEVEL", "WARNING")
+
+from lucy_ai import LucyAI, LucyState, LucyTask, CustomerData, LoanOffer
+from fake_llm import FakeChatModel
+from pricing import price_book, price_offer
+from photo_index import MultiIndexHash
+import state_codec
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+SALES_MESSAGES = [
+    "I serve 25 customers daily and make 3000 KES per day",
+    "About 40 customers, 8 thousand",
+    "I make 2500 shillings",
+    "Around 30 customers",
+    "Business is good these days",
+]
+LOCATION_MESSAGES = [
+    "I have a grocery shop in Kawangware Market, Lane 3",
+    "Gikomba",
+    "Hi, I need a loan for my shop",
+    "We sell vegetables and fruit every single day of the week to our customers",
+]
+LOAN_USE_MESSAGES = [
+    "I want to use the loan for more stock and inventory",
+    "Buy equipment and pay rent",
+    "To grow",
+    "ok",
+]
+
+
+@dataclass
+class Benchmark:
+    """One timed case: `prepare(n)` builds n argument tuples outside the timed loop"""
+    name: str
+    func: Callable[..., Any]
+    prepare: Callable[[int], List[Tuple]]
+    description: str = ""
+
+
+def _offline_lucy() -> LucyAI:
+    """LucyAI on an instant fake LLM, so timings never include network or sleeps"""
+    return LucyAI("demo-key", llm_provider="fake", llm=FakeChatModel("instant"))
+
+
+def _journey() -> List[Dict[str, Any]]:
+    from app import DEMO_CONVERSATION
+    return DEMO_CONVERSATION
+
+
+def _states_per_turn(lucy: LucyAI) -> List[Tuple[str, Optional[List[str]], LucyState]]:
+    """(message, photos, state-before-update) for every turn of the demo journey"""
+    turns = []
+    state = None
+    for turn in _journey():
+        if state is not None:
+            turns.append((turn["message"], turn["photos"], copy.deepcopy(state)))
+        _, state = lucy.chat(turn["message"], turn["photos"], state)
+    return turns
+
+
+def _offer_customer() -> CustomerData:
+    return CustomerData(
+        location="Kawangware Market, Lane 3", business_type="grocery",
+        daily_customers=25, daily_sales=3000, weekly_sales=21000,
+        loan_uses=["Purchase inventory/stock"],
+        completed_tasks=[LucyTask.B1, LucyTask.E4A, LucyTask.E4B, LucyTask.B4, LucyTask.E6, LucyTask.L3, LucyTask.L5]
+    )
+
+
+def _chat_response_payload(lucy: LucyAI) -> Dict[str, Any]:
+    response = ""
+    state = None
+    for turn in _journey():
+        response, state = lucy.chat(turn["message"], turn["photos"], state)
+    data = state.customer_data
+    return {
+        "response": response,
+        "session_id": "bench-session",
+        "current_task": state.current_task.value,
+        "completed_tasks": [task.value for task in data.completed_tasks],
+        "customer_data": {
+            "business_type": data.business_type,
+            "location": data.location,
+            "what_they_love": data.what_they_love,
+            "daily_customers": data.daily_customers,
+            "daily_sales": data.daily_sales,
+            "challenge": data.challenge,
+            "loan_uses": data.loan_uses,
+            "photos_count": len(data.photos)
+        },
+        "agent_used": "underwriter"
+    }
+
+
+def build_benchmarks() -> List[Benchmark]:
+    lucy = _offline_lucy()
+
+    def run_journey():
+        state = None
+        for turn in _journey():
+            _, state = lucy.chat(turn["message"], turn["photos"], state)
+
+    def update_all_turns(turns):
+        for message, photos, state in turns:
+            lucy._update_state("", message, photos, state)
+
+    def serialize_chat_response(payload):
+        from app import ChatResponse
+        ChatResponse(**payload).model_dump_json()
+
+    turn_template = _states_per_turn(lucy)
+    customer = _offer_customer()
+    offer = LoanOffer.issue(price_offer(customer.daily_sales))
+    payload = _chat_response_payload(lucy)
+    book = [float(i % 20000) for i in range(10000)]
+    
+    # 100k indexed photos; queries are a mix of near-duplicates and new photos
+    rng = random.Random(42)
+    photo_hashes = MultiIndexHash()
+    for photo in range(100000):
+        photo_hashes.add(rng.getrandbits(64), photo)
+    photo_queries = [rng.getrandbits(64) for _ in range(50)] + \
+        [value ^ (1 << rng.randrange(64)) for value in rng.sample(list(photo_hashes._values), 50)]
+
+    # A session that has reached OFFER and been shown its offer
+    state = None
+    for turn in _journey():
+        _, state = lucy.chat(turn["message"], turn["photos"], state)
+    lucy.chat("Show me my offer", None, state)
+    snapshot = state_codec.encode(state)
+    pickled = pickle.dumps(state, pickle.HIGHEST_PROTOCOL)
+
+    def repeat(args: Tuple) -> Callable[[int], List[Tuple]]:
+        return lambda n: [args] * n
+
+    def cycle(values: Sequence[Any]) -> Callable[[int], List[Tuple]]:
+        return lambda n: [(values[i % len(values)],) for i in range(n)]
+
+    return [
+        Benchmark("chat_demo_journey", run_journey, repeat(()),
+                  "LucyAI.chat over the 8-turn demo journey (instant fake LLM)"),
+        Benchmark("update_state_journey", update_all_turns,
+                  lambda n: [(copy.deepcopy(turn_template),) for _ in range(n)],
+                  "_update_state for each turn of the demo journey"),
+        Benchmark("extract_sales_data", lucy._extract_sales_data, cycle(SALES_MESSAGES)),
+        Benchmark("extract_location", lucy._extract_location, cycle(LOCATION_MESSAGES)),
+        Benchmark("extract_loan_uses", lucy._extract_loan_uses, cycle(LOAN_USE_MESSAGES)),
+        Benchmark("generate_loan_offer", lucy.underwriter.generate_loan_offer, repeat((customer, offer)),
+                  "UnderwriterAgent.generate_loan_offer rendering a stored offer"),
+        Benchmark("price_book_10k", price_book, repeat((book,)),
+                  "pricing.price_book over 10,000 customers"),
+        Benchmark("state_encode", state_codec.encode, repeat((state,)),
+                  f"state_codec.encode of an OFFER-stage session ({len(snapshot)} bytes)"),
+        Benchmark("state_decode", state_codec.decode, repeat((snapshot,)),
+                  "state_codec.decode of the same session"),
+        Benchmark("state_pickle_dumps", lambda obj: pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), repeat((state,)),
+                  f"pickle.dumps of the same session for comparison ({len(pickled)} bytes)"),
+        Benchmark("state_pickle_loads", pickle.loads, repeat((pickled,)),
+                  "pickle.loads for comparison"),
+        Benchmark("chat_response_serialize", serialize_chat_response, repeat((payload,)),
+                  "ChatResponse validation + JSON serialization"),
+        Benchmark("photo_index_search_100k", photo_hashes.search, cycle(photo_queries),
+                  "Near-duplicate lookup (<= 6 bits) among 100,000 photo hashes"),
+    ]
+
+
+def time_benchmark(bench: Benchmark, repeats: int = 7, min_time: float = 0.05) -> Dict[str, float]:
+    """Per-call time in microseconds: median and min over `repeats` timed batches"""
+    # Calibrate a batch size that runs for at least min_time
+    number = 1
+    while True:
+        batch = bench.prepare(number)
+        started = time.perf_counter()
+        for args in batch:
+            bench.func(*args)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if elapsed * 10 > min_time else 10
+
+    samples = []
+    for _ in range(repeats):
+        batch = bench.prepare(number)
+        started = time.perf_counter()
+        for args in batch:
+            bench.func(*args)
+        samples.append((time.perf_counter() - started) / number * 1e6)
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "calls_per_batch": number,
+    }
+
+
+def run_benchmarks(selected: Optional[Sequence[str]] = None, repeats: int = 7) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for bench in build_benchmarks():
+        if selected and bench.name not in selected:
+            continue
+        results[bench.name] = time_benchmark(bench, repeats=repeats)
+    return results
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results: Dict[str, Dict[str, float]], path: str = BASELINE_PATH):
+    """Store results in the baseline, keeping other benchmarks' entries and any
+    per-benchmark tolerance already set there"""
+    stored = load_baseline(path).get("results", {})
+    merged = dict(stored)
+    for name, result in results.items():
+        entry = dict(result)
+        if "tolerance" in stored.get(name, {}):
+            entry["tolerance"] = stored[name]["tolerance"]
+        merged[name] = entry
+    baseline = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "recorded_at": time.strftime("%Y-%m-%d"),
+        },
+        "results": merged,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any],
+            threshold: float = 0.15) -> Tuple[str, List[str]]:
+    """Text report against the baseline plus the names that regressed beyond threshold
+
+    Compares the fastest batch: on a shared machine the minimum is far less
+    noisy than the median, which the report still shows for context. A baseline
+    entry's "tolerance" replaces the threshold for that benchmark.
+    """
+    base_results = baseline.get("results", {})
+    lines = [f"{'benchmark':<26}{'baseline us':>14}{'current us':>14}{'median us':>12}{'change':>10}"]
+    regressions = []
+    for name, current in results.items():
+        base = base_results.get(name)
+        if not base:
+            lines.append(f"{name:<26}{'-':>14}{current['min_us']:>14.3f}{current['median_us']:>12.3f}{'new':>10}")
+            continue
+        change = current["min_us"] / base["min_us"] - 1
+        flag = ""
+        if change > base.get("tolerance", threshold):
+            regressions.append(name)
+            flag = "  REGRESSION"
+        lines.append(f"{name:<26}{base['min_us']:>14.3f}{current['min_us']:>14.3f}"
+                     f"{current['median_us']:>12.3f}{change:>+10.1%}{flag}")
+    if baseline.get("meta"):
+        meta = baseline["meta"]
+        lines.append(f"\nBaseline: Python {meta.get('python')} on {meta.get('machine')}, {meta.get('recorded_at')}")
+    return "\n".join(lines), regressions
+
+
+def profile_turns(journeys: int = 200, limit: int = 25) -> str:
+    """cProfile the demo journey and show where per-turn time goes"""
+    lucy = _offline_lucy()
+    journey = _journey()  # import the app before profiling starts
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for _ in range(journeys):
+        state = None
+        for turn in journey:
+            _, state = lucy.chat(turn["message"], turn["photos"], state)
+    profiler.disable()
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("tottime").print_stats(limit)
+    return out.getvalue()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark Lucy's per-turn hot paths")
+    parser.add_argument("names", nargs="*", help="only run these benchmarks")
+    parser.add_argument("--save", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON path")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="regression threshold (0.15 = +15%%) for benchmarks without their own tolerance")
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit 1 if any benchmark regressed")
+    parser.add_argument("--profile", action="store_true", help="profile demo journeys instead of benchmarking")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        print(profile_turns())
+        return 0
+
+    results = run_benchmarks(args.names, args.repeats)
+    report, regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    print(report)
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"\nBaseline saved to {args.baseline}")
+    if regressions and args.fail_on_regression:
+        print(f"\nRegressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
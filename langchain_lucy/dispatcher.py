@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Lucy 2.0 - Session-affinity dispatcher
+Front proxy that consistent-hashes session_id onto a set of uvicorn workers,
+so every turn of a session lands on the worker that holds it in memory
+
+Workers share nothing but the photo directory: each has its own journal and
+photo index. A session is only reachable through the worker that journaled
+it, so keep the worker list stable (spawned workers reuse their journal
+directory by LUCY_WORKER_ID), and duplicate photos are only detected among
+sessions on the same worker.
+"""
+
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from lucy_logging import get_logger
+import metrics
+
+logger = get_logger("dispatcher")
+
+# Headers that describe a single hop and must not be forwarded as-is
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailers",
+    "transfer-encoding", "upgrade", "host", "content-length", "content-encoding",
+}
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes
+
+    Adding or removing a worker only moves the sessions that hashed to it.
+    """
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = 128):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        for replica in range(self.vnodes):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.remove(node)
+        keep = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in keep]
+        self._owners = [owner for _, owner in keep]
+
+    def node_for(self, key: str) -> str:
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+def _forward_headers(headers) -> Dict[str, str]:
+    return {name: value for name, value in headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+
+
+def merge_metrics(expositions: Dict[str, str]) -> str:
+    """Combine workers' Prometheus text into one exposition, adding a `worker`
+    label to every sample and keeping each family's HELP/TYPE lines once"""
+    families: "OrderedDict[str, Tuple[List[str], List[str]]]" = OrderedDict()
+    for worker, text in expositions.items():
+        label = 'worker="{}"'.format(worker.replace("\\", "\\\\").replace('"', '\\"'))
+        family = None
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            if line.startswith("#"):
+                parts = line.split(None, 3)
+                if len(parts) >= 3 and parts[1] in ("HELP", "TYPE"):
+                    family = parts[2]
+                    header, _ = families.setdefault(family, ([], []))
+                    if not any(existing.split(None, 2)[1] == parts[1] for existing in header):
+                        header.append(line)
+                continue
+            name_end = min(index for index in (line.find("{"), line.find(" ")) if index != -1)
+            name, rest = line[:name_end], line[name_end:]
+            if rest.startswith("{}"):
+                rest = rest[2:]
+            if rest.startswith("{"):
+                sample = f"{name}{{{label},{rest[1:]}"
+            else:
+                sample = f"{name}{{{label}}}{rest}"
+            families.setdefault(family or name, ([], []))[1].append(sample)
+    lines: List[str] = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def merge_analytics(reports: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum the workers' /analytics counts; each worker's own report is kept under `workers`"""
+    total = 0
+    completed = 0.0
+    reached_offer = 0
+    task_distribution: Dict[str, int] = {}
+    agent_usage: Dict[str, int] = {}
+    for report in reports.values():
+        sessions = report.get("total_sessions", 0)
+        total += sessions
+        stats = report.get("completion_stats", {})
+        reached_offer += stats.get("reached_offer", 0)
+        completed += stats.get("avg_completed_tasks", 0) * sessions
+        for counts, merged in ((report.get("task_distribution", {}), task_distribution),
+                               (report.get("agent_usage", {}), agent_usage)):
+            for key, count in counts.items():
+                merged[key] = merged.get(key, 0) + count
+    return {
+        "total_sessions": total,
+        "task_distribution": task_distribution,
+        "agent_usage": agent_usage,
+        "completion_stats": {
+            "reached_offer": reached_offer,
+            "avg_completed_tasks": completed / total if total else 0.0,
+        },
+        "workers": reports,
+    }
+
+
+def create_dispatcher(upstreams: Sequence[str], clients: Optional[Dict[str, httpx.AsyncClient]] = None,
+                      timeout: float = 120.0, new_session_keys: int = 4096) -> FastAPI:
+    """Build the dispatcher app for the given worker base URLs
+
+    `clients` maps an upstream to a preconfigured httpx client (e.g. an ASGI
+    transport in tests); other upstreams get a pooled client of their own.
+    """
+    ring = HashRing(upstreams)
+    clients = dict(clients or {})
+    for upstream in upstreams:
+        if upstream not in clients:
+            clients[upstream] = httpx.AsyncClient(
+                base_url=upstream, timeout=timeout,
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=50))
+    # Idempotency key -> session injected for a keyed first message, so its retry
+    # reaches the same session on the same worker
+    injected_sessions: "OrderedDict[str, str]" = OrderedDict()
+    round_robin = {"next": 0}
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        yield
+        await asyncio.gather(*(client.aclose() for client in clients.values()))
+
+    dispatcher = FastAPI(title="Lucy AI - Session Dispatcher", version="2.0.0", lifespan=lifespan)
+
+    def new_session_id(key: Optional[str]) -> str:
+        if not key:
+            return str(uuid.uuid4())
+        session_id = injected_sessions.get(key)
+        if session_id is None:
+            session_id = injected_sessions[key] = str(uuid.uuid4())
+            while len(injected_sessions) > new_session_keys:
+                injected_sessions.popitem(last=False)
+        return session_id
+
+    async def forward(upstream: str, request: Request, body: Optional[bytes] = None) -> Response:
+        client = clients[upstream]
+        if body is None and request.method in ("GET", "HEAD", "DELETE", "OPTIONS"):
+            body = await request.body()
+        try:
+            # Other bodies not already read (photo uploads) are streamed through, not buffered
+            upstream_response = await client.request(
+                request.method, request.url.path, params=request.query_params,
+                content=request.stream() if body is None else body, headers=_forward_headers(request.headers))
+        except httpx.HTTPError as e:
+            logger.warning("upstream request failed", extra={"fields": {"upstream": upstream, "error": str(e)}})
+            return JSONResponse({"detail": f"Worker unavailable: {type(e).__name__}"}, status_code=502,
+                                headers={"X-Lucy-Worker": upstream})
+        headers = _forward_headers(upstream_response.headers)
+        headers["X-Lucy-Worker"] = upstream
+        return Response(upstream_response.content, status_code=upstream_response.status_code, headers=headers)
+
+    @dispatcher.post("/chat")
+    async def chat(request: Request):
+        try:
+            payload = json.loads(await request.body() or b"{}")
+        except ValueError:
+            payload = None
+        if not isinstance(payload, dict):
+            # Let a worker produce the validation error
+            return await forward(ring.node_for(str(uuid.uuid4())), request)
+        if not payload.get("session_id"):
+            key = request.headers.get("idempotency-key") or payload.get("client_message_id")
+            payload["session_id"] = new_session_id(key)
+        return await forward(ring.node_for(payload["session_id"]), request,
+                             body=json.dumps(payload).encode("utf-8"))
+
+    @dispatcher.post("/chat/batch")
+    async def chat_batch(request: Request):
+        try:
+            payload = json.loads(await request.body() or b"{}")
+            items = payload["items"]
+            if not isinstance(items, list) or not items:
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            return await forward(ring.node_for(str(uuid.uuid4())), request)
+
+        # Split into one sub-batch per worker, remembering each item's original index
+        per_worker: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for index, item in enumerate(items):
+            if isinstance(item, dict) and not item.get("session_id"):
+                item["session_id"] = new_session_id(item.get("client_message_id"))
+            session_id = item.get("session_id") if isinstance(item, dict) else None
+            per_worker.setdefault(ring.node_for(session_id or str(index)), []).append((index, item))
+
+        async def send(upstream: str, indexed: List[Tuple[int, Dict[str, Any]]]):
+            sub_batch = json.dumps({"items": [item for _, item in indexed]}).encode("utf-8")
+            return upstream, indexed, await forward(upstream, request, body=sub_batch)
+
+        responses = await asyncio.gather(*(send(upstream, indexed) for upstream, indexed in per_worker.items()))
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        for upstream, indexed, response in responses:
+            if response.status_code != 200:
+                try:
+                    detail = json.loads(response.body).get("detail", "Worker error")
+                except ValueError:
+                    detail = "Worker error"
+                for index, item in indexed:
+                    results[index] = {"index": index, "session_id": item.get("session_id"),
+                                      "status_code": response.status_code, "result": None, "error": detail}
+                continue
+            for (index, _), result in zip(indexed, json.loads(response.body)["results"]):
+                result["index"] = index
+                results[index] = result
+        failed = sum(1 for result in results if result["error"] is not None)
+        return {"results": results, "succeeded": len(results) - failed, "failed": failed}
+
+    @dispatcher.api_route("/session/{session_id}", methods=["GET", "DELETE"])
+    async def session(session_id: str, request: Request):
+        return await forward(ring.node_for(session_id), request)
+
+    @dispatcher.get("/session/{session_id}/events")
+    async def session_events(session_id: str, request: Request):
+        """Relay the worker's event stream as it arrives instead of buffering it"""
+        upstream = ring.node_for(session_id)
+        client = clients[upstream]
+        try:
+            upstream_response = await client.send(
+                client.build_request("GET", request.url.path, params=request.query_params,
+                                     headers=_forward_headers(request.headers)),
+                stream=True)
+        except httpx.HTTPError as e:
+            logger.warning("upstream request failed", extra={"fields": {"upstream": upstream, "error": str(e)}})
+            return JSONResponse({"detail": f"Worker unavailable: {type(e).__name__}"}, status_code=502,
+                                headers={"X-Lucy-Worker": upstream})
+
+        async def relay():
+            try:
+                async for chunk in upstream_response.aiter_raw():
+                    yield chunk
+            finally:
+                await upstream_response.aclose()
+
+        headers = _forward_headers(upstream_response.headers)
+        headers["X-Lucy-Worker"] = upstream
+        return StreamingResponse(relay(), status_code=upstream_response.status_code, headers=headers)
+
+    @dispatcher.get("/jobs/{job_id}")
+    async def job(job_id: str, request: Request):
+        """Jobs live on the worker that ran them; ask every worker"""
+        responses = await asyncio.gather(*(forward(upstream, request) for upstream in ring.nodes))
+        for response in responses:
+            if response.status_code == 200:
+                return response
+        return next((response for response in responses if response.status_code != 404), responses[0])
+
+    @dispatcher.get("/sessions")
+    async def list_sessions(request: Request):
+        """Merge every worker's session list"""
+        responses = await asyncio.gather(*(forward(upstream, request) for upstream in ring.nodes))
+        sessions = []
+        for response in responses:
+            if response.status_code == 200:
+                sessions.extend(json.loads(response.body).get("sessions", []))
+        return {"sessions": sessions, "total": len(sessions), "workers": len(ring.nodes)}
+
+    @dispatcher.get("/analytics")
+    async def analytics(request: Request):
+        """Sum every worker's analytics"""
+        responses = await asyncio.gather(*(forward(upstream, request) for upstream in ring.nodes))
+        return merge_analytics({upstream: json.loads(response.body)
+                                for upstream, response in zip(ring.nodes, responses) if response.status_code == 200})
+
+    @dispatcher.get("/metrics")
+    async def get_metrics(request: Request):
+        """Every worker's metrics in one scrape, labelled by worker"""
+        responses = await asyncio.gather(*(forward(upstream, request) for upstream in ring.nodes))
+        expositions = {upstream: response.body.decode("utf-8")
+                       for upstream, response in zip(ring.nodes, responses) if response.status_code == 200}
+        return Response(merge_metrics(expositions), media_type=metrics.CONTENT_TYPE)
+
+    @dispatcher.get("/dispatcher")
+    async def dispatcher_info():
+        return {"workers": ring.nodes, "vnodes": ring.vnodes}
+
+    @dispatcher.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+    async def passthrough(path: str, request: Request):
+        """Routes without a session (health, demo, photo uploads, docs) go round-robin"""
+        upstream = ring.nodes[round_robin["next"] % len(ring.nodes)]
+        round_robin["next"] += 1
+        return await forward(upstream, request)
+
+    return dispatcher
+
+
+def spawn_workers(count: int, base_port: int, host: str = "127.0.0.1") -> List[Tuple[str, subprocess.Popen]]:
+    """Start `count` single-process uvicorn workers serving app:app"""
+    workers = []
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    for offset in range(count):
+        port = base_port + offset
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", host, "--port", str(port),
+             "--log-level", "warning"],
+            cwd=app_dir, env={**os.environ, "LUCY_WORKER_ID": str(offset)})
+        workers.append((f"http://{host}:{port}", process))
+    return workers
+
+
+def wait_until_ready(upstreams: Sequence[str], timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    pending = list(upstreams)
+    while pending and time.monotonic() < deadline:
+        for upstream in list(pending):
+            try:
+                httpx.get(f"{upstream}/", timeout=1.0).raise_for_status()
+                pending.remove(upstream)
+            except httpx.HTTPError:
+                pass
+        if pending:
+            time.sleep(0.2)
+    if pending:
+        raise RuntimeError(f"Workers did not start: {', '.join(pending)}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Route Lucy requests to workers by session_id")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("LUCY_WORKERS", "4")),
+                        help="uvicorn workers to spawn")
+    parser.add_argument("--upstream", action="append", default=[],
+                        help="existing worker base URL (repeatable); disables spawning")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--base-port", type=int, default=8100, help="first port for spawned workers")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    processes = []
+    upstreams = args.upstream
+    if not upstreams:
+        spawned = spawn_workers(args.workers, args.base_port)
+        upstreams = [upstream for upstream, _ in spawned]
+        processes = [process for _, process in spawned]
+    try:
+        wait_until_ready(upstreams)
+        logger.info("dispatcher starting", extra={"fields": {"port": args.port, "workers": upstreams}})
+        uvicorn.run(create_dispatcher(upstreams), host=args.host, port=args.port, log_level="warning")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
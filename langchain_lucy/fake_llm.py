@@ -0,0 +1,242 @@
+"""
+Lucy 2.0 - Deterministic fake chat model
+Seeded latency profiles, token-rate streaming, injectable errors and canned
+per-agent responses, so perf tests are repeatable without network access
+"""
+
+from typing import Dict, List, Any, Iterator, Optional, Sequence, Union, Callable
+from dataclasses import dataclass, replace
+import math
+import os
+import random
+import re
+import time
+import zlib
+
+# Use LangChain message types when they are installed so the fake is a drop-in
+try:
+    from langchain_core.messages import AIMessage, AIMessageChunk
+except ImportError:
+    try:
+        from langchain.schema import AIMessage
+        AIMessageChunk = AIMessage
+    except ImportError:
+        class AIMessage:
+            def __init__(self, content: str = "", **kwargs):
+                self.content = content
+                self.usage_metadata = kwargs.get("usage_metadata")
+                self.response_metadata = kwargs.get("response_metadata", {})
+        AIMessageChunk = AIMessage
+
+
+AGENTS = ("photo_verifier", "business_coach", "underwriter")
+
+# Patterns matched against the start of the prompt to tell which agent is calling
+_AGENT_PATTERNS = [
+    ("photo_verifier", re.compile(r"photo\s?verif|photo verification", re.IGNORECASE)),
+    ("business_coach", re.compile(r"business\s?coach|business development coach", re.IGNORECASE)),
+    ("underwriter", re.compile(r"underwrit", re.IGNORECASE)),
+]
+
+DEFAULT_RESPONSES: Dict[str, List[str]] = {
+    "photo_verifier": [
+        "Great photos! 📸 Your shop looks authentic with medium stock density and a small floor area. "
+        "I'd estimate 15,000-25,000 KES monthly gross. What type of products do you mainly sell? 🛍️",
+    ],
+    "business_coach": [
+        "I love that! 🌟 That passion is what makes businesses succeed. "
+        "What's your biggest goal for the next 1-3 months? 🎯",
+        "That's a clear vision! 💪 What's the biggest challenge stopping you from reaching it right now? 🛠️",
+    ],
+    "underwriter": [
+        "Let me do the math 🧮 Based on your daily sales, your estimated monthly net income supports a "
+        "conservative first loan. Shall we look at how you'd use it? 💰",
+    ],
+    "default": [
+        "Thanks for sharing! Tell me a bit more about your business 😊",
+    ],
+}
+
+
+class FakeLLMError(RuntimeError):
+    """Injected failure raised by FakeChatModel"""
+
+
+@dataclass(frozen=True)
+class LatencyProfile:
+    """Distribution of time-to-first-token, sampled per call"""
+    kind: str = "fixed"  # fixed | lognormal | heavy_tail
+    fixed_ms: float = 0.0
+    median_ms: float = 800.0
+    sigma: float = 0.5
+    tail_probability: float = 0.05
+    tail_alpha: float = 1.5
+    max_ms: float = 60000.0
+
+    def sample(self, rng: random.Random) -> float:
+        """Sample a latency in seconds"""
+        if self.kind == "fixed":
+            millis = self.fixed_ms
+        elif self.kind == "lognormal":
+            millis = rng.lognormvariate(math.log(self.median_ms), self.sigma)
+        elif self.kind == "heavy_tail":
+            # Lognormal body with an occasional Pareto-distributed straggler
+            millis = rng.lognormvariate(math.log(self.median_ms), self.sigma)
+            if rng.random() < self.tail_probability:
+                millis = self.median_ms * 3 * rng.paretovariate(self.tail_alpha)
+        else:
+            raise ValueError(f"Unknown latency profile kind: {self.kind}")
+        return min(max(millis, 0.0), self.max_ms) / 1000
+
+
+PROFILES: Dict[str, LatencyProfile] = {
+    "instant": LatencyProfile(kind="fixed", fixed_ms=0.0),
+    "fast": LatencyProfile(kind="fixed", fixed_ms=50.0),
+    "realistic": LatencyProfile(kind="lognormal", median_ms=900.0, sigma=0.45),
+    "heavy_tail": LatencyProfile(kind="heavy_tail", median_ms=900.0, sigma=0.45,
+                                 tail_probability=0.05, tail_alpha=1.3),
+}
+
+
+def parse_profile(spec: str) -> LatencyProfile:
+    """Parse a preset name or "kind:key=value,..." into a LatencyProfile
+
+    Examples: "realistic", "fixed:fixed_ms=250", "lognormal:median_ms=600,sigma=0.8"
+    """
+    name, _, params = spec.partition(":")
+    name = name.strip()
+    base = PROFILES.get(name) or LatencyProfile(kind=name)
+    overrides = {}
+    for part in filter(None, (item.strip() for item in params.split(","))):
+        key, _, value = part.partition("=")
+        overrides[key.strip()] = float(value)
+    profile = replace(base, **overrides)
+    profile.sample(random.Random(0))  # validate kind early
+    return profile
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+class FakeChatModel:
+    """Drop-in stand-in for ChatOpenAI with seeded, reproducible behaviour
+
+    Each agent gets its own random stream derived from the seed, so the sequence
+    of latencies, errors and responses an agent sees does not depend on how
+    calls from other agents interleave.
+    """
+
+    is_fake = True
+
+    def __init__(self, profile: Union[LatencyProfile, str] = "instant", seed: int = 0,
+                 tokens_per_second: float = 0.0, error_rate: float = 0.0,
+                 responses: Optional[Dict[str, Sequence[str]]] = None,
+                 sleep: Callable[[float], None] = time.sleep, agent: Optional[str] = None, **kwargs):
+        self.profile = parse_profile(profile) if isinstance(profile, str) else profile
+        self.seed = seed
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.responses = {**DEFAULT_RESPONSES, **(responses or {})}
+        self.sleep = sleep
+        self.agent = agent
+        self._rngs: Dict[str, random.Random] = {}
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls, **overrides) -> "FakeChatModel":
+        """Build from LUCY_FAKE_LLM_* environment variables"""
+        settings = {
+            "profile": os.getenv("LUCY_FAKE_LLM_PROFILE", "realistic"),
+            "seed": int(os.getenv("LUCY_FAKE_LLM_SEED", "0")),
+            "tokens_per_second": float(os.getenv("LUCY_FAKE_LLM_TOKENS_PER_S", "0")),
+            "error_rate": float(os.getenv("LUCY_FAKE_LLM_ERROR_RATE", "0")),
+        }
+        settings.update(overrides)
+        return cls(**settings)
+
+    def bind_agent(self, agent: str, responses: Optional[Sequence[str]] = None) -> "FakeChatModel":
+        """Copy pinned to one agent's canned responses (or the given ones), sharing the random streams"""
+        if responses is not None:
+            responses = {**self.responses, agent: list(responses)}
+        bound = FakeChatModel(self.profile, self.seed, self.tokens_per_second, self.error_rate,
+                              responses or self.responses, self.sleep, agent)
+        bound._rngs = self._rngs
+        return bound
+
+    def _rng(self, agent: str) -> random.Random:
+        rng = self._rngs.get(agent)
+        if rng is None:
+            rng = self._rngs.setdefault(agent, random.Random(zlib.crc32(f"{self.seed}:{agent}".encode())))
+        return rng
+
+    def _detect_agent(self, messages: Any) -> str:
+        if self.agent:
+            return self.agent
+        head = _prompt_text(messages)[:200]
+        for agent, pattern in _AGENT_PATTERNS:
+            if pattern.search(head):
+                return agent
+        return "default"
+
+    def _prepare(self, messages: Any):
+        """Pick the agent, sample latency, decide on an injected error and the reply"""
+        self.calls += 1
+        agent = self._detect_agent(messages)
+        rng = self._rng(agent)
+        latency = self.profile.sample(rng)
+        failed = self.error_rate > 0 and rng.random() < self.error_rate
+        choices = self.responses.get(agent) or self.responses["default"]
+        content = choices[rng.randrange(len(choices))]
+        return agent, latency, failed, content
+
+    def invoke(self, messages: Any, **kwargs) -> AIMessage:
+        agent, latency, failed, content = self._prepare(messages)
+        generation_time = estimate_tokens(content) / self.tokens_per_second if self.tokens_per_second else 0.0
+        if latency + generation_time > 0:
+            self.sleep(latency + generation_time)
+        if failed:
+            raise FakeLLMError(f"Injected failure for {agent}")
+        return AIMessage(
+            content=content,
+            usage_metadata=_usage(messages, content),
+            response_metadata={"model_name": "fake", "agent": agent, "simulated_latency_s": latency},
+        )
+
+    def stream(self, messages: Any, **kwargs) -> Iterator[AIMessageChunk]:
+        """Yield the reply word by word at tokens_per_second after the first-token latency"""
+        agent, latency, failed, content = self._prepare(messages)
+        if latency > 0:
+            self.sleep(latency)
+        if failed:
+            raise FakeLLMError(f"Injected failure for {agent}")
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for index, piece in enumerate(re.findall(r"\s*\S+", content)):
+            if index and delay:
+                self.sleep(delay)
+            yield AIMessageChunk(content=piece)
+
+    def __call__(self, messages: Any, **kwargs) -> AIMessage:
+        return self.invoke(messages, **kwargs)
+
+
+def _prompt_text(messages: Any) -> str:
+    if isinstance(messages, str):
+        return messages
+    parts = []
+    for message in messages or []:
+        if isinstance(message, tuple):
+            parts.append(str(message[-1]))
+        elif isinstance(message, dict):
+            parts.append(str(message.get("content", "")))
+        else:
+            parts.append(str(getattr(message, "content", message)))
+    return "\n".join(parts)
+
+
+def _usage(messages: Any, content: str) -> Dict[str, int]:
+    input_tokens = estimate_tokens(_prompt_text(messages))
+    output_tokens = estimate_tokens(content)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens}
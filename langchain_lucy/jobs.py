@@ -0,0 +1,210 @@
+"""
+Lucy 2.0 - Background jobs
+Small job queue for slow agent work: handlers registered by kind, jobs handed
+to a broker (in-process LocalBroker here; a Redis/SQS-backed one implements the
+same put/get) and run by a pool of worker threads, with status kept for polling
+"""
+
+from typing import Dict, List, Any, Callable, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import queue
+import threading
+import time
+import uuid
+
+from lucy_logging import get_logger, log_context
+import metrics
+
+logger = get_logger("jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOBS = metrics.REGISTRY.counter(
+    "lucy_jobs_total", "Background jobs by kind and final status", ("kind", "status"))
+JOB_LATENCY = metrics.REGISTRY.histogram(
+    "lucy_job_duration_seconds", "Background job run time", ("kind",))
+JOB_QUEUE_WAIT = metrics.REGISTRY.histogram(
+    "lucy_job_queue_wait_seconds", "Time jobs spend queued before a worker picks them up", ("kind",))
+JOBS_QUEUED = metrics.REGISTRY.gauge(
+    "lucy_jobs_queued", "Jobs waiting for a worker")
+
+
+@dataclass
+class Job:
+    job_id: str
+    kind: str
+    payload: Dict[str, Any]
+    session_id: str = ""
+    status: str = QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "session_id": self.session_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class LocalBroker:
+    """In-process FIFO of job IDs; stands in for an external broker"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+
+    def put(self, job_id: Optional[str]):
+        self._queue.put(job_id)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        return self._queue.get(timeout=timeout)
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+class JobQueue:
+    """Run registered handlers in the background and keep their status
+
+    Finished jobs are kept for polling, oldest dropped beyond `retain`.
+    `instance_id` is new for every queue, so a job ID recorded elsewhere can
+    be told apart from one issued before a restart.
+    """
+
+    def __init__(self, workers: int = 2, broker: Optional[LocalBroker] = None, retain: int = 10000):
+        self.workers = workers
+        self.broker = broker or LocalBroker()
+        self.retain = retain
+        self.instance_id = uuid.uuid4().hex[:12]
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._listeners: List[Callable[[Job], None]] = []
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._done = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def register(self, kind: str, handler: Callable[[Dict[str, Any]], Any]):
+        self._handlers[kind] = handler
+
+    def add_listener(self, listener: Callable[[Job], None]):
+        """Called from the worker thread whenever a job finishes"""
+        self._listeners.append(listener)
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"lucy-job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self, timeout: float = 5.0):
+        for _ in self._threads:
+            self.broker.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, kind: str, payload: Dict[str, Any], session_id: str = "") -> Job:
+        if kind not in self._handlers:
+            raise KeyError(f"No handler registered for job kind {kind!r}")
+        job = Job(job_id=f"job_{uuid.uuid4().hex[:16]}", kind=kind, payload=payload, session_id=session_id)
+        with self._done:
+            self._jobs[job.job_id] = job
+            self._trim_locked()
+        self.broker.put(job.job_id)
+        JOBS_QUEUED.set(self.broker.qsize())
+        return job
+
+    def track(self, kind: str, session_id: str = "") -> Job:
+        """Record work running elsewhere (e.g. a deferred chat turn) so it can be polled like a job"""
+        job = Job(job_id=f"job_{uuid.uuid4().hex[:16]}", kind=kind, payload={}, session_id=session_id,
+                  status=RUNNING)
+        job.started_at = job.created_at
+        with self._done:
+            self._jobs[job.job_id] = job
+            self._trim_locked()
+        return job
+
+    def complete(self, job: Job, result: Any = None, error: Optional[str] = None):
+        """Finish a tracked job"""
+        self._finish(job, result, error, FAILED if error is not None else DONE)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._done:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """Block until a job has finished (or the timeout passes); returns the job"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._done:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None or job.status in (DONE, FAILED):
+                    return job
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return job
+                self._done.wait(remaining)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._done:
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {"workers": len(self._threads), "queued": self.broker.qsize(), "jobs": by_status}
+
+    def _trim_locked(self):
+        # Drop the oldest finished jobs; queued and running ones are always kept
+        excess = len(self._jobs) - self.retain
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.status in (DONE, FAILED)][:excess]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job_id = self.broker.get()
+            if job_id is None:
+                return
+            JOBS_QUEUED.set(self.broker.qsize())
+            job = self.get(job_id)
+            if job is None:
+                continue
+            job.status = RUNNING
+            job.started_at = time.time()
+            JOB_QUEUE_WAIT.labels(job.kind).observe(job.started_at - job.created_at)
+            started = time.perf_counter()
+            try:
+                with log_context(session_id=job.session_id or None):
+                    result = self._handlers[job.kind](job.payload)
+                status, error = DONE, None
+            except Exception as e:
+                result, status, error = None, FAILED, f"{type(e).__name__}: {e}"
+                metrics.ERRORS.labels(f"job:{job.kind}", type(e).__name__).inc()
+                logger.exception("background job failed", extra={"fields": {"job_id": job.job_id, "kind": job.kind}})
+            JOB_LATENCY.labels(job.kind).observe(time.perf_counter() - started)
+            self._finish(job, result, error, status)
+
+    def _finish(self, job: Job, result: Any, error: Optional[str], status: str):
+        JOBS.labels(job.kind, status).inc()
+        with self._done:
+            job.result, job.error, job.status, job.finished_at = result, error, status, time.time()
+            self._done.notify_all()
+        for listener in self._listeners:
+            try:
+                listener(job)
+            except Exception:
+                logger.exception("job listener failed", extra={"fields": {"job_id": job.job_id}})
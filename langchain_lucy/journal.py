@@ -0,0 +1,443 @@
+"""
+Lucy 2.0 - Session journal
+Append-only log of turn events with group-commit fsync, periodic snapshots and
+compaction; sessions are rebuilt on startup from the latest snapshot plus replay
+"""
+
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+
+from lucy_ai import LucyState
+from lucy_logging import get_logger
+import state_codec
+import metrics
+
+logger = get_logger("journal")
+
+# fcntl is POSIX-only; elsewhere the directory is not locked
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    fcntl = None
+    FCNTL_AVAILABLE = False
+
+# Record kinds
+PUT = "put"    # full session snapshot
+TURN = "turn"  # what one chat turn changed
+DROP = "drop"  # session deleted or evicted
+
+# Each record on disk: payload length, CRC32 of the payload, payload (state_codec.pack)
+_FRAME = struct.Struct(">II")
+_SEGMENT_RE = re.compile(r"^(journal|snapshot)-(\d{8})\.(log|bin)$")
+
+JOURNAL_RECORDS = metrics.REGISTRY.counter(
+    "lucy_journal_records_total", "Records appended to the session journal", ("kind",))
+JOURNAL_COMMIT_LATENCY = metrics.REGISTRY.histogram(
+    "lucy_journal_commit_seconds", "Time to write and fsync one group commit")
+JOURNAL_COMMIT_SIZE = metrics.REGISTRY.histogram(
+    "lucy_journal_commit_records", "Records written per group commit",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+
+class JournalWriteError(RuntimeError):
+    """A record could not be written, so it is not durable"""
+
+
+class _Waiter:
+    """Completion of one waited-for append: set once its group commit is done, with any error"""
+    __slots__ = ("done", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[OSError] = None
+
+
+@dataclass
+class TurnMark:
+    """What a session looked like before a turn, to diff against afterwards"""
+    exists: bool
+    task: str = ""
+    customer: Optional[List[Any]] = None
+    history_len: int = 0
+    offers_len: int = 0
+    decisions: Optional[Dict[str, Any]] = None
+
+
+def mark(state: Optional[LucyState]) -> TurnMark:
+    """Capture the parts of a session a turn can change"""
+    if state is None:
+        return TurnMark(exists=False)
+    customer = [list(value) if isinstance(value, list) else value
+                for value in state_codec.customer_to_primitive(state.customer_data)]
+    return TurnMark(True, state.current_task.value, customer, len(state.conversation_history),
+                    len(state.offers), dict(state.offer_decisions))
+
+
+def turn_record(session_id: str, before: TurnMark, state: LucyState,
+                message: str = "", photos: Optional[List[str]] = None) -> List[Any]:
+    """Journal record for one turn: a full PUT for a new session, otherwise a TURN delta"""
+    if not before.exists:
+        return [PUT, session_id, time.time(), state_codec.to_primitive(state)]
+    customer = state_codec.customer_to_primitive(state.customer_data)
+    changes = [[index, value] for index, (old, value) in enumerate(zip(before.customer, customer)) if old != value]
+    return [
+        TURN, session_id, time.time(),
+        message, photos or [],
+        before.task, state.current_task.value,
+        changes,
+        [state_codec.message_to_primitive(m) for m in state.conversation_history[before.history_len:]],
+        [state_codec.offer_to_primitive(offer) for offer in state.offers[before.offers_len:]],
+        {offer_id: decision for offer_id, decision in state.offer_decisions.items()
+         if before.decisions.get(offer_id) != decision},
+        state.version,
+    ]
+
+
+def apply_record(sessions: "OrderedDict[str, LucyState]", record: List[Any]):
+    """Replay one record onto recovered sessions (most recently active last)"""
+    kind, session_id = record[0], record[1]
+    if kind == PUT:
+        sessions[session_id] = state_codec.from_primitive(record[3])
+    elif kind == DROP:
+        sessions.pop(session_id, None)
+    elif kind == TURN:
+        state = sessions.get(session_id)
+        if state is None:
+            return  # session was dropped before this segment was compacted
+        _, _, _, _, _, _, task_after, changes, messages, offers, decisions, version = record[:12]
+        state.current_task = state_codec.task_from_primitive(task_after)
+        names = state_codec.SCHEMA[type(state.customer_data)]
+        for index, value in changes:
+            setattr(state.customer_data, names[index], state_codec.customer_field_from_primitive(index, value))
+        state.conversation_history.extend(state_codec.message_from_primitive(m) for m in messages)
+        state.offers.extend(state_codec.offer_from_primitive(offer) for offer in offers)
+        state.offer_decisions.update(decisions)
+        state.version = version
+    if session_id in sessions:
+        sessions.move_to_end(session_id)
+
+
+def _frame(payload: bytes) -> bytes:
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path: str) -> Iterator[List[Any]]:
+    """Records of a journal or snapshot file, stopping at a torn or corrupt tail"""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, offset)
+        payload = data[offset + _FRAME.size:offset + _FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            logger.warning("journal tail is torn, ignoring the rest", extra={"fields": {
+                "path": path, "offset": offset, "size": len(data)}})
+            return
+        yield state_codec.unpack(payload)
+        offset += _FRAME.size + length
+
+
+class Journal:
+    """Append-only session journal
+
+    Appends are queued and written by one background thread: every record that
+    arrived while the previous fsync was running goes out in the next write and
+    shares a single fsync (group commit). `append(..., wait=True)` returns once
+    the record is durable.
+
+    On disk, generation N is `snapshot-N.bin` (every session as of the start of
+    the segment) plus `journal-N.log` (records since). When a segment passes
+    `segment_bytes`, or `snapshot_interval` seconds after its first record, a
+    new segment starts and the closed ones are folded into a fresh snapshot.
+
+    A journal holds an exclusive lock on its directory for its lifetime, so a
+    second process pointed at the same directory fails instead of deleting
+    the first one's live segments.
+    """
+
+    def __init__(self, directory: str, fsync: bool = True, segment_bytes: int = 16 * 1024 * 1024,
+                 snapshot_interval: float = 300.0, use_msgpack: Optional[bool] = None):
+        self.directory = directory
+        self.fsync = fsync
+        self.segment_bytes = segment_bytes
+        self.snapshot_interval = snapshot_interval
+        self.use_msgpack = use_msgpack
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = self._lock_directory()
+
+        self._queue: "queue.Queue[Optional[Tuple[bytes, Optional[_Waiter]]]]" = queue.Queue()
+        self._compact_lock = threading.Lock()
+        self._closed = False
+        self.generation = max(self._generations("journal") + self._generations("snapshot") + [0]) + 1
+        self._segment = None
+        self._segment_bytes_written = 0
+        self._segment_started: Optional[float] = None
+        self._writer: Optional[threading.Thread] = None
+        self._compactor: Optional[threading.Thread] = None
+
+    # Files
+
+    def _lock_directory(self) -> Optional[int]:
+        if not FCNTL_AVAILABLE:
+            return None
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"Journal directory {self.directory} is in use by another process")
+        return fd
+
+    def _unlock_directory(self):
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # closing the descriptor releases the flock
+            self._lock_fd = None
+
+    def _path(self, kind: str, generation: int) -> str:
+        extension = "log" if kind == "journal" else "bin"
+        return os.path.join(self.directory, f"{kind}-{generation:08d}.{extension}")
+
+    def _generations(self, kind: str) -> List[int]:
+        found = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_RE.match(name)
+            if match and match.group(1) == kind:
+                found.append(int(match.group(2)))
+        return sorted(found)
+
+    # Recovery
+
+    def recover(self) -> "OrderedDict[str, LucyState]":
+        """Rebuild sessions from the newest snapshot and the segments after it"""
+        started = time.perf_counter()
+        snapshots = [g for g in self._generations("snapshot") if g < self.generation]
+        base = snapshots[-1] if snapshots else 0
+        sessions: "OrderedDict[str, LucyState]" = OrderedDict()
+        records = 0
+        if base:
+            for record in read_records(self._path("snapshot", base)):
+                apply_record(sessions, record)
+        for generation in self._generations("journal"):
+            if base <= generation < self.generation:
+                for record in read_records(self._path("journal", generation)):
+                    apply_record(sessions, record)
+                    records += 1
+        logger.info("journal recovered", extra={"fields": {
+            "sessions": len(sessions), "snapshot_generation": base, "replayed_records": records,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2)}})
+        return sessions
+
+    def load(self, session_id: str) -> Optional[LucyState]:
+        """Rebuild one session from disk, e.g. one evicted from memory but not dropped
+
+        Scans the newest snapshot and every segment since, including the open one.
+        """
+        with self._compact_lock:
+            snapshots = self._generations("snapshot")
+            base = snapshots[-1] if snapshots else 0
+            paths = [self._path("snapshot", base)] if base else []
+            paths += [self._path("journal", generation) for generation in self._generations("journal")
+                      if generation >= base]
+            sessions: "OrderedDict[str, LucyState]" = OrderedDict()
+            for path in paths:
+                for record in read_records(path):
+                    if record[1] == session_id:
+                        apply_record(sessions, record)
+        return sessions.get(session_id)
+
+    # Appending
+
+    def start(self):
+        """Open a fresh segment and start the writer; earlier segments get compacted"""
+        if self._writer is not None:
+            return
+        self._open_segment()
+        self._writer = threading.Thread(target=self._write_loop, name="lucy-journal-writer", daemon=True)
+        self._writer.start()
+        if self._generations("journal")[:-1]:
+            self._compact_async()
+
+    def append(self, record: List[Any], wait: bool = True):
+        """Queue a record; with wait, block until it is durable or raise JournalWriteError"""
+        if self._closed:
+            raise RuntimeError("Journal is closed")
+        waiter = _Waiter() if wait else None
+        self._queue.put((_frame(state_codec.pack(record, self.use_msgpack)), waiter))
+        JOURNAL_RECORDS.labels(record[0]).inc()
+        if waiter is not None:
+            waiter.done.wait()
+            if waiter.error is not None:
+                raise JournalWriteError(f"Journal write failed: {waiter.error}") from waiter.error
+
+    def record_turn(self, session_id: str, before: TurnMark, state: LucyState,
+                    message: str = "", photos: Optional[List[str]] = None, wait: bool = True):
+        self.append(turn_record(session_id, before, state, message, photos), wait)
+
+    def record_put(self, session_id: str, state: LucyState, wait: bool = True):
+        self.append([PUT, session_id, time.time(), state_codec.to_primitive(state)], wait)
+
+    def record_drop(self, session_id: str, reason: str = "deleted", wait: bool = True):
+        self.append([DROP, session_id, time.time(), reason], wait)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._segment.close()
+        if self._compactor is not None:
+            self._compactor.join()
+        self._unlock_directory()
+
+    def _open_segment(self):
+        self._segment = open(self._path("journal", self.generation), "ab")
+        self._segment_bytes_written = 0
+        self._segment_started = None
+
+    def _write_loop(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._maybe_rotate()
+                continue
+            batch = [item]
+            # Everything queued while the last commit was running joins this one
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(entry is None for entry in batch)
+            entries = [entry for entry in batch if entry is not None]
+            if entries:
+                self._commit(entries)
+            if stopping:
+                return
+            self._maybe_rotate()
+
+    def _commit(self, entries: List[Tuple[bytes, Optional[_Waiter]]]):
+        started = time.perf_counter()
+        data = b"".join(frame for frame, _ in entries)
+        error: Optional[OSError] = None
+        try:
+            if self._segment.closed:
+                self._open_segment()  # the previous one was abandoned after a failed write
+            self._segment.write(data)
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+        except OSError as e:
+            error = e
+            metrics.ERRORS.labels("journal", "OSError").inc()
+            logger.exception("journal write failed")
+            self._abandon_segment()
+        finally:
+            for _, waiter in entries:
+                if waiter is not None:
+                    waiter.error = error
+                    waiter.done.set()
+        if error is not None:
+            return
+        self._segment_bytes_written += len(data)
+        if self._segment_started is None:
+            self._segment_started = time.monotonic()
+        JOURNAL_COMMIT_LATENCY.observe(time.perf_counter() - started)
+        JOURNAL_COMMIT_SIZE.observe(len(entries))
+
+    def _abandon_segment(self):
+        """After a failed write the segment may end in a partial record; the next commit opens
+        a fresh one, since replay stops at the first torn record of a file"""
+        try:
+            self._segment.close()
+        except OSError:
+            pass
+        self.generation += 1
+
+    def _maybe_rotate(self):
+        if not self._segment_bytes_written:
+            return
+        full = self._segment_bytes_written >= self.segment_bytes
+        due = self.snapshot_interval and time.monotonic() - self._segment_started >= self.snapshot_interval
+        if full or due:
+            self._segment.close()
+            self.generation += 1
+            self._open_segment()
+            self._compact_async()
+
+    # Snapshots and compaction
+
+    def _compact_async(self):
+        if self._compactor is not None and self._compactor.is_alive():
+            return  # the next rotation picks up whatever this run misses
+        self._compactor = threading.Thread(target=self.compact, name="lucy-journal-compactor", daemon=True)
+        self._compactor.start()
+
+    def compact(self):
+        """Fold closed segments into a snapshot for the current generation and delete them"""
+        with self._compact_lock:
+            target = self.generation
+            closed = [g for g in self._generations("journal") if g < target]
+            if not closed:
+                return
+            snapshots = [g for g in self._generations("snapshot") if g <= closed[0]]
+            base = snapshots[-1] if snapshots else 0
+
+            sessions: "OrderedDict[str, LucyState]" = OrderedDict()
+            if base:
+                for record in read_records(self._path("snapshot", base)):
+                    apply_record(sessions, record)
+            for generation in closed:
+                if generation >= base:
+                    for record in read_records(self._path("journal", generation)):
+                        apply_record(sessions, record)
+
+            # Write-then-rename so a snapshot file is always complete
+            path = self._path("snapshot", target)
+            temporary = path + ".tmp"
+            with open(temporary, "wb") as f:
+                for session_id, state in sessions.items():
+                    f.write(_frame(state_codec.pack([PUT, session_id, 0, state_codec.to_primitive(state)],
+                                                    self.use_msgpack)))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(temporary, path)
+            for generation in closed:
+                os.remove(self._path("journal", generation))
+            for generation in self._generations("snapshot"):
+                if generation < target:
+                    os.remove(self._path("snapshot", generation))
+            logger.info("journal compacted", extra={"fields": {
+                "generation": target, "sessions": len(sessions), "segments": len(closed)}})
+
+
+def open_journal(directory: Optional[str] = None) -> Optional[Journal]:
+    """Journal configured from LUCY_JOURNAL_* environment variables, or None if disabled
+
+    Workers started by the dispatcher (LUCY_WORKER_ID set) each get their own
+    `worker-<id>` subdirectory, since generations and compaction are per process.
+    """
+    directory = directory or os.getenv("LUCY_JOURNAL_DIR")
+    if not directory:
+        return None
+    worker_id = os.getenv("LUCY_WORKER_ID")
+    if worker_id:
+        directory = os.path.join(directory, f"worker-{worker_id}")
+    return Journal(
+        directory,
+        fsync=os.getenv("LUCY_JOURNAL_FSYNC", "1") != "0",
+        segment_bytes=int(os.getenv("LUCY_JOURNAL_SEGMENT_BYTES", str(16 * 1024 * 1024))),
+        snapshot_interval=float(os.getenv("LUCY_JOURNAL_SNAPSHOT_INTERVAL", "300")),
+    )
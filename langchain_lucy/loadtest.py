@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Lucy FastAPI backend
+Replays the /demo customer journey (plus seeded variants) as N concurrent
+virtual customers against /chat and reports throughput and p50/p95/p99 latency
+per step and per LucyTask
+"""
+
+from typing import Dict, List, Any, Optional
+from collections import defaultdict
+from dataclasses import dataclass, field
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Keep the in-process app's per-turn logs out of the report unless asked for
+os.environ.setdefault("LUCY_LOG_LEVEL", "WARNING")
+
+from lucy_ai import LucyTask
+from metrics import latency_summary
+
+# Pieces mixed into journey variants; every message keeps the keywords the
+# state machine needs to advance, so each variant can reach the OFFER stage
+VARIANT_BUSINESSES = [
+    ("grocery shop", "household items and fresh food"),
+    ("kiosk", "airtime, snacks and soft drinks"),
+    ("salon shop", "hair braiding and beauty products"),
+    ("hardware shop", "nails, paint and building tools"),
+    ("boutique", "second-hand clothes and shoes"),
+]
+VARIANT_LOCATIONS = [
+    "Kawangware Market, Lane 3",
+    "Gikomba Market - Lane 4",
+    "Kawangware 46 - Ndwaru Rd",
+    "near Toi Market, Kibera",
+    "Githurai 45 estate, main road",
+]
+VARIANT_CHALLENGES = [
+    "My challenge is running out of popular items",
+    "I struggle to get enough customers in the afternoon",
+    "The problem is my suppliers are far away and transport is expensive",
+]
+VARIANT_USES = [
+    "I want to use the loan for more stock and inventory",
+    "I need to buy equipment, a new fridge for cold drinks",
+    "I want to expand and add new products",
+]
+
+
+def build_journey(rng: random.Random) -> List[Dict[str, Any]]:
+    """A randomized eight-turn journey shaped like the /demo script"""
+    business, products = rng.choice(VARIANT_BUSINESSES)
+    customers = rng.randint(10, 60)
+    daily_sales = rng.randrange(1000, 15000, 250)
+    return [
+        {"message": "Hi, I need a loan for my business", "photos": None},
+        {"message": f"I have a {business} in {rng.choice(VARIANT_LOCATIONS)}",
+         "photos": ["inside.jpg", "outside.jpg"]},
+        {"message": f"I run a {business} and sell {products}", "photos": None},
+        {"message": f"I love serving my neighbours with {products}", "photos": None},
+        {"message": f"I serve {customers} customers daily and make {daily_sales} KES per day", "photos": None},
+        {"message": rng.choice(VARIANT_CHALLENGES), "photos": None},
+        {"message": rng.choice(VARIANT_USES), "photos": None},
+        {"message": "Yes, I'm ready for the offer!", "photos": None},
+    ]
+
+
+def build_journeys(count: int, seed: int = 0, include_demo: bool = True) -> List[List[Dict[str, Any]]]:
+    """The demo script first (if requested) followed by seeded variants"""
+    from app import DEMO_CONVERSATION
+
+    rng = random.Random(seed)
+    journeys = [list(DEMO_CONVERSATION)] if include_demo and count > 0 else []
+    while len(journeys) < count:
+        journeys.append(build_journey(rng))
+    return journeys
+
+
+@dataclass
+class LoadReport:
+    """Latency samples and outcome counters collected during a run"""
+    customers: int
+    journeys: int = 0
+    reached_offer: int = 0
+    failed_journeys: int = 0
+    requests: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+    duration_s: float = 0.0
+    step_latencies: Dict[int, List[float]] = field(default_factory=lambda: defaultdict(list))
+    task_latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+
+    def record(self, step: int, task: str, elapsed: float):
+        self.requests += 1
+        self.step_latencies[step].append(elapsed)
+        self.task_latencies[task].append(elapsed)
+
+    def record_error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        duration = self.duration_s or 1e-9
+        all_samples = [sample for samples in self.step_latencies.values() for sample in samples]
+        return {
+            "customers": self.customers,
+            "journeys": self.journeys,
+            "reached_offer": self.reached_offer,
+            "failed_journeys": self.failed_journeys,
+            "success_rate": round(self.reached_offer / self.journeys, 4) if self.journeys else 0.0,
+            "requests": self.requests,
+            "errors": self.errors,
+            "duration_s": round(self.duration_s, 3),
+            "journeys_per_s": round(self.journeys / duration, 2),
+            "requests_per_s": round(self.requests / duration, 2),
+            "overall": latency_summary(all_samples),
+            "per_step": {str(step): latency_summary(samples)
+                         for step, samples in sorted(self.step_latencies.items())},
+            "per_task": {task.value: latency_summary(self.task_latencies[task.value])
+                         for task in LucyTask if task.value in self.task_latencies},
+        }
+
+    def format_text(self) -> str:
+        data = self.to_dict()
+        lines = [
+            f"Virtual customers: {data['customers']}  Journeys: {data['journeys']}  "
+            f"Reached OFFER: {data['reached_offer']} ({data['success_rate']:.0%})",
+            f"Duration: {data['duration_s']}s  Throughput: {data['journeys_per_s']} journeys/s, "
+            f"{data['requests_per_s']} requests/s  Errors: {sum(self.errors.values())}",
+            "",
+        ]
+        header = f"{'':<10}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+        for title, rows in (("Per step", data["per_step"]), ("Per task", data["per_task"])):
+            lines.append(title)
+            lines.append(header)
+            for name, summary in rows.items():
+                lines.append(f"{name:<10}{summary['count']:>8}{summary['p50_ms']:>10}"
+                             f"{summary['p95_ms']:>10}{summary['p99_ms']:>10}{summary['max_ms']:>10}")
+            lines.append("")
+        return "\n".join(lines)
+
+
+async def run_journey(client: httpx.AsyncClient, journey: List[Dict[str, Any]], report: LoadReport) -> Optional[bool]:
+    """Drive one customer through the journey
+
+    Returns True if it reached OFFER, False if it stopped short and None on a request error.
+    """
+    session_id = None
+    # The task a turn is handled under is the one the previous response left us in
+    task = LucyTask.B1.value
+    for step, turn in enumerate(journey, 1):
+        payload = {"message": turn["message"], "photos": turn["photos"], "session_id": session_id}
+        started = time.perf_counter()
+        try:
+            response = await client.post("/chat", json=payload)
+            elapsed = time.perf_counter() - started
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            report.record_error(f"http_{e.response.status_code}")
+            return None
+        except httpx.HTTPError as e:
+            report.record_error(type(e).__name__)
+            return None
+        report.record(step, task, elapsed)
+        body = response.json()
+        session_id = body["session_id"]
+        task = body["current_task"]
+    return task == LucyTask.OFFER.value
+
+
+async def run_load(customers: int, journeys: int, base_url: Optional[str] = None,
+                   seed: int = 0, timeout: float = 60.0, llm: str = "demo",
+                   profile: str = "realistic") -> LoadReport:
+    """Run `journeys` journeys with at most `customers` in flight at once
+
+    Without base_url the app is driven in-process through an ASGI transport on
+    the fake LLM, never a real model: "demo" answers instantly, "fake" with the
+    latency `profile`. An app this process already started keeps its agents,
+    and is left running afterwards.
+    """
+    pending: "asyncio.Queue[List[Dict[str, Any]]]" = asyncio.Queue()
+    for journey in build_journeys(journeys, seed):
+        pending.put_nowait(journey)
+
+    report = LoadReport(customers=customers)
+    started_app = False
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+    else:
+        from app import app, startup
+        # The ASGI transport does not run the lifespan. LucyAI reads the provider
+        # when startup() builds it; the caller's environment is restored after
+        forced = {"LLM_PROVIDER": "fake", "LUCY_FAKE_LLM_PROFILE": "instant" if llm == "demo" else profile}
+        saved = {name: os.environ.get(name) for name in forced}
+        os.environ.update(forced)
+        try:
+            started_app = startup()
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lucy", timeout=timeout)
+
+    async def virtual_customer():
+        while True:
+            try:
+                journey = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            reached_offer = await run_journey(client, journey, report)
+            report.journeys += 1
+            if reached_offer:
+                report.reached_offer += 1
+            elif reached_offer is None:
+                report.failed_journeys += 1
+
+    started = time.perf_counter()
+    try:
+        async with client:
+            await asyncio.gather(*(virtual_customer() for _ in range(max(1, customers))))
+    finally:
+        if started_app:
+            from app import shutdown
+            shutdown()
+    report.duration_s = time.perf_counter() - started
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Drive concurrent customer journeys against /chat")
+    parser.add_argument("--customers", type=int, default=10, help="concurrent virtual customers")
+    parser.add_argument("--journeys", type=int, default=100, help="total journeys to run")
+    parser.add_argument("--url", default=None, help="target a running server instead of the in-process app")
+    parser.add_argument("--seed", type=int, default=0, help="seed for journey variants")
+    parser.add_argument("--llm", choices=["demo", "fake"], default="demo",
+                        help="in-process stub: the fake LLM answering instantly (demo) or with --profile latency")
+    parser.add_argument("--profile", default="realistic",
+                        help="fake LLM latency profile, e.g. realistic, heavy_tail, fixed:fixed_ms=250")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load(args.customers, args.journeys, args.url, args.seed,
+                                  llm=args.llm, profile=args.profile))
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report.format_text())
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,16 @@ from dataclasses import dataclass, field
 from datetime import datetime
 import json
 import os
+import time
+import uuid
+
+from metrics import AGENT_CALLS, AGENT_LATENCY, LLM_TOKENS, ERRORS
+from lucy_logging import get_logger, log_context
+from fake_llm import FakeChatModel
+from pricing import PricedOffer, price_offer
+from prompt_budget import PromptBudget
+
+logger = get_logger("ai")
 
 # Try to import LangChain, fallback to basic types if not available
 try:
@@ -36,6 +46,35 @@ except ImportError:
     LANGCHAIN_AVAILABLE = False
 
 
+def llm_enabled(llm: Any) -> bool:
+    """Whether agents should call their LLM rather than use canned demo responses"""
+    return LANGCHAIN_AVAILABLE or getattr(llm, "is_fake", False)
+
+
+def record_llm_usage(agent: str, response: Any, budget: Optional[PromptBudget] = None, prompt_tokens_sent: int = 0):
+    """Count prompt/completion tokens reported on an LLM response
+
+    With a budget, usage goes to its per-agent totals, and a response that
+    reports no usage is counted with the budget's tokenizer instead.
+    """
+    # Newer LangChain exposes usage_metadata; OpenAI responses also carry token_usage
+    usage = getattr(response, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens", 0)
+    completion_tokens = usage.get("output_tokens", 0)
+    if not usage:
+        token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0)
+        completion_tokens = token_usage.get("completion_tokens", 0)
+    if budget is not None:
+        budget.record(agent, prompt_tokens or prompt_tokens_sent,
+                      completion_tokens or budget.count(str(getattr(response, "content", ""))))
+        return
+    if prompt_tokens:
+        LLM_TOKENS.labels(agent, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(agent, "completion").inc(completion_tokens)
+
+
 class LucyTask(Enum):
     """Lucy's critical path tasks"""
     B1 = "B1"  # Photos & Location
@@ -76,6 +115,40 @@ class CustomerData:
     
     # Task completion tracking
     completed_tasks: List[LucyTask] = field(default_factory=list)
+    
+    # Photos flagged as near-duplicates of ones already submitted
+    duplicate_photos: List[str] = field(default_factory=list)
+    
+    # Background photo analysis: job_id, status, photos and, once done, the Photo Income Note
+    photo_analysis: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class LoanOffer:
+    """An offer as presented to the customer; never changed once issued"""
+    offer_id: str
+    loan_amount: int
+    tenure_days: int
+    daily_rate: float
+    total_interest: float
+    total_due: float
+    loan_type: str
+    monthly_net: float
+    created_at: str
+    
+    @classmethod
+    def issue(cls, priced: PricedOffer) -> "LoanOffer":
+        return cls(
+            offer_id=f"off_{uuid.uuid4().hex[:12]}",
+            loan_amount=priced.loan_amount,
+            tenure_days=priced.tenure_days,
+            daily_rate=priced.daily_rate,
+            total_interest=priced.total_interest,
+            total_due=priced.total_due,
+            loan_type=priced.loan_type,
+            monthly_net=priced.monthly_net,
+            created_at=datetime.now().isoformat()
+        )
 
 
 @dataclass 
@@ -85,6 +158,16 @@ class LucyState:
     customer_data: CustomerData = field(default_factory=CustomerData)
     conversation_history: List[BaseMessage] = field(default_factory=list)
     session_id: str = ""
+    # Issued offers (latest last) and the recorded decision per offer_id
+    offers: List[LoanOffer] = field(default_factory=list)
+    offer_decisions: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Bumped on every turn, so clients can tell whether anything changed
+    version: int = 0
+    created_at: float = field(default_factory=time.time)
+    
+    @property
+    def current_offer(self) -> Optional[LoanOffer]:
+        return self.offers[-1] if self.offers else None
     
     def is_task_complete(self, task: LucyTask) -> bool:
         return task in self.customer_data.completed_tasks
@@ -119,8 +202,12 @@ class LucyState:
 class PhotoVerifierAgent:
     """Specialized agent for photo analysis and income estimation"""
     
-    def __init__(self, llm: ChatOpenAI):
+    def __init__(self, llm: ChatOpenAI, photo_index: Any = None, photo_prep: Any = None,
+                 budget: Optional[PromptBudget] = None):
         self.llm = llm
+        self.photo_index = photo_index
+        self.photo_prep = photo_prep
+        self.budget = budget or PromptBudget()
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are Lucy's PhotoVerifier specialist. You analyze business photos with expertise in Kenyan micro-business environments.
 
@@ -136,9 +223,23 @@ Be warm, professional, and use emojis appropriately."""),
             ("human", "{input}")
         ])
         
-    def analyze_photos(self, photos: List[str], location: str) -> str:
+    def find_duplicates(self, photos: List[str], session_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Photos that near-duplicate earlier submissions, with their matches"""
+        if self.photo_index is None or not photos:
+            return {}
+        return self.photo_index.check(photos, session_id)
+    
+    def analyze_photos(self, photos: List[str], location: str,
+                       duplicates: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> str:
         """Analyze photos and return Lucy's response"""
         
+        if duplicates:
+            return f"""Thanks for sending these! 📸 {len(duplicates)} of them look like {"a photo" if len(duplicates) == 1 else "photos"} I've already received, so I can't use {"it" if len(duplicates) == 1 else "them"} for your assessment.
+
+Could you please take fresh photos of your shop right now:
+1️⃣ **Inside view** - showing your products/stock
+2️⃣ **Outside view** - showing your shop front"""
+        
         # Only analyze if photos are actually provided
         if not photos or len(photos) == 0:
             return f"""Thanks for sharing your location: {location}! 📍
@@ -149,7 +250,7 @@ I'd love to see your business to better understand your setup. Could you please
 
 This helps me assess your business and create the perfect loan offer for you! 📸"""
         
-        if not LANGCHAIN_AVAILABLE:
+        if not llm_enabled(self.llm):
             # Demo mode response - but only when photos are provided
             return f"""Great photos! I can see your business at {location} 📸
 
@@ -164,8 +265,9 @@ Based on what I see, this looks like a solid business! The location and setup su
 Now, tell me more about your business - what type of products do you mainly sell? 🛍️"""
         
         # Simulate photo analysis (in real implementation, this would use vision models)
-        analysis_prompt = f"""
-        A customer has shared {len(photos)} business photos and says their location is: {location}
+        system = self.prompt.format_messages(input="")[0].content
+        analysis_prompt = self.budget.fit("photo_verifier", """
+        A customer has shared {photo_count} business photos and says their location is: {location}
         
         Please provide Lucy's warm response that includes:
         1. Acknowledge the photos and location
@@ -174,12 +276,23 @@ Now, tell me more about your business - what type of products do you mainly sell
         4. Smooth transition to asking about their business type
         
         Keep it conversational and encouraging.
-        """
+        """, fixed=system, photo_count=len(photos), location=location)
         
+        # Downscaled, metadata-free copies (cached per photo) rather than raw phone photos
+        images = self.photo_prep.data_urls(photos) if self.photo_prep is not None else []
+        if images:
+            human = HumanMessage(content=[{"type": "text", "text": analysis_prompt}] +
+                                 [{"type": "image_url", "image_url": {"url": url}} for url in images])
+        else:
+            human = HumanMessage(content=analysis_prompt)
+        
+        # Image tokens are billed separately and not part of the text budget
+        prompt_tokens = self.budget.measure("photo_verifier", analysis_prompt, fixed=system)
         response = self.llm.invoke([
-            SystemMessage(content=self.prompt.format_messages(input=analysis_prompt)[0].content),
-            HumanMessage(content=analysis_prompt)
+            SystemMessage(content=system),
+            human
         ])
+        record_llm_usage("photo_verifier", response, self.budget, prompt_tokens)
         
         return response.content
 
@@ -187,8 +300,9 @@ Now, tell me more about your business - what type of products do you mainly sell
 class BusinessCoachAgent:
     """Specialized agent for relationship building and goal setting"""
     
-    def __init__(self, llm: ChatOpenAI):
+    def __init__(self, llm: ChatOpenAI, budget: Optional[PromptBudget] = None):
         self.llm = llm
+        self.budget = budget or PromptBudget()
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", """You are Lucy's BusinessCoach specialist. You excel at the "outside-in" approach:
 - Start with identity and dreams before numbers
@@ -234,7 +348,7 @@ What type of business do you run? (grocery shop, restaurant, salon, etc.)
 
 And what do you **love most** about running your business? 💫"""
         
-        if not LANGCHAIN_AVAILABLE:
+        if not llm_enabled(self.llm):
             # Demo mode responses - but more contextual
             if current_task == LucyTask.E4A:
                 return """Perfect! Now I'd love to learn more about you and your business. 
@@ -263,19 +377,29 @@ Once I understand this, I might even be able to create a helpful resource or too
             else:
                 return "Let me help you with the next step in our conversation! 😊"
         
+        # Customer answers are budgeted; they can be arbitrarily long
+        system = self.prompt.format_messages(input="")[0].content
         if current_task == LucyTask.E4A:
             prompt = "Ask the customer what kind of business they run and what they love about it. Be warm and encouraging."
         elif current_task == LucyTask.E4B:
-            prompt = f"The customer loves: '{customer_data.what_they_love}' about their {customer_data.business_type}. Now ask about their 1-3 month goal."
+            prompt = self.budget.fit(
+                "business_coach",
+                "The customer loves: '{loves}' about their {business_type}. Now ask about their 1-3 month goal.",
+                fixed=system, loves=customer_data.what_they_love, business_type=customer_data.business_type)
         elif current_task == LucyTask.E6:
-            prompt = f"The customer's goal is: '{customer_data.goal}'. Ask about their biggest challenge and offer to create a helpful asset."
+            prompt = self.budget.fit(
+                "business_coach",
+                "The customer's goal is: '{goal}'. Ask about their biggest challenge and offer to create a helpful asset.",
+                fixed=system, goal=customer_data.goal)
         else:
             prompt = "Continue the coaching conversation naturally."
             
+        prompt_tokens = self.budget.measure("business_coach", prompt, fixed=system)
         response = self.llm.invoke([
-            SystemMessage(content=self.prompt.format_messages(input=prompt)[0].content),
+            SystemMessage(content=system),
             HumanMessage(content=prompt)
         ])
+        record_llm_usage("business_coach", response, self.budget, prompt_tokens)
         
         return response.content
     
@@ -372,22 +496,22 @@ Now, what's the **biggest challenge or opportunity** you're facing right now?"""
         else:
             return "I need your sales numbers to help structure the right loan for you."
     
-    def generate_loan_offer(self, customer_data: CustomerData) -> str:
-        """Generate final loan offer using the proper function"""
+    def generate_loan_offer(self, customer_data: CustomerData, offer: Optional[LoanOffer] = None) -> str:
+        """Generate final loan offer using the proper function
         
-        # Calculate loan offer parameters
-        monthly_gross = customer_data.daily_sales * 26 if customer_data.daily_sales else 20000
-        monthly_net = monthly_gross * 0.6  # 40% COGS
+        Renders `offer` when given so the terms shown are the ones stored on the
+        session; otherwise prices the customer data without storing anything.
+        """
         
-        # Basic loan calculation (20% of net monthly income)
-        base_amount = max(10000, int(monthly_net * 0.2))
-        loan_amount = min(50000, base_amount)  # Cap at 50K for first loans
-        loan_amount = round(loan_amount / 500) * 500  # Round to nearest 500
+        # Calculate loan offer parameters
+        terms = offer or price_offer(customer_data.daily_sales)
+        monthly_net = terms.monthly_net
+        loan_amount = terms.loan_amount
         
         # Terms
-        tenure_days = 30
-        daily_rate = 0.006  # 0.6%
-        loan_type = "SHORT_TERM" if tenure_days <= 60 else "LONG_TERM"
+        tenure_days = terms.tenure_days
+        daily_rate = terms.daily_rate
+        loan_type = terms.loan_type
         
         # Create underwriting summary
         underwriting_summary = {
@@ -417,8 +541,7 @@ Now, what's the **biggest challenge or opportunity** you're facing right now?"""
         }
         
         # Calculate total due
-        total_interest = loan_amount * daily_rate * tenure_days
-        total_due = loan_amount + total_interest
+        total_due = terms.total_due
         
         # Due date
         from datetime import datetime, timedelta
@@ -473,17 +596,34 @@ Ready to grow your business? 🚀"""
 class LucyAI:
     """Main Lucy AI system - seamless customer experience with multi-agent backend"""
     
-    def __init__(self, openai_api_key: str):
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=openai_api_key,
-            temperature=0.7
-        )
-        
-        # Initialize specialized agents
-        self.photo_verifier = PhotoVerifierAgent(self.llm)
-        self.business_coach = BusinessCoachAgent(self.llm)
-        self.underwriter = UnderwriterAgent(self.llm)
+    def __init__(self, openai_api_key: str, llm_provider: Optional[str] = None, llm: Any = None,
+                 photo_index: Any = None, photo_prep: Any = None, jobs: Any = None,
+                 budget: Optional[PromptBudget] = None):
+        # LLM_PROVIDER=fake selects the deterministic fake model for offline perf runs;
+        # an explicit llm instance takes precedence over both
+        self.llm_provider = (llm_provider or os.getenv("LLM_PROVIDER", "openai")).lower()
+        if llm is not None:
+            self.llm = llm
+        elif self.llm_provider == "fake":
+            self.llm = FakeChatModel.from_env()
+        else:
+            self.llm = ChatOpenAI(
+                model="gpt-4o-mini",
+                api_key=openai_api_key,
+                temperature=0.7
+            )
+        
+        # Initialize specialized agents, sharing one set of prompt budgets and usage totals
+        self.budget = budget or PromptBudget()
+        self.photo_verifier = PhotoVerifierAgent(self._agent_llm("photo_verifier"), photo_index, photo_prep,
+                                                 self.budget)
+        self.business_coach = BusinessCoachAgent(self._agent_llm("business_coach"), self.budget)
+        self.underwriter = UnderwriterAgent(self._agent_llm("underwriter"))
+        
+        # With a job queue, photo analysis runs in the background while the chat moves on
+        self.jobs = jobs
+        if jobs is not None:
+            jobs.register("photo_analysis", self._run_photo_analysis)
         
         # Router for determining which agent to use
         self.router_prompt = ChatPromptTemplate.from_messages([
@@ -500,34 +640,73 @@ Current task priorities:
 Return only: "photo_verifier", "business_coach", or "underwriter" """),
             ("human", "Current task: {current_task}\nCustomer message: {message}")
         ])
+        
+        logger.info("lucy ai initialized", extra={"fields": {
+            "langchain_available": LANGCHAIN_AVAILABLE,
+            "llm_provider": self.llm_provider
+        }})
+    
+    def _agent_llm(self, agent: str):
+        """LLM handle for one agent; the fake model is pinned to that agent's canned replies,
+        a LangChain model has the reply capped at the agent's output budget"""
+        if hasattr(self.llm, "bind_agent"):
+            return self.llm.bind_agent(agent)
+        if hasattr(self.llm, "bind"):
+            return self.llm.bind(max_tokens=self.budget.max_output_tokens(agent))
+        return self.llm
     
-    def chat(self, message: str, photos: List[str] = None, state: LucyState = None) -> Tuple[str, LucyState]:
+    def chat(self, message: str, photos: List[str] = None, state: LucyState = None,
+             session_id: Optional[str] = None) -> Tuple[str, LucyState]:
         """Main chat interface - customer sends message, gets Lucy's response"""
         
         if state is None:
-            state = LucyState(session_id=str(datetime.now().timestamp()))
+            state = LucyState(session_id=session_id or str(datetime.now().timestamp()))
         
-        # Add customer message to history
+        # Add customer message to history; the version only moves once the turn succeeds
+        history_len = len(state.conversation_history)
         state.conversation_history.append(HumanMessage(content=message))
+        self.sync_photo_analysis(state)
         
         # Handle initial greeting
         if not state.conversation_history or len(state.conversation_history) == 1:
             response = self._initial_greeting()
             state.conversation_history.append(AIMessage(content=response))
+            state.version += 1
             return response, state
         
         # Route to appropriate agent
         agent_choice = self._route_message(message, state.current_task)
         
-        # Process with chosen agent
-        response = self._process_with_agent(agent_choice, message, photos, state)
-        
-        # Update state based on response
-        self._update_state(response, message, photos, state)
-        
-        # Add response to history
-        state.conversation_history.append(AIMessage(content=response))
+        # Process with chosen agent, measuring latency per agent and task;
+        # records logged during the turn carry the task it started in
+        task_label = state.current_task.value
+        with log_context(task=task_label):
+            AGENT_CALLS.labels(agent_choice, task_label).inc()
+            started = time.perf_counter()
+            try:
+                response = self._process_with_agent(agent_choice, message, photos, state)
+            except Exception as e:
+                ERRORS.labels(agent_choice, type(e).__name__).inc()
+                # A failed turn leaves the session as it was, the customer's message included
+                del state.conversation_history[history_len:]
+                raise
+            finally:
+                AGENT_LATENCY.labels(agent_choice, task_label).observe(time.perf_counter() - started)
+        
+            # Update state based on response
+            previous_task = state.current_task
+            self._update_state(response, message, photos, state)
+            logger.debug("agent turn", extra={"fields": {
+                "agent": agent_choice,
+                "next_task": state.current_task.value,
+                "advanced": state.current_task != previous_task,
+                "photos": len(photos or [])
+            }})
+        
+            # Add response to history
+            state.conversation_history.append(AIMessage(content=response))
         
+        state.version += 1
         return response, state
     
     def _initial_greeting(self) -> str:
@@ -559,7 +738,13 @@ Ready to get started? Send me 2 photos of your business (inside and outside) and
         # Route to appropriate specialized agent based on current task
         if agent == "photo_verifier":
             if photos or "photo" in message.lower():
-                return self.photo_verifier.analyze_photos(photos or [], message)
+                duplicates = self.photo_verifier.find_duplicates(photos or [], state.session_id)
+                for photo in duplicates:
+                    if photo not in state.customer_data.duplicate_photos:
+                        state.customer_data.duplicate_photos.append(photo)
+                if photos and not duplicates and self.jobs is not None:
+                    return self._start_photo_analysis(photos, message, state)
+                return self.photo_verifier.analyze_photos(photos or [], message, duplicates)
             else:
                 return self._get_photo_prompt()
         
@@ -584,13 +769,75 @@ Ready to get started? Send me 2 photos of your business (inside and outside) and
                 elif any(word in message.lower() for word in ["no", "reject", "decline"]):
                     return self._get_acceptance_response(False)
                 else:
-                    return self.underwriter.generate_loan_offer(state.customer_data)
+                    return self.underwriter.generate_loan_offer(state.customer_data, self._current_offer(state))
             else:
                 return "Let me gather some more information to help you better."
         
         else:
             return self._get_fallback_response(state.current_task)
     
+    def _start_photo_analysis(self, photos: List[str], message: str, state: LucyState) -> str:
+        """Queue the photo analysis and acknowledge the photos straight away"""
+        job = self.jobs.submit("photo_analysis", {"photos": list(photos), "location": message},
+                               session_id=state.session_id)
+        state.customer_data.photo_analysis = {"job_id": job.job_id, "queue": self.jobs.instance_id,
+                                              "status": "pending", "photos": list(photos)}
+        if state.customer_data.location or self._extract_location(message):
+            return """Thanks for the photos! 📸 I'm taking a closer look at them now and will add my notes to your profile shortly.
+
+While I do that, tell me about your business - what type of products do you mainly sell? 🛍️"""
+        return """Thanks for the photos! 📸 I'm taking a closer look at them now.
+
+Could you also tell me your **exact location** (market name, lane/section, area)? 📍"""
+    
+    def _run_photo_analysis(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"note": self.photo_verifier.analyze_photos(payload["photos"], payload["location"])}
+    
+    def photo_analysis_status(self, state: LucyState) -> Dict[str, Any]:
+        """The session's photo analysis, with the live job status while it is pending"""
+        analysis = dict(state.customer_data.photo_analysis)
+        if analysis.get("status") == "pending" and self.jobs is not None:
+            job = self.jobs.get(analysis["job_id"])
+            if job is not None:
+                analysis.update(self._analysis_outcome(job) or {"status": "pending", "job_status": job.status})
+        return analysis
+    
+    def sync_photo_analysis(self, state: LucyState) -> bool:
+        """Attach a finished analysis to the session; re-queue one whose job was lost with a
+        previous process. Returns whether the session changed."""
+        analysis = state.customer_data.photo_analysis
+        if analysis.get("status") != "pending" or self.jobs is None:
+            return False
+        job = self.jobs.get(analysis["job_id"])
+        if job is None and analysis.get("queue") == self.jobs.instance_id:
+            # Ran in this process but its result was dropped from the queue's history
+            # before it was saved; analysing the photos again would bill them twice
+            logger.warning("photo analysis result expired before it was saved",
+                           extra={"fields": {"job_id": analysis["job_id"]}})
+            state.customer_data.photo_analysis = {**analysis, "status": "failed",
+                                                  "error": "Analysis result expired before it was saved"}
+            return True
+        if job is None:
+            job = self.jobs.submit("photo_analysis", {"photos": analysis["photos"],
+                                                      "location": state.customer_data.location},
+                                   session_id=state.session_id)
+            state.customer_data.photo_analysis = {**analysis, "job_id": job.job_id,
+                                                  "queue": self.jobs.instance_id}
+            return True
+        outcome = self._analysis_outcome(job)
+        if outcome is None:
+            return False
+        state.customer_data.photo_analysis = {**analysis, **outcome}
+        return True
+    
+    @staticmethod
+    def _analysis_outcome(job: Any) -> Optional[Dict[str, Any]]:
+        if job.status == "done":
+            return {"status": "done", "note": job.result["note"], "finished_at": job.finished_at}
+        if job.status == "failed":
+            return {"status": "failed", "error": job.error, "finished_at": job.finished_at}
+        return None
+    
     def _get_photo_prompt(self) -> str:
         """Prompt for photos when none provided"""
         return """Perfect! To get started, I'll need to see your business. 📸
@@ -704,8 +951,9 @@ I'm your business partner whether you take a loan or not! What would be most hel
                 if potential_location:
                     state.customer_data.location = potential_location
             
-            # Only complete B1 if we have both photos AND location
-            if photos and len(photos) > 0:
+            # Only complete B1 if we have both photos AND location; flagged
+            # duplicates have to be replaced first
+            if photos and not any(photo in state.customer_data.duplicate_photos for photo in photos):
                 state.customer_data.photos = photos
                 if state.customer_data.location:  # Only advance if we have location too
                     state.complete_task(LucyTask.B1)
@@ -756,11 +1004,11 @@ I'm your business partner whether you take a loan or not! What would be most hel
         elif state.current_task == LucyTask.OFFER:
             if any(word in message.lower() for word in ["yes", "accept", "agree", "take"]):
                 # Customer accepted the loan offer
-                self._handle_loan_acceptance(state.customer_data, True)
+                self._handle_loan_acceptance(state, True)
                 state.complete_task(LucyTask.OFFER)
             elif any(word in message.lower() for word in ["no", "reject", "decline"]):
                 # Customer rejected the loan offer  
-                self._handle_loan_acceptance(state.customer_data, False)
+                self._handle_loan_acceptance(state, False)
     
     def _extract_location(self, message: str) -> str:
         """Extract location from customer message"""
@@ -861,25 +1109,39 @@ I'm your business partner whether you take a loan or not! What would be most hel
         
         return uses if uses else ["General business needs"]
     
-    def _handle_loan_acceptance(self, customer_data: CustomerData, accepted: bool):
-        """Handle loan acceptance or rejection"""
+    def _current_offer(self, state: LucyState) -> LoanOffer:
+        """The session's latest offer, issuing one the first time it is needed"""
+        offer = state.current_offer
+        if offer is None:
+            offer = LoanOffer.issue(price_offer(state.customer_data.daily_sales))
+            state.offers.append(offer)
+        return offer
+    
+    def _handle_loan_acceptance(self, state: LucyState, accepted: bool) -> Dict[str, Any]:
+        """Handle loan acceptance or rejection of the session's current offer
         
-        # Calculate loan parameters
-        monthly_gross = customer_data.daily_sales * 26 if customer_data.daily_sales else 20000
-        monthly_net = monthly_gross * 0.6
-        base_amount = max(10000, int(monthly_net * 0.2))
-        loan_amount = min(50000, base_amount)
-        loan_amount = round(loan_amount / 500) * 500
+        Idempotent per offer: a repeated decision, or anything after an
+        acceptance, returns the stored record without calling
+        store_customer_acceptance again. A decline can still become an acceptance.
+        """
+        
+        offer = self._current_offer(state)
+        decision = state.offer_decisions.get(offer.offer_id)
+        if decision is not None and (decision["accepted"] or decision["accepted"] == accepted):
+            return decision
         
         # Store customer acceptance
-        self.store_customer_acceptance(
-            loanAmount=loan_amount,
-            tenure=30,  # days converted to months would be 1
+        decision = self.store_customer_acceptance(
+            loanAmount=offer.loan_amount,
+            tenure=offer.tenure_days,  # days converted to months would be 1
             repaymentFrequency="One-time",  # Matches the 30-day term
             accepted=accepted,
-            interestRate=0.006,  # 0.6% daily
-            loanType="SHORT_TERM"
+            interestRate=offer.daily_rate,  # 0.6% daily
+            loanType=offer.loan_type
         )
+        decision["offer_id"] = offer.offer_id
+        state.offer_decisions[offer.offer_id] = decision
+        return decision
     
     def store_customer_acceptance(self, loanAmount: int, tenure: int, repaymentFrequency: str, 
                                  accepted: bool, interestRate: float, loanType: str) -> dict:
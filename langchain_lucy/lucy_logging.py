@@ -0,0 +1,179 @@
+"""
+Lucy 2.0 - Structured logging
+Queue-backed JSON logs written by a background thread, with per-level sampling
+and session/task context so request handlers never block on stdout
+"""
+
+from typing import Dict, Optional
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+from metrics import REGISTRY
+
+# Context fields attached to every record logged inside a request or turn
+_session_id: ContextVar[str] = ContextVar("lucy_session_id", default="")
+_task: ContextVar[str] = ContextVar("lucy_task", default="")
+
+# Default keep-rate per level; WARNING and above are never sampled out
+DEFAULT_SAMPLING = {"DEBUG": 0.1, "INFO": 1.0}
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "lucy_log_records_dropped_total", "Log records dropped because the log queue was full")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+class ContextFilter(logging.Filter):
+    """Capture the caller's context vars before the record crosses threads"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.session_id = _session_id.get()
+        record.task = _task.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records at high-volume levels"""
+
+    def __init__(self, rates: Dict[str, float], seed: Optional[int] = None):
+        super().__init__()
+        self.rates = {logging.getLevelName(level.upper()): rate for level, rate in rates.items()}
+        self._random = random.Random(seed)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or self._random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, event, context and fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        if getattr(record, "session_id", ""):
+            entry["session_id"] = record.session_id
+        if getattr(record, "task", ""):
+            entry["task"] = record.task
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that defers formatting to the writer thread and never blocks"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue is in-process, so the record (and any exc_info) can be passed
+        # through as-is; formatting and JSON encoding happen in the listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parse "DEBUG=0.1,INFO=0.5" into per-level keep rates"""
+    rates = dict(DEFAULT_SAMPLING)
+    for part in filter(None, (item.strip() for item in spec.split(","))):
+        level, _, rate = part.partition("=")
+        rates[level.strip().upper()] = float(rate)
+    return rates
+
+
+def setup_logging(level: Optional[str] = None, sampling: Optional[Dict[str, float]] = None,
+                  stream=None, max_queue: int = 10000) -> logging.Logger:
+    """Install the queue-backed JSON handler on the "lucy" logger (idempotent)"""
+    global _listener, _handler
+
+    root = logging.getLogger("lucy")
+    if _listener is not None:
+        return root
+
+    level = level or os.getenv("LUCY_LOG_LEVEL", "INFO")
+    if sampling is None:
+        sampling = parse_sampling(os.getenv("LUCY_LOG_SAMPLING", ""))
+
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=max_queue)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sampling))
+    handler.addFilter(ContextFilter())
+
+    root.setLevel(level.upper())
+    root.addHandler(handler)
+    root.propagate = False
+    _handler = handler
+
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """Flush queued records, stop the background writer and remove the handler,
+    so a later setup_logging() starts from a clean logger"""
+    global _listener, _handler
+
+    if _handler is not None:
+        logging.getLogger("lucy").removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        atexit.unregister(shutdown_logging)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the "lucy" hierarchy, configuring logging on first use"""
+    setup_logging()
+    return logging.getLogger(f"lucy.{name}")
+
+
+class log_context:
+    """Attach session_id/task to every record logged inside the block
+
+    A plain context manager rather than a generator: it wraps every chat turn.
+    """
+
+    __slots__ = ("_session_id", "_task", "_tokens")
+
+    def __init__(self, session_id: Optional[str] = None, task: Optional[str] = None):
+        self._session_id = session_id
+        self._task = task
+        self._tokens = []
+
+    def __enter__(self):
+        if self._session_id is not None:
+            self._tokens.append((_session_id, _session_id.set(self._session_id)))
+        if self._task is not None:
+            self._tokens.append((_task, _task.set(self._task)))
+        return None
+
+    def __exit__(self, *exc_info):
+        while self._tokens:
+            var, token = self._tokens.pop()
+            var.reset(token)
+        return False
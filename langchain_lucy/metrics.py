@@ -0,0 +1,299 @@
+"""
+Lucy 2.0 - Prometheus-style metrics
+Counters, gauges and latency histograms rendered in the text exposition format
+"""
+
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+from bisect import bisect_left
+import threading
+import time
+
+
+# Latency buckets in seconds - covers in-process demo turns up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _CounterChild:
+    """A single labelled counter or gauge value"""
+
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        # One lock per label set, so writers to different series never contend
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _HistogramChild:
+    """A single labelled histogram with fixed bucket boundaries"""
+
+    __slots__ = ("_upper_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, upper_bounds: Sequence[float]):
+        self._upper_bounds = upper_bounds
+        # Non-cumulative bucket counts; the last slot is the +Inf bucket
+        self._counts = [0] * (len(upper_bounds) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self) -> "_Timer":
+        """Context manager observing the elapsed wall time of its block"""
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Timer:
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _Metric:
+    """Base class for a named metric family with optional labels"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        # Only guards creation of new label sets, never the hot update path
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: Any):
+        """Get the child series for the given label values"""
+        # Label values are nearly always strings already, so try them as the key first
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _series(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def _label_text(self, values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        return [f"{self.name}{self._label_text(key)} {_format_value(child.value)}" for key, child in self._series()]
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def collect(self) -> Dict[Tuple[str, ...], float]:
+        """Current value of every label set"""
+        return {key: child.value for key, child in self._series()}
+
+
+class Gauge(Counter):
+    """Value that can go up and down, e.g. in-flight requests"""
+
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, typically latencies in seconds"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        for key, child in self._series():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets, counts):
+                cumulative += count
+                label_text = self._label_text(key, ("le", _format_value(upper_bound)))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{self._label_text(key, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Collection of metric families exposed together on /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def percentile(sorted_samples: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sample list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, int(-(-q * len(sorted_samples) // 100)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def latency_summary(samples: Sequence[float]) -> Dict[str, float]:
+    """count/mean/p50/p95/p99/max of latency samples, reported in milliseconds"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+# Content type expected by Prometheus scrapers
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+# HTTP layer
+HTTP_REQUESTS = REGISTRY.counter(
+    "lucy_http_requests_total", "HTTP requests handled", ("route", "method", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "lucy_http_request_duration_seconds", "HTTP request latency", ("route", "method"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "lucy_http_requests_in_flight", "HTTP requests currently being handled", ("route",))
+
+# Agent layer - one series per agent and LucyTask
+AGENT_CALLS = REGISTRY.counter(
+    "lucy_agent_calls_total", "Specialist agent invocations", ("agent", "task"))
+AGENT_LATENCY = REGISTRY.histogram(
+    "lucy_agent_call_duration_seconds", "Specialist agent call latency, including LLM time", ("agent", "task"))
+LLM_TOKENS = REGISTRY.counter(
+    "lucy_llm_tokens_total", "LLM tokens consumed", ("agent", "kind"))
+
+# Errors and sessions
+ERRORS = REGISTRY.counter(
+    "lucy_errors_total", "Errors raised while handling requests", ("where", "type"))
+ACTIVE_SESSIONS = REGISTRY.gauge(
+    "lucy_active_sessions", "Sessions currently held in memory")
+IDEMPOTENT_REPLAYS = REGISTRY.counter(
+    "lucy_idempotent_replays_total", "Chat requests answered from the idempotency cache")
+SESSION_EVICTIONS = REGISTRY.counter(
+    "lucy_session_evictions_total", "Sessions dropped from the in-memory cache", ("reason",))
+SESSION_RELOADS = REGISTRY.counter(
+    "lucy_session_reloads_total", "Evicted sessions reloaded from the journal on a cache miss")
+SESSION_RESIDENT_BYTES = REGISTRY.gauge(
+    "lucy_session_resident_bytes", "Estimated snapshot bytes of sessions held in memory")
+PHOTO_UPLOADS = REGISTRY.counter(
+    "lucy_photo_uploads_total", "Uploaded photos by outcome", ("result",))
+PHOTO_UPLOAD_BYTES = REGISTRY.counter(
+    "lucy_photo_upload_bytes_total", "Bytes of uploaded photos, including duplicates")
@@ -0,0 +1,170 @@
+"""
+Lucy 2.0 - Photo duplicate index
+Perceptual hashes (dHash) of every submitted photo in a multi-index hash table,
+so a resubmitted or lightly edited image is found among all sessions' photos
+without comparing it to each one
+"""
+
+from typing import Dict, List, Any, Callable, Iterable, Optional, Tuple
+from itertools import combinations
+import threading
+
+from lucy_logging import get_logger
+
+logger = get_logger("photo_index")
+
+# Pillow is optional; without it photos are simply not indexed
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+HASH_BITS = 64
+# Near-duplicate threshold: re-encoded, resized or recompressed copies of a
+# photo land within a few bits; different photos are ~32 bits apart
+DEFAULT_MAX_DISTANCE = 6
+
+
+def dhash(path: str, hash_size: int = 8) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a grayscale thumbnail"""
+    resample = getattr(Image, "Resampling", Image).LANCZOS
+    with Image.open(path) as image:
+        # JPEGs decode straight to a reduced scale, which is most of the speed-up
+        image.draft("L", (hash_size * 8, hash_size * 8))
+        pixels = image.convert("L").resize((hash_size + 1, hash_size), resample).tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class MultiIndexHash:
+    """Hamming-radius search over 64-bit hashes (multi-index hashing)
+
+    Each hash is split into `chunks` substrings, each with its own table. Two
+    hashes within distance r agree to within r // chunks bits on at least one
+    substring (pigeonhole), so a query only probes the few table cells near
+    its own substrings and verifies those candidates, instead of scanning
+    every stored hash.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE, chunks: int = 4, bits: int = HASH_BITS):
+        self.max_distance = max_distance
+        self.chunks = chunks
+        self.chunk_bits = bits // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self._values: Dict[int, List[Any]] = {}
+        # XOR masks flipping up to r // chunks bits of one substring
+        radius = max_distance // chunks
+        self._probes = [0] + [sum(1 << bit for bit in flipped)
+                              for flips in range(1, radius + 1)
+                              for flipped in combinations(range(self.chunk_bits), flips)]
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self._values.values())
+
+    def _substrings(self, value: int) -> List[int]:
+        return [(value >> (index * self.chunk_bits)) & self._mask for index in range(self.chunks)]
+
+    def add(self, value: int, item: Any):
+        items = self._values.get(value)
+        if items is None:
+            items = self._values[value] = []
+            for table, substring in zip(self._tables, self._substrings(value)):
+                table.setdefault(substring, []).append(value)
+        items.append(item)
+
+    def search(self, value: int, max_distance: Optional[int] = None) -> List[Tuple[int, Any]]:
+        """(distance, item) for stored items within max_distance bits, nearest first"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        seen = set()
+        matches = []
+        for table, substring in zip(self._tables, self._substrings(value)):
+            for probe in self._probes:
+                for candidate in table.get(substring ^ probe, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = hamming(value, candidate)
+                    if distance <= max_distance:
+                        matches.extend((distance, item) for item in self._values[candidate])
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class PhotoIndex:
+    """Index of every photo seen, by perceptual hash, with the session that sent it
+
+    `resolve` maps a photo reference (e.g. an uploaded ph_ ID) to a file path,
+    or None for references that cannot be read; those are skipped.
+    """
+
+    def __init__(self, resolve: Callable[[str], Optional[str]], max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.resolve = resolve
+        self._table = MultiIndexHash(max_distance)
+        self._hashes: Dict[str, Optional[int]] = {}  # photo reference -> hash (content never changes)
+        self._indexed = set()  # (photo, session_id) pairs already added
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._table)
+
+    def hash_of(self, photo: str) -> Optional[int]:
+        if photo in self._hashes:
+            return self._hashes[photo]
+        value = None
+        path = self.resolve(photo)
+        if path is not None and PIL_AVAILABLE:
+            try:
+                value = dhash(path)
+            except (OSError, ValueError) as e:
+                logger.warning("photo could not be hashed", extra={"fields": {"photo": photo, "error": str(e)}})
+        self._hashes[photo] = value
+        return value
+
+    def check(self, photos: Iterable[str], session_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """Find near-duplicates of a submission, then index it
+
+        A photo is a duplicate if it matches one sent by another session or
+        another photo earlier in the same submission; a session resending its
+        own earlier photo, or listing the same photo twice, is not. Returns photo -> matches, for flagged photos only.
+        """
+        photos = list(photos)
+        hashes = [(photo, self.hash_of(photo)) for photo in photos]  # image decoding outside the lock
+        flagged: Dict[str, List[Dict[str, Any]]] = {}
+        with self._lock:
+            for position, (photo, value) in enumerate(hashes):
+                if value is None:
+                    continue
+                matches = [{"photo": other, "session_id": owner, "distance": distance}
+                           for distance, (other, owner) in self._table.search(value) if owner != session_id]
+                matches += [{"photo": other, "session_id": session_id, "distance": hamming(value, other_value)}
+                            for other, other_value in hashes[:position]
+                            if other != photo and other_value is not None
+                            and hamming(value, other_value) <= self._table.max_distance]
+                if matches:
+                    flagged[photo] = matches
+            for photo, value in hashes:
+                if value is not None and (photo, session_id) not in self._indexed:
+                    self._indexed.add((photo, session_id))
+                    self._table.add(value, (photo, session_id))
+        return flagged
+
+    def add(self, photos: Iterable[str], session_id: str):
+        """Index photos without checking them (e.g. sessions recovered at startup)"""
+        for photo in photos:
+            value = self.hash_of(photo)
+            with self._lock:
+                if value is not None and (photo, session_id) not in self._indexed:
+                    self._indexed.add((photo, session_id))
+                    self._table.add(value, (photo, session_id))
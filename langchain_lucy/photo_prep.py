@@ -0,0 +1,155 @@
+"""
+Lucy 2.0 - Photo preprocessing
+Model-ready copies of customer photos: orientation applied, EXIF and other
+metadata stripped, downscaled to what the vision model actually looks at and
+re-encoded as JPEG. Runs in a process pool; results are cached on disk by the
+source's content hash, so each photo is processed once
+"""
+
+from typing import Dict, List, Any, Callable, Iterable, Optional
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, TimeoutError
+import base64
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+
+from lucy_logging import get_logger
+from photo_store import is_photo_id, sniff_content_type
+# The pool runs photo_prep_worker, which imports nothing from the server;
+# without Pillow photos are sent to the model untouched
+from photo_prep_worker import PIL_AVAILABLE, PrepSettings, prepare_image
+import metrics
+
+logger = get_logger("photo_prep")
+
+PHOTO_PREP = metrics.REGISTRY.counter(
+    "lucy_photo_prep_total", "Photo preprocessing requests by outcome", ("result",))
+PHOTO_PREP_LATENCY = metrics.REGISTRY.histogram(
+    "lucy_photo_prep_seconds", "Time to preprocess one photo in the pool")
+PHOTO_PREP_BYTES = metrics.REGISTRY.counter(
+    "lucy_photo_prep_bytes_total", "Bytes before and after preprocessing", ("stage",))
+
+
+def content_key(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+class PhotoPreprocessor:
+    """Cached, pooled preprocessing of photo references
+
+    `resolve` maps a photo reference to its file path (None if unreadable).
+    Concurrent requests for the same photo share one job; the pool is created
+    on first use. `timeout` bounds how long a call waits for the pool.
+    """
+
+    def __init__(self, cache_dir: str, resolve: Callable[[str], Optional[str]],
+                 settings: PrepSettings = PrepSettings(), workers: int = 2, executor: Optional[Executor] = None,
+                 timeout: float = 30.0):
+        self.cache_dir = cache_dir
+        self.resolve = resolve
+        self.settings = settings
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = executor
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            # spawn: forking a server with live threads (journal writer, threadpool) is unsafe.
+            # A spawned worker re-imports the main script, so the server must not start
+            # anything at import time (app.py does it in startup())
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def cached_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[-2:], f"{key}-{self.settings.variant}.jpg")
+
+    def submit(self, photo: str) -> Optional[Future]:
+        """Start preparing a photo; the future resolves to the derived path. None if unreadable."""
+        source = self.resolve(photo)
+        if source is None or not PIL_AVAILABLE:
+            return None
+        key = photo if is_photo_id(photo) else content_key(source)
+        destination = self.cached_path(key)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending
+            if os.path.exists(destination):
+                PHOTO_PREP.labels("cached").inc()
+                done: Future = Future()
+                done.set_result(destination)
+                return done
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            job = self._pool().submit(prepare_image, source, destination, self.settings)
+            result: Future = Future()
+            self._pending[key] = result
+        job.add_done_callback(lambda finished: self._finish(key, destination, finished, result))
+        return result
+
+    def _finish(self, key: str, destination: str, job: Future, result: Future):
+        with self._lock:
+            self._pending.pop(key, None)
+        error = job.exception()
+        if error is not None:
+            PHOTO_PREP.labels("failed").inc()
+            logger.warning("photo preprocessing failed", extra={"fields": {"key": key, "error": str(error)}})
+            result.set_exception(error)
+            return
+        info = job.result()
+        PHOTO_PREP.labels("processed").inc()
+        PHOTO_PREP_LATENCY.observe(info["seconds"])
+        PHOTO_PREP_BYTES.labels("source").inc(info["source_bytes"])
+        PHOTO_PREP_BYTES.labels("derived").inc(info["bytes"])
+        result.set_result(destination)
+
+    def prepare_many(self, photos: Iterable[str], timeout: Optional[float] = None) -> List[Optional[str]]:
+        """Derived paths for photos, prepared in parallel; None where a photo is
+        unreadable, failed, or not ready within `timeout` seconds for the whole call"""
+        futures = [self.submit(photo) for photo in photos]
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        paths = []
+        for future in futures:
+            try:
+                paths.append(future.result(max(0.0, deadline - time.monotonic())) if future is not None else None)
+            except TimeoutError:
+                PHOTO_PREP.labels("timeout").inc()
+                logger.warning("photo preprocessing timed out", extra={"fields": {"timeout_s": timeout}})
+                paths.append(None)
+            except Exception:
+                paths.append(None)
+        return paths
+
+    def data_urls(self, photos: Iterable[str], timeout: Optional[float] = None) -> List[str]:
+        """Prepared photos as base64 data URLs for a vision message
+
+        A photo that could not be prepared in time (or at all) is sent as
+        uploaded rather than held up or dropped.
+        """
+        photos = list(photos)
+        urls = []
+        for photo, path in zip(photos, self.prepare_many(photos, timeout)):
+            content_type = "image/jpeg"
+            if path is None:
+                path = self.resolve(photo)
+                if path is None:
+                    continue
+                with open(path, "rb") as f:
+                    content_type = sniff_content_type(f.read(16)) or content_type
+            with open(path, "rb") as f:
+                urls.append(f"data:{content_type};base64," + base64.b64encode(f.read()).decode("ascii"))
+        return urls
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
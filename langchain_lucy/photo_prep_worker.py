@@ -0,0 +1,54 @@
+"""
+Lucy 2.0 - Photo preprocessing worker
+The code photo_prep's process pool runs. Kept apart so a worker process only
+imports Pillow and this module, never the server's modules
+"""
+
+from typing import Dict, Any
+from dataclasses import dataclass
+import os
+import time
+
+# Pillow is optional; photo_prep does not submit work without it
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = ImageOps = None
+    PIL_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class PrepSettings:
+    """Target size and encoding; the defaults match the resolution gpt-4o-class models
+    downscale high-detail images to, so anything larger only costs upload time"""
+    max_long_side: int = 2048
+    max_short_side: int = 768
+    quality: int = 85
+
+    @property
+    def variant(self) -> str:
+        return f"{self.max_long_side}x{self.max_short_side}q{self.quality}"
+
+
+def prepare_image(source: str, destination: str, settings: PrepSettings) -> Dict[str, Any]:
+    """Write the model-ready JPEG for `source` to `destination` (runs in a worker process)"""
+    started = time.perf_counter()
+    resample = getattr(Image, "Resampling", Image).LANCZOS
+    with Image.open(source) as original:
+        # Only a JPEG needs its full decode at the target scale, not the camera's
+        original.draft("RGB", (settings.max_long_side, settings.max_long_side))
+        image = ImageOps.exif_transpose(original)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        width, height = image.size
+        scale = min(1.0, settings.max_long_side / max(width, height), settings.max_short_side / min(width, height))
+        if scale < 1.0:
+            image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), resample)
+        # Saved without exif/icc_profile, so location and device metadata are dropped
+        temporary = f"{destination}.{os.getpid()}.tmp"
+        image.save(temporary, "JPEG", quality=settings.quality, optimize=True)
+        size = image.size
+    os.replace(temporary, destination)
+    return {"width": size[0], "height": size[1], "bytes": os.path.getsize(destination),
+            "source_bytes": os.path.getsize(source), "seconds": time.perf_counter() - started}
@@ -0,0 +1,220 @@
+"""
+Lucy 2.0 - Photo store
+Content-addressed storage for business photos: uploads are streamed to disk in
+chunks while being hashed, identical photos are stored once, and each photo is
+referenced by a short ID (ph_<hex>) that /chat accepts in `photos`
+"""
+
+from typing import Dict, List, Any, Optional
+import hashlib
+import os
+import re
+import tempfile
+
+# python-multipart is optional; without it /photos is unavailable
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+    MULTIPART_AVAILABLE = True
+except ImportError:
+    MultipartParser = parse_options_header = None
+    MULTIPART_AVAILABLE = False
+
+PHOTO_ID_PREFIX = "ph_"
+# 80 bits of the SHA-256: short enough for chat payloads, collision-free in practice
+PHOTO_ID_HEX_CHARS = 20
+PHOTO_ID_RE = re.compile(rf"^{PHOTO_ID_PREFIX}[0-9a-f]{{{PHOTO_ID_HEX_CHARS}}}$")
+
+# Leading bytes that identify the accepted image formats
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+]
+_SNIFF_BYTES = 12
+
+
+class PhotoUploadError(ValueError):
+    """Upload rejected; status_code is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Image type from the first bytes of a file, or None if unsupported"""
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1"):
+        return "image/heic"
+    return None
+
+
+def is_photo_id(value: str) -> bool:
+    return bool(PHOTO_ID_RE.match(value))
+
+
+class PhotoStore:
+    """Photos on disk at <directory>/<2 hex>/<photo id>"""
+
+    def __init__(self, directory: str, max_bytes: int = 10 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._incoming = os.path.join(directory, "incoming")
+        os.makedirs(self._incoming, exist_ok=True)
+
+    def path_for(self, photo_id: str) -> str:
+        if not is_photo_id(photo_id):
+            raise KeyError(photo_id)
+        digest = photo_id[len(PHOTO_ID_PREFIX):]
+        return os.path.join(self.directory, digest[:2], photo_id)
+
+    def __contains__(self, photo_id: object) -> bool:
+        return isinstance(photo_id, str) and is_photo_id(photo_id) and os.path.exists(self.path_for(photo_id))
+
+    def writer(self, filename: Optional[str] = None) -> "PhotoWriter":
+        return PhotoWriter(self, filename)
+
+
+class PhotoWriter:
+    """Streams one photo to a temporary file, hashing as it goes"""
+
+    def __init__(self, store: PhotoStore, filename: Optional[str] = None):
+        self.store = store
+        self.filename = filename
+        self.size = 0
+        self.content_type: Optional[str] = None
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._file = tempfile.NamedTemporaryFile(dir=store._incoming, delete=False)
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.store.max_bytes:
+            raise PhotoUploadError(f"Photo exceeds {self.store.max_bytes} bytes", 413)
+        if self.content_type is None:
+            self._head += chunk[:_SNIFF_BYTES]
+            if len(self._head) >= _SNIFF_BYTES:
+                self.content_type = sniff_content_type(self._head)
+                if self.content_type is None:
+                    raise PhotoUploadError("Unsupported image type (JPEG, PNG, WebP or HEIC expected)", 415)
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> Dict[str, Any]:
+        """Move the photo into place; an identical photo already stored is kept as is"""
+        if self.content_type is None:
+            self.content_type = sniff_content_type(self._head)
+            if self.content_type is None:
+                raise PhotoUploadError("Unsupported image type (JPEG, PNG, WebP or HEIC expected)", 415)
+        self._file.close()
+        photo_id = PHOTO_ID_PREFIX + self._hash.hexdigest()[:PHOTO_ID_HEX_CHARS]
+        path = self.store.path_for(photo_id)
+        duplicate = os.path.exists(path)
+        if duplicate:
+            os.remove(self._file.name)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._file.name, path)
+        return {"photo_id": photo_id, "bytes": self.size, "content_type": self.content_type,
+                "filename": self.filename, "duplicate": duplicate}
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._file.name)
+        except FileNotFoundError:
+            pass
+
+
+class MultipartPhotoReceiver:
+    """Feed a multipart/form-data body chunk by chunk; every file part becomes a stored photo
+
+    Non-file fields are ignored. Nothing is buffered beyond the chunk being
+    parsed, so memory use does not grow with the upload size.
+    """
+
+    def __init__(self, store: PhotoStore, content_type: str, max_files: int = 10):
+        if not MULTIPART_AVAILABLE:
+            raise PhotoUploadError("Photo uploads need python-multipart", 503)
+        mime, options = parse_options_header(content_type)
+        boundary = options.get(b"boundary")
+        if mime != b"multipart/form-data" or not boundary:
+            raise PhotoUploadError("Expected multipart/form-data with a boundary", 415)
+        self.store = store
+        self.max_files = max_files
+        self.photos: List[Dict[str, Any]] = []
+        self._writer: Optional[PhotoWriter] = None
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes):
+        try:
+            self._parser.write(chunk)
+        except PhotoUploadError:
+            self.abort()
+            raise
+        except Exception as e:
+            self.abort()
+            raise PhotoUploadError(f"Malformed multipart body: {e}") from e
+
+    def finish(self) -> List[Dict[str, Any]]:
+        self._parser.finalize()
+        if self._writer is not None:
+            self.abort()
+            raise PhotoUploadError("Multipart body ended mid-file")
+        if not self.photos:
+            raise PhotoUploadError("No photo files in upload")
+        return self.photos
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        if filename is None:
+            return  # a plain form field
+        if len(self.photos) >= self.max_files:
+            raise PhotoUploadError(f"At most {self.max_files} photos per upload", 413)
+        self._writer = self.store.writer(filename.decode("utf-8", "replace"))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._writer is not None:
+            self._writer.write(data[start:end])
+
+    def _on_part_end(self):
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            try:
+                self.photos.append(writer.commit())
+            except PhotoUploadError:
+                writer.abort()
+                raise
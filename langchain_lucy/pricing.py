@@ -0,0 +1,113 @@
+"""
+Lucy 2.0 - Loan pricing engine
+Single home of the first-loan underwriting formula: a scalar path for the
+per-turn offer and a NumPy-vectorized path for repricing a whole book
+"""
+
+from typing import Dict, Any, Optional, Sequence
+from dataclasses import dataclass
+import math
+
+# NumPy is optional; price_book falls back to a pure-Python loop without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class PricingPolicy:
+    """Parameters of the first-loan formula"""
+    working_days_per_month: int = 26
+    cogs_ratio: float = 0.4  # 40% COGS
+    loan_to_net_ratio: float = 0.2  # 20% of net monthly income
+    min_amount: int = 10000
+    max_amount: int = 50000  # Cap for first loans
+    rounding: int = 500  # Round to nearest 500
+    tenure_days: int = 30
+    daily_rate: float = 0.006  # 0.6% per day
+    default_monthly_gross: float = 20000  # Used when daily sales are unknown
+
+    @property
+    def loan_type(self) -> str:
+        return "SHORT_TERM" if self.tenure_days <= 60 else "LONG_TERM"
+
+
+DEFAULT_POLICY = PricingPolicy()
+
+
+@dataclass(frozen=True)
+class PricedOffer:
+    """Loan terms for one customer"""
+    daily_sales: float
+    monthly_gross: float
+    monthly_net: float
+    loan_amount: int
+    tenure_days: int
+    daily_rate: float
+    total_interest: float
+    total_due: float
+    loan_type: str
+
+
+def price_offer(daily_sales: Optional[float], policy: PricingPolicy = DEFAULT_POLICY) -> PricedOffer:
+    """Price a single customer's offer from their daily sales (None/0 = unknown)"""
+    known = bool(daily_sales) and not math.isnan(daily_sales)
+    monthly_gross = daily_sales * policy.working_days_per_month if known else policy.default_monthly_gross
+    monthly_net = monthly_gross * (1 - policy.cogs_ratio)
+
+    base_amount = max(policy.min_amount, int(monthly_net * policy.loan_to_net_ratio))
+    loan_amount = min(policy.max_amount, base_amount)
+    loan_amount = round(loan_amount / policy.rounding) * policy.rounding
+
+    total_interest = loan_amount * policy.daily_rate * policy.tenure_days
+    return PricedOffer(
+        daily_sales=daily_sales if known else 0,
+        monthly_gross=monthly_gross,
+        monthly_net=monthly_net,
+        loan_amount=loan_amount,
+        tenure_days=policy.tenure_days,
+        daily_rate=policy.daily_rate,
+        total_interest=total_interest,
+        total_due=loan_amount + total_interest,
+        loan_type=policy.loan_type,
+    )
+
+
+def price_book(daily_sales: Sequence[Optional[float]], policy: PricingPolicy = DEFAULT_POLICY) -> Dict[str, Any]:
+    """Price many customers at once
+
+    Returns column arrays (NumPy when available, lists otherwise) for
+    monthly_gross, monthly_net, loan_amount, total_interest and total_due,
+    matching price_offer element by element.
+    """
+    if not NUMPY_AVAILABLE:
+        offers = [price_offer(sales, policy) for sales in daily_sales]
+        return {
+            "monthly_gross": [offer.monthly_gross for offer in offers],
+            "monthly_net": [offer.monthly_net for offer in offers],
+            "loan_amount": [offer.loan_amount for offer in offers],
+            "total_interest": [offer.total_interest for offer in offers],
+            "total_due": [offer.total_due for offer in offers],
+        }
+
+    sales = np.asarray(daily_sales, dtype=np.float64)
+    known = ~np.isnan(sales) & (sales != 0)
+    monthly_gross = np.where(known, sales * policy.working_days_per_month, policy.default_monthly_gross)
+    monthly_net = monthly_gross * (1 - policy.cogs_ratio)
+
+    base_amount = np.maximum(policy.min_amount, np.trunc(monthly_net * policy.loan_to_net_ratio))
+    loan_amount = np.minimum(policy.max_amount, base_amount)
+    # np.round rounds half to even, like the builtin round() in price_offer
+    loan_amount = (np.round(loan_amount / policy.rounding) * policy.rounding).astype(np.int64)
+
+    total_interest = loan_amount * policy.daily_rate * policy.tenure_days
+    return {
+        "monthly_gross": monthly_gross,
+        "monthly_net": monthly_net,
+        "loan_amount": loan_amount,
+        "total_interest": total_interest,
+        "total_due": loan_amount + total_interest,
+    }
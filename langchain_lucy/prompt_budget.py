@@ -0,0 +1,201 @@
+"""
+Lucy 2.0 - Prompt budgets
+Token limits per agent: prompts are measured with the model's tokenizer before
+each call, the variable parts (customer input, collected data) are shortened
+to fit the agent's input budget, replies are capped at its output budget, and
+the tokens each agent uses are recorded
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass
+import threading
+
+from lucy_logging import get_logger
+import metrics
+
+logger = get_logger("prompt_budget")
+
+# tiktoken is optional; without it tokens are estimated from the text length
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+DEFAULT_MODEL = "gpt-4o-mini"
+TRUNCATION_MARKER = " [...] "
+
+PROMPT_TOKENS = metrics.REGISTRY.histogram(
+    "lucy_prompt_tokens", "Prompt size per LLM call after budgeting", ("agent",),
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192))
+PROMPT_TRUNCATIONS = metrics.REGISTRY.counter(
+    "lucy_prompt_truncations_total", "Prompt variables shortened to fit an agent's input budget", ("agent",))
+
+
+@dataclass(frozen=True)
+class AgentBudget:
+    """Token limits for one agent's calls; input covers system and human messages"""
+    max_input_tokens: int = 1500
+    max_output_tokens: int = 400
+
+
+# Sized to each agent's system prompt plus a few hundred tokens of customer context
+DEFAULT_BUDGETS = {
+    "photo_verifier": AgentBudget(max_input_tokens=1500, max_output_tokens=400),
+    "business_coach": AgentBudget(max_input_tokens=1200, max_output_tokens=400),
+    "underwriter": AgentBudget(max_input_tokens=1500, max_output_tokens=500),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough count (about four characters per token) when no tokenizer is available"""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+class TokenCounter:
+    """Counts and truncates text in the model's tokens
+
+    The encoding is loaded on first use; if tiktoken is missing or cannot load
+    it, the character estimate is used instead.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        self.model = model
+        self._encoding: Any = None
+        self._loaded = False
+
+    @property
+    def encoding(self) -> Any:
+        if not self._loaded:
+            self._loaded = True
+            if TIKTOKEN_AVAILABLE:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logger.warning("tokenizer unavailable, estimating tokens",
+                                   extra={"fields": {"model": self.model, "error": str(e)}})
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return estimate_tokens(text)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Shorten text to max_tokens, keeping its start and end around a marker"""
+        if self.count(text) <= max_tokens:
+            return text
+        room = max_tokens - self.count(TRUNCATION_MARKER)
+        if room <= 0:
+            return ""
+        # The start of a message usually says what it is about, the end what is being asked
+        head, tail = room - room // 3, room // 3
+        if self.encoding is None:
+            head_text, tail_text = text[:head * 4], text[len(text) - tail * 4:] if tail else ""
+        else:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            head_text = self.encoding.decode(tokens[:head])
+            tail_text = self.encoding.decode(tokens[len(tokens) - tail:]) if tail else ""
+        return head_text + TRUNCATION_MARKER + tail_text
+
+
+def allocate(sizes: Dict[str, int], available: int) -> Dict[str, int]:
+    """Split a token allowance between variables: small ones keep their full size,
+    the rest share what is left equally"""
+    limits: Dict[str, int] = {}
+    remaining = max(0, available)
+    pending = sorted(sizes, key=sizes.get)
+    while pending:
+        name = pending.pop(0)
+        limits[name] = min(sizes[name], remaining // (len(pending) + 1))
+        remaining -= limits[name]
+    return limits
+
+
+class PromptBudget:
+    """Fits prompts to per-agent token budgets and keeps per-agent usage totals
+
+    Token counts of the fixed parts (system prompts, template text) are cached,
+    so only the variable parts are tokenized on each call.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, AgentBudget]] = None, model: str = DEFAULT_MODEL,
+                 default: AgentBudget = AgentBudget()):
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.default = default
+        self.counter = TokenCounter(model)
+        self._static: Dict[Tuple[str, ...], int] = {}
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def budget_for(self, agent: str) -> AgentBudget:
+        return self.budgets.get(agent, self.default)
+
+    def max_output_tokens(self, agent: str) -> int:
+        return self.budget_for(agent).max_output_tokens
+
+    def count(self, text: str) -> int:
+        return self.counter.count(text)
+
+    def count_static(self, text: str) -> int:
+        """Token count of text that does not change between calls (cached)"""
+        key = (text,)
+        count = self._static.get(key)
+        if count is None:
+            count = self._static.setdefault(key, self.counter.count(text))
+        return count
+
+    def _template_tokens(self, template: str, names: List[str]) -> int:
+        key = (template, *names)
+        count = self._static.get(key)
+        if count is None:
+            count = self._static.setdefault(key, self.counter.count(template.format(**{name: "" for name in names})))
+        return count
+
+    def fit(self, agent: str, template: str, fixed: str = "", **variables: Any) -> str:
+        """Fill a str.format template, shortening the variables so the prompt plus
+        `fixed` text sent with it (e.g. the system prompt) fits the agent's input budget"""
+        values = {name: str(value) for name, value in variables.items()}
+        overhead = self._template_tokens(template, sorted(values)) + self.count_static(fixed)
+        available = self.budget_for(agent).max_input_tokens - overhead
+        # A token is at least one UTF-8 byte, so short variables need no tokenizing
+        if sum(len(value.encode("utf-8")) for value in values.values()) <= available:
+            return template.format(**values)
+        sizes = {name: self.count(value) for name, value in values.items()}
+        if sum(sizes.values()) > available:
+            limits = allocate(sizes, available)
+            for name, limit in limits.items():
+                if limit < sizes[name]:
+                    values[name] = self.counter.truncate(values[name], limit)
+            PROMPT_TRUNCATIONS.labels(agent).inc()
+            logger.info("prompt truncated to budget", extra={"fields": {
+                "agent": agent, "tokens": overhead + sum(sizes.values()),
+                "budget": self.budget_for(agent).max_input_tokens}})
+        return template.format(**values)
+
+    def measure(self, agent: str, prompt: str, fixed: str = "") -> int:
+        """Prompt tokens for a call about to be made (observed in the prompt size histogram)"""
+        tokens = self.count(prompt) + self.count_static(fixed)
+        PROMPT_TOKENS.labels(agent).observe(tokens)
+        return tokens
+
+    def record(self, agent: str, prompt_tokens: int, completion_tokens: int):
+        """Add a call's token usage to the agent's totals and the token counter"""
+        if prompt_tokens:
+            metrics.LLM_TOKENS.labels(agent, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            metrics.LLM_TOKENS.labels(agent, "completion").inc(completion_tokens)
+        with self._lock:
+            totals = self._usage.setdefault(agent, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {agent: dict(totals) for agent, totals in self._usage.items()}
@@ -0,0 +1,196 @@
+"""
+Lucy 2.0 - Session cache
+Bounded in-memory session storage: idle TTL, LRU eviction by entry count and
+byte budget, and a running per-session size estimate based on the snapshot codec
+"""
+
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
+from collections import OrderedDict
+from collections.abc import MutableMapping
+import threading
+import time
+
+from lucy_ai import LucyState
+import state_codec
+
+
+def snapshot_size(state: LucyState) -> int:
+    """Estimated size of a session: the length of its encoded snapshot"""
+    return len(state_codec.encode(state))
+
+
+def delta_size(state: LucyState, history_from: int, offers_from: int) -> int:
+    """Encoded size of the messages and offers added after the given counts"""
+    return len(state_codec.pack([
+        [state_codec.message_to_primitive(message) for message in state.conversation_history[history_from:]],
+        [state_codec.offer_to_primitive(offer) for offer in state.offers[offers_from:]],
+    ]))
+
+
+class SessionCache(MutableMapping):
+    """Dict-like session store that evicts idle and least-recently-used sessions
+
+    Reads through get()/[] count as activity; iterating, items() and values()
+    do not, so listing sessions never reorders the LRU. Safe to use from the
+    event loop and threadpool at the same time.
+
+    Without a `sizer`, a session's size is its encoded snapshot length, kept
+    as a running estimate: each write adds the encoded size of the messages
+    and offers appended since the last one, and the whole snapshot is only
+    re-encoded on the first write and every `resync_every` writes after
+    (correcting drift from edited customer data).
+    """
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 0, idle_ttl: float = 0,
+                 sizer: Optional[Callable[[LucyState], int]] = None, resync_every: int = 16,
+                 on_evict: Optional[Callable[[str, LucyState, str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.sizer = sizer
+        self.resync_every = resync_every
+        self.on_evict = on_evict
+        self.clock = clock
+        # session_id -> (state, size_bytes, last_access); least recently used first
+        self._entries: "OrderedDict[str, Tuple[LucyState, int, float]]" = OrderedDict()
+        # session_id -> (history length, offer count, writes since the last full encode)
+        self._marks: Dict[str, Tuple[int, int, int]] = {}
+        self._lock = threading.RLock()
+        self.resident_bytes = 0
+        self.evictions: Dict[str, int] = {"idle": 0, "entries": 0, "bytes": 0}
+
+    def __getitem__(self, session_id: str) -> LucyState:
+        with self._lock:
+            state, size, last_access = self._entries[session_id]
+            now = self.clock()
+            if self.idle_ttl and now - last_access > self.idle_ttl:
+                evicted = self._evict(session_id, "idle")
+            else:
+                self._entries[session_id] = (state, size, now)
+                self._entries.move_to_end(session_id)
+                return state
+        self._notify(evicted)
+        raise KeyError(session_id)
+
+    def __setitem__(self, session_id: str, state: LucyState):
+        size = self._measure(session_id, state)
+        with self._lock:
+            previous = self._entries.pop(session_id, None)
+            if previous is not None:
+                self.resident_bytes -= previous[1]
+            self._entries[session_id] = (state, size, self.clock())
+            self.resident_bytes += size
+            evicted = self._expire_locked() + self._shrink_locked()
+        self._notify(*evicted)
+
+    def __delitem__(self, session_id: str):
+        with self._lock:
+            _, size, _ = self._entries.pop(session_id)
+            self._marks.pop(session_id, None)
+            self.resident_bytes -= size
+
+    def __contains__(self, session_id: object) -> bool:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry is not None and not self._is_idle(entry)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter([session_id for session_id, entry in self._entries.items() if not self._is_idle(entry)])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def items(self) -> List[Tuple[str, LucyState]]:
+        with self._lock:
+            return [(session_id, entry[0]) for session_id, entry in self._entries.items()
+                    if not self._is_idle(entry)]
+
+    def values(self) -> List[LucyState]:
+        return [state for _, state in self.items()]
+
+    def size_of(self, session_id: str) -> int:
+        with self._lock:
+            return self._entries[session_id][1]
+
+    def expire(self) -> int:
+        """Drop every idle session now; returns how many were evicted"""
+        with self._lock:
+            evicted = self._expire_locked()
+        self._notify(*evicted)
+        return len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "resident_bytes": self.resident_bytes,
+                "evictions": dict(self.evictions),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_s": self.idle_ttl,
+            }
+
+    def _measure(self, session_id: str, state: LucyState) -> int:
+        if self.sizer is not None:
+            return self.sizer(state)
+        with self._lock:
+            entry = self._entries.get(session_id)
+            mark = self._marks.get(session_id)
+        history, offers = len(state.conversation_history), len(state.offers)
+        if entry is None or mark is None or mark[2] + 1 >= self.resync_every \
+                or history < mark[0] or offers < mark[1]:
+            size, writes = snapshot_size(state), 0
+        else:
+            size, writes = entry[1] + delta_size(state, mark[0], mark[1]), mark[2] + 1
+        with self._lock:
+            self._marks[session_id] = (history, offers, writes)
+        return size
+
+    def _is_idle(self, entry: Tuple[LucyState, int, float]) -> bool:
+        return bool(self.idle_ttl) and self.clock() - entry[2] > self.idle_ttl
+
+    def _evict(self, session_id: str, reason: str) -> Tuple[str, LucyState, str]:
+        state, size, _ = self._entries.pop(session_id)
+        self._marks.pop(session_id, None)
+        self.resident_bytes -= size
+        self.evictions[reason] += 1
+        return session_id, state, reason
+
+    def _expire_locked(self) -> List[Tuple[str, LucyState, str]]:
+        """Evict idle sessions from the LRU end; stops at the first active one"""
+        evicted = []
+        if not self.idle_ttl:
+            return evicted
+        cutoff = self.clock() - self.idle_ttl
+        while self._entries:
+            session_id, (_, _, last_access) = next(iter(self._entries.items()))
+            if last_access >= cutoff:
+                break
+            evicted.append(self._evict(session_id, "idle"))
+        return evicted
+
+    def _shrink_locked(self) -> List[Tuple[str, LucyState, str]]:
+        """Evict least-recently-used sessions until within the entry and byte budgets
+
+        The most recently written session is always kept, even if it alone
+        exceeds the byte budget.
+        """
+        evicted = []
+        while len(self._entries) > 1:
+            if self.max_entries and len(self._entries) > self.max_entries:
+                reason = "entries"
+            elif self.max_bytes and self.resident_bytes > self.max_bytes:
+                reason = "bytes"
+            else:
+                break
+            evicted.append(self._evict(next(iter(self._entries)), reason))
+        return evicted
+
+    def _notify(self, *evicted: Tuple[str, LucyState, str]):
+        # Called outside the lock so hooks can touch the cache or do I/O
+        if self.on_evict:
+            for session_id, state, reason in evicted:
+                self.on_evict(session_id, state, reason)
@@ -0,0 +1,227 @@
+"""
+Lucy 2.0 - LucyState codec
+Compact, versioned binary snapshots of LucyState: every dataclass is written as
+a positional array following the field order in SCHEMA, packed with msgpack
+(or JSON when msgpack is not installed)
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import MISSING, fields
+import json
+
+from lucy_ai import (
+    LANGCHAIN_AVAILABLE, LucyState, LucyTask, CustomerData, LoanOffer,
+    BaseMessage, SystemMessage, HumanMessage, AIMessage
+)
+
+# msgpack is optional; JSON keeps snapshots readable by every deployment
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+# First byte of every snapshot says how the rest is packed
+FORMAT_MSGPACK = 0x01
+FORMAT_JSON = 0x02
+
+# Bump when a change is not append-only (removing, reordering or retyping a field)
+SCHEMA_VERSION = 1
+
+# Positional layout per dataclass, mirrored by to_primitive/from_primitive.
+# New fields are appended at the end: older snapshots then decode with the
+# dataclass default for the missing tail.
+SCHEMA: Dict[type, Tuple[str, ...]] = {
+    LucyState: ("current_task", "customer_data", "conversation_history", "session_id",
+                "offers", "offer_decisions", "version", "created_at"),
+    CustomerData: ("photos", "location", "business_type", "what_they_love", "vision", "goal",
+                   "daily_customers", "daily_sales", "weekly_sales", "expenses",
+                   "challenge", "created_asset", "loan_uses", "completed_tasks", "duplicate_photos",
+                   "photo_analysis"),
+    LoanOffer: ("offer_id", "loan_amount", "tenure_days", "daily_rate", "total_interest",
+                "total_due", "loan_type", "monthly_net", "created_at"),
+    # Messages are written as [type code, *fields], with empty trailing fields left off
+    BaseMessage: ("content", "additional_kwargs", "id", "response_metadata", "tool_calls",
+                  "usage_metadata"),
+}
+DATACLASSES = (LucyState, CustomerData, LoanOffer)
+
+# Message types are stored as a small integer
+MESSAGE_TYPES: List[type] = [HumanMessage, AIMessage, SystemMessage]
+_MESSAGE_CODES = {cls: code for code, cls in enumerate(MESSAGE_TYPES)}
+_MESSAGE_EXTRA = SCHEMA[BaseMessage][1:]
+_TASKS = {task.value: task for task in LucyTask}
+COMPLETED_TASKS_INDEX = SCHEMA[CustomerData].index("completed_tasks")
+
+
+class StateCodecError(ValueError):
+    """Snapshot could not be decoded"""
+
+
+def _defaults(cls: type) -> Dict[str, Any]:
+    """Default factory for each field that has a default, used to fill a missing tail"""
+    defaults = {}
+    for spec in fields(cls):
+        if spec.default_factory is not MISSING:
+            defaults[spec.name] = spec.default_factory
+        elif spec.default is not MISSING:
+            defaults[spec.name] = lambda value=spec.default: value
+    return defaults
+
+
+_DEFAULTS = {cls: _defaults(cls) for cls in DATACLASSES}
+
+
+def _build(cls: type, values: List[Any]) -> Any:
+    """Create a dataclass instance from positional values without running __init__"""
+    names = SCHEMA[cls]
+    obj = cls.__new__(cls)
+    attrs = dict(zip(names, values))
+    if len(values) < len(names):
+        for name in names[len(values):]:
+            attrs[name] = _DEFAULTS[cls][name]()
+    obj.__dict__.update(attrs)
+    return obj
+
+
+def message_to_primitive(message: BaseMessage) -> List[Any]:
+    code = _MESSAGE_CODES.get(type(message))
+    if code is None:
+        # Unknown subclasses keep their content under the closest base type
+        code = next((c for cls, c in _MESSAGE_CODES.items() if isinstance(message, cls)), 0)
+    # Read the instance dict: getattr with a default raises and catches for every missing field
+    attrs = vars(message)
+    if not any(map(attrs.get, _MESSAGE_EXTRA)):
+        return [code, message.content]
+    extra = [attrs.get(name) or None for name in _MESSAGE_EXTRA]
+    while extra[-1] is None:
+        extra.pop()
+    return [code, message.content, *extra]
+
+
+def message_from_primitive(values: List[Any]) -> BaseMessage:
+    cls = MESSAGE_TYPES[values[0]]
+    if len(values) == 2:
+        return cls(values[1])
+    extra = {name: value for name, value in zip(_MESSAGE_EXTRA, values[2:]) if value is not None}
+    if LANGCHAIN_AVAILABLE:
+        return cls(content=values[1], **extra)
+    # The demo-mode message classes only take content
+    message = cls(values[1])
+    message.__dict__.update(extra)
+    return message
+
+
+def customer_to_primitive(data: CustomerData) -> List[Any]:
+    return [data.photos, data.location, data.business_type, data.what_they_love, data.vision, data.goal,
+            data.daily_customers, data.daily_sales, data.weekly_sales, data.expenses,
+            data.challenge, data.created_asset, data.loan_uses, [task.value for task in data.completed_tasks],
+            data.duplicate_photos, data.photo_analysis]
+
+
+def customer_field_from_primitive(index: int, value: Any) -> Any:
+    """Decode one positional CustomerData value"""
+    return [_TASKS[task] for task in value] if index == COMPLETED_TASKS_INDEX else value
+
+
+def customer_from_primitive(values: List[Any]) -> CustomerData:
+    customer = list(values)
+    if len(customer) > COMPLETED_TASKS_INDEX:
+        customer[COMPLETED_TASKS_INDEX] = [_TASKS[task] for task in customer[COMPLETED_TASKS_INDEX]]
+    return _build(CustomerData, customer)
+
+
+def offer_to_primitive(offer: LoanOffer) -> List[Any]:
+    return [offer.offer_id, offer.loan_amount, offer.tenure_days, offer.daily_rate, offer.total_interest,
+            offer.total_due, offer.loan_type, offer.monthly_net, offer.created_at]
+
+
+def offer_from_primitive(values: List[Any]) -> LoanOffer:
+    return _build(LoanOffer, values)
+
+
+def task_from_primitive(value: str) -> LucyTask:
+    return _TASKS[value]
+
+
+def to_primitive(state: LucyState) -> List[Any]:
+    """LucyState as nested lists of msgpack/JSON-native values"""
+    return [
+        SCHEMA_VERSION,
+        state.current_task.value,
+        customer_to_primitive(state.customer_data),
+        [message_to_primitive(message) for message in state.conversation_history],
+        state.session_id,
+        [offer_to_primitive(offer) for offer in state.offers],
+        state.offer_decisions,
+        state.version,
+        state.created_at,
+    ]
+
+
+def from_primitive(values: List[Any]) -> LucyState:
+    """Inverse of to_primitive; accepts snapshots from any earlier append-only schema"""
+    if not values or not isinstance(values[0], int):
+        raise StateCodecError("Not a LucyState snapshot")
+    version = values[0]
+    if version > SCHEMA_VERSION:
+        raise StateCodecError(f"Snapshot schema v{version} is newer than supported v{SCHEMA_VERSION}")
+
+    state = list(values[1:])
+    # current_task, customer_data, conversation_history, session_id, offers, offer_decisions,
+    # version, created_at
+    if state:
+        state[0] = _TASKS[state[0]]
+    if len(state) > 1:
+        state[1] = customer_from_primitive(state[1])
+    if len(state) > 2:
+        # Plain messages (type code and content only) are built inline; most history is plain
+        types = MESSAGE_TYPES
+        state[2] = [types[message[0]](message[1]) if len(message) == 2 else message_from_primitive(message)
+                    for message in state[2]]
+    if len(state) > 4:
+        state[4] = [_build(LoanOffer, offer) for offer in state[4]]
+    return _build(LucyState, state)
+
+
+def pack(primitive: Any, use_msgpack: Optional[bool] = None) -> bytes:
+    """Format byte followed by msgpack (when available) or JSON"""
+    if use_msgpack is None:
+        use_msgpack = MSGPACK_AVAILABLE
+    if use_msgpack:
+        return bytes((FORMAT_MSGPACK,)) + msgpack.packb(primitive, use_bin_type=True)
+    return bytes((FORMAT_JSON,)) + json.dumps(primitive, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def unpack(blob: bytes) -> Any:
+    """Inverse of pack()"""
+    if not blob:
+        raise StateCodecError("Empty snapshot")
+    fmt, payload = blob[0], memoryview(blob)[1:]
+    try:
+        if fmt == FORMAT_MSGPACK:
+            if not MSGPACK_AVAILABLE:
+                raise StateCodecError("Snapshot is msgpack-encoded but msgpack is not installed")
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        if fmt == FORMAT_JSON:
+            return json.loads(bytes(payload).decode("utf-8"))
+    except (ValueError, TypeError) as e:
+        raise StateCodecError(f"Corrupt snapshot: {e}") from e
+    raise StateCodecError(f"Unknown snapshot format byte 0x{fmt:02x}")
+
+
+def encode(state: LucyState, use_msgpack: Optional[bool] = None) -> bytes:
+    """Serialize a LucyState to bytes (msgpack when available, JSON otherwise)"""
+    return pack(to_primitive(state), use_msgpack)
+
+
+def decode(blob: bytes) -> LucyState:
+    """Deserialize bytes written by encode()"""
+    primitive = unpack(blob)
+    try:
+        return from_primitive(primitive)
+    except StateCodecError:
+        raise
+    except (ValueError, TypeError, KeyError, IndexError) as e:
+        raise StateCodecError(f"Corrupt snapshot: {e}") from e
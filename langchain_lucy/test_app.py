@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+API tests for the Lucy FastAPI backend
+Runs against the in-process app in demo mode
+"""
+
+import asyncio
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+from app import app, DEMO_CONVERSATION
+
+client = TestClient(app)
+
+
+def setup_module():
+    # Run the app's lifespan (agents, job workers) for the whole module
+    client.__enter__()
+
+
+def teardown_module():
+    client.__exit__(None, None, None)
+
+
+def test_metrics_exposes_route_and_agent_latency():
+    """Chat turns show up as route and per-agent/per-task histograms"""
+    first = client.post("/chat", json={"message": "Hi, I need a loan for my shop"}).json()
+    client.post("/chat", json={
+        "message": "Kawangware Market, Lane 3",
+        "photos": ["inside.jpg", "outside.jpg"],
+        "session_id": first["session_id"]
+    })
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+    body = response.text
+    assert 'lucy_http_request_duration_seconds_count{route="/chat",method="POST"}' in body
+    assert 'lucy_agent_call_duration_seconds_bucket{agent="photo_verifier",task="B1",le="+Inf"}' in body
+    assert 'lucy_http_requests_in_flight{route="/chat"} 0' in body
+    assert "lucy_active_sessions" in body
+
+
+def test_analytics_reports_measured_agent_usage():
+    """agent_usage comes from the agent call counters, not the current task"""
+    before = client.get("/analytics").json().get("agent_usage", {}).get("photo_verifier", 0)
+    first = client.post("/chat", json={"message": "Hi, I need a loan for my shop"}).json()
+    client.post("/chat", json={
+        "message": "Gikomba Market, Lane 4",
+        "photos": ["inside.jpg", "outside.jpg"],
+        "session_id": first["session_id"]
+    })
+
+    analytics = client.get("/analytics").json()
+    assert analytics["agent_usage"]["photo_verifier"] == before + 1
+
+
+def test_demo_defaults_to_single_journey():
+    """Posting /demo without a body keeps the original single-transcript response"""
+    body = client.post("/demo").json()
+    assert body["success"] is True
+    assert len(body["conversation"]) == 8
+    assert body["summary"]["count"] == 1
+    listing = client.get("/sessions").json()
+    assert body["demo_session_id"] in [session["session_id"] for session in listing["sessions"]]
+    assert listing["cache"]["resident_bytes"] > 0
+
+
+def test_demo_runs_concurrent_journeys():
+    """count/concurrency run several journeys and aggregate per-step latency"""
+    body = client.post("/demo", json={"count": 5, "concurrency": 3}).json()
+    summary = body["summary"]
+    assert summary["completed"] == 5
+    assert summary["success_rate"] == 1.0
+    assert summary["errors"] == {}
+    assert summary["per_step"]["8"]["count"] == 5
+    assert summary["overall"]["count"] == 40
+
+    assert client.post("/demo", json={"count": 0}).status_code == 422
+
+
+def test_chat_batch_keeps_per_session_order():
+    """Interleaved items for two sessions are applied in order within each session"""
+    journey = [turn["message"] for turn in DEMO_CONVERSATION[:3]]
+    items = []
+    for message in journey:
+        items.append({"session_id": "batch-a", "message": message, "photos": ["a.jpg", "b.jpg"]})
+        items.append({"session_id": "batch-b", "message": message, "photos": ["a.jpg", "b.jpg"]})
+    items.append({"message": "Hi, I need a loan for my shop"})
+
+    body = client.post("/chat/batch", json={"items": items}).json()
+    assert body["succeeded"] == 7 and body["failed"] == 0
+    results = body["results"]
+    assert [result["index"] for result in results] == list(range(7))
+    assert [r["result"]["current_task"] for r in results if r["session_id"] == "batch-a"] == ["B1", "E4a", "E4b"]
+    assert [r["result"]["current_task"] for r in results if r["session_id"] == "batch-b"] == ["B1", "E4a", "E4b"]
+    assert results[-1]["session_id"] not in ("batch-a", "batch-b")
+
+    assert client.post("/chat/batch", json={"items": []}).status_code == 422
+
+
+def test_session_locks_are_dropped_with_their_sessions(monkeypatch):
+    """Turns that store no session leave no lock; eviction cleanup runs on the event loop"""
+    import threading
+    import app as app_module
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(app_module.lucy_ai, "chat", fail)
+    assert client.post("/chat", json={"message": "Hi", "session_id": "lock-failed"}).status_code == 500
+    body = client.post("/chat/batch", json={"items": [
+        {"message": "Hi", "session_id": "lock-batch"}, {"message": "Hi", "session_id": "lock-batch"},
+        {"message": "Hi"}]}).json()
+    assert body["failed"] == 3
+    monkeypatch.undo()
+    assert not {"lock-failed", "lock-batch"} & set(app_module._session_locks)
+    assert not app_module._session_lock_users
+
+    session_id = client.post("/chat", json={"message": "Hi"}).json()["session_id"]
+    assert session_id in app_module._session_locks
+
+    forgotten = []
+    forget = app_module._forget_session
+    monkeypatch.setattr(app_module, "_forget_session",
+                        lambda sid: forgotten.append(asyncio.get_running_loop()) or forget(sid))
+    state = app_module.sessions.pop(session_id)
+    # The cache calls the eviction hook on whichever thread wrote to it
+    evictor = threading.Thread(target=app_module._on_session_evicted, args=(session_id, state, "idle"))
+    evictor.start()
+    evictor.join()
+    client.get("/sessions")  # let the event loop run the scheduled cleanup
+    assert forgotten == [app_module._loop]
+    assert session_id not in app_module._session_locks
+
+
+def test_sessions_evicted_for_memory_are_reloaded_from_the_journal(tmp_path, monkeypatch):
+    """Entry/byte-budget eviction keeps the journaled session; only idle expiry drops it"""
+    import app as app_module
+    from journal import Journal
+
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.start()
+    monkeypatch.setattr(app_module, "journal", journal)
+    try:
+        first = client.post("/chat", json={"message": "Hi, I need a loan for my shop"}).json()["session_id"]
+        client.post("/chat", json={"message": "Kawangware Market, Lane 3", "photos": ["a.jpg", "b.jpg"],
+                                   "session_id": first})
+        monkeypatch.setattr(app_module.sessions, "max_entries", 1)
+        second = client.post("/chat", json={"message": "Hi"}).json()["session_id"]
+        assert first not in app_module.sessions and first in app_module._spilled_sessions
+
+        info = client.get(f"/session/{first}").json()
+        assert info["current_task"] == "E4a" and info["version"] == 2
+        # Reloading the first session pushed out the second; its next turn picks up where it was
+        reply = client.post("/chat", json={"message": "I run a salon", "session_id": second}).json()
+        assert reply["version"] == 2  # a session restarted from scratch would be at version 1
+
+        app_module._on_session_evicted(second, app_module.sessions[second], "idle")
+        journal.close()
+        recovered = Journal(str(tmp_path)).recover()
+        assert first in recovered and second not in recovered
+    finally:
+        journal.close()
+        app_module._spilled_sessions.clear()
+
+
+def test_turn_that_cannot_be_journaled_fails_and_is_not_kept(tmp_path, monkeypatch):
+    """A journal write error is a 5xx, and the session stays at its last durable state"""
+    import app as app_module
+    import journal as session_journal
+
+    journal = session_journal.Journal(str(tmp_path), fsync=False)
+    journal.start()
+    monkeypatch.setattr(app_module, "journal", journal)
+    try:
+        session_id = client.post("/chat", json={"message": "Hi, I need a loan for my shop"}).json()["session_id"]
+
+        def disk_full(*args, **kwargs):
+            raise session_journal.JournalWriteError("Journal write failed: disk full")
+
+        monkeypatch.setattr(journal, "record_turn", disk_full)
+        failed = client.post("/chat", json={"message": "Kawangware Market, Lane 3", "photos": ["a.jpg", "b.jpg"],
+                                            "session_id": session_id})
+        assert failed.status_code == 500
+        monkeypatch.undo()
+        monkeypatch.setattr(app_module, "journal", journal)
+
+        info = client.get(f"/session/{session_id}").json()
+        assert info["version"] == 1 and info["current_task"] == "B1"
+        retried = client.post("/chat", json={"message": "Kawangware Market, Lane 3", "photos": ["a.jpg", "b.jpg"],
+                                             "session_id": session_id}).json()
+        assert retried["version"] == 2 and retried["current_task"] == "E4a"
+    finally:
+        journal.close()
+        app_module._spilled_sessions.clear()
+
+
+def test_chat_idempotency_key_replays_stored_response():
+    """A retried request returns the cached response without running another turn"""
+    from app import sessions
+
+    first = client.post("/chat", json={"message": "start", "client_message_id": "m-1"}).json()
+    retry = client.post("/chat", json={"message": "start", "client_message_id": "m-1"}).json()
+    assert retry == first
+    session_id = first["session_id"]
+    assert len(sessions[session_id].conversation_history) == 2
+
+    headers = {"Idempotency-Key": "turn-2"}
+    payload = {"message": "Kawangware Market, Lane 3", "photos": ["a.jpg", "b.jpg"], "session_id": session_id}
+    second = client.post("/chat", json=payload, headers=headers).json()
+    assert client.post("/chat", json=payload, headers=headers).json() == second
+    assert len(sessions[session_id].conversation_history) == 4
+    assert "lucy_idempotent_replays_total 2" in client.get("/metrics").text
+
+    conflict = client.post("/chat", json={**payload, "message": "something else"}, headers=headers)
+    assert conflict.status_code == 422
+
+    client.delete(f"/session/{session_id}")
+    assert client.post("/chat", json=payload, headers=headers).json()["current_task"] == "B1"
+
+
+def test_session_etag_and_delta_chat():
+    """Polling gets 304 until a turn lands; delta turns return only what changed"""
+    first = client.post("/chat", json={"message": "Hi", "delta": True}).json()
+    session_id = first["session_id"]
+    assert first["version"] == 1 and first["base_version"] == 0
+    assert first["completed_tasks"] == []
+
+    info = client.get(f"/session/{session_id}")
+    etag = info.headers["etag"]
+    assert info.json()["version"] == 1
+    assert client.get(f"/session/{session_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    turn = client.post("/chat", json={"message": "I sell groceries in Kawangware Market",
+                                      "photos": ["shop.jpg"], "session_id": session_id, "delta": True}).json()
+    assert turn["version"] == 2 and turn["base_version"] == 1
+    assert set(turn["customer_data"]) < set(info.json()["customer_data"])
+    assert turn["customer_data"]["photos_count"] == 1
+
+    refreshed = client.get(f"/session/{session_id}", headers={"If-None-Match": etag})
+    assert refreshed.status_code == 200 and refreshed.headers["etag"] != etag
+
+
+def test_failed_turn_keeps_version_and_etag(monkeypatch):
+    """A turn that raises leaves the session, its version and its ETag as they were"""
+    import app as app_module
+    session_id = client.post("/chat", json={"message": "Hi"}).json()["session_id"]
+    before = client.get(f"/session/{session_id}")
+
+    def model_down(*args, **kwargs):
+        raise TimeoutError("model timed out")
+
+    monkeypatch.setattr(app_module.lucy_ai, "_process_with_agent", model_down)
+    failed = client.post("/chat", json={"message": "Kawangware Market", "session_id": session_id})
+    assert failed.status_code == 500
+
+    after = client.get(f"/session/{session_id}", headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 304
+    assert len(app_module.sessions[session_id].conversation_history) == 2
+    monkeypatch.undo()
+    assert client.post("/chat", json={"message": "Kawangware Market",
+                                      "session_id": session_id}).json()["version"] == 2
+
+
+def test_photo_upload_ids_are_accepted_by_chat():
+    """Uploaded photos come back as IDs that /chat accepts; unknown IDs are rejected"""
+    jpeg = b"\xff\xd8\xff\xe0" + os.urandom(4096)
+    uploaded = client.post("/photos", files=[("photos", ("inside.jpg", jpeg, "image/jpeg")),
+                                             ("photos", ("again.jpg", jpeg, "image/jpeg"))])
+    assert uploaded.status_code == 200
+    first, second = uploaded.json()["photos"]
+    assert first["photo_id"] == second["photo_id"] and second["duplicate"]
+
+    session_id = client.post("/chat", json={"message": "Hi"}).json()["session_id"]
+    turn = client.post("/chat", json={"message": "My shop is in Gikomba", "photos": [first["photo_id"]],
+                                      "session_id": session_id})
+    assert turn.status_code == 200 and turn.json()["customer_data"]["photos_count"] == 1
+
+    missing = client.post("/chat", json={"message": "Here", "photos": ["ph_" + "0" * 20],
+                                         "session_id": session_id})
+    assert missing.status_code == 422
+    assert client.post("/photos", content=b"nope", headers={"content-type": "text/plain"}).status_code == 415
+
+
+def test_session_reports_background_photo_analysis():
+    """Photos are acknowledged at once; the analysis shows up on the session when done"""
+    from app import jobs
+    session_id = client.post("/chat", json={"message": "Hi"}).json()["session_id"]
+    turn = client.post("/chat", json={"message": "My shop is in Gikomba Market", "photos": ["a.jpg", "b.jpg"],
+                                      "session_id": session_id}).json()
+    assert turn["current_task"] == "E4a"
+
+    analysis = client.get(f"/session/{session_id}").json()["photo_analysis"]
+    jobs.wait(analysis["job_id"], timeout=5)
+    info = client.get(f"/session/{session_id}")
+    assert info.json()["photo_analysis"]["status"] == "done"
+    assert info.json()["photo_analysis"]["note"]
+
+
+def test_finished_photo_analysis_is_journaled_without_another_turn(tmp_path, monkeypatch):
+    """A customer who goes quiet after sending photos still has the analysis saved"""
+    import time
+    import app as app_module
+    from journal import Journal
+
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.start()
+    monkeypatch.setattr(app_module, "journal", journal)
+    try:
+        session_id = client.post("/chat", json={"message": "Hi"}).json()["session_id"]
+        client.post("/chat", json={"message": "My shop is in Gikomba Market", "photos": ["a.jpg", "b.jpg"],
+                                   "session_id": session_id})
+        job_id = app_module.sessions[session_id].customer_data.photo_analysis["job_id"]
+        app_module.jobs.wait(job_id, timeout=5)
+
+        deadline = time.monotonic() + 5
+        while journal.load(session_id).customer_data.photo_analysis["status"] == "pending":
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+        saved = journal.load(session_id)
+        assert saved.customer_data.photo_analysis["status"] == "done"
+        assert saved.customer_data.photo_analysis["note"]
+        assert saved.version == app_module.sessions[session_id].version == 2
+    finally:
+        journal.close()
+
+
+def test_slow_turn_is_deferred_to_a_job(monkeypatch):
+    """Prefer: respond-async turns past the wait get 202 and finish as a pollable job"""
+    import time
+    import httpx
+    import app as app_module
+
+    chat = app_module.lucy_ai.chat
+
+    async def run():
+        # One event loop for the whole exchange, as in a server, so the deferred turn keeps running
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lucy") as http:
+            session_id = (await http.post("/chat", json={"message": "Hi"})).json()["session_id"]
+            fast = await http.post("/chat", json={"message": "Kawangware Market", "session_id": session_id},
+                                   headers={"Prefer": "respond-async, wait=5"})
+            assert fast.status_code == 200
+
+            monkeypatch.setattr(app_module.lucy_ai, "chat",
+                                lambda *args, **kwargs: time.sleep(0.3) or chat(*args, **kwargs))
+            deferred = await http.post("/chat", json={"message": "I sell groceries", "session_id": session_id},
+                                       headers={"Prefer": "respond-async, wait=0.01"})
+            assert deferred.status_code == 202
+            assert deferred.headers["location"] == f"/jobs/{deferred.json()['job_id']}"
+
+            await asyncio.to_thread(app_module.jobs.wait, deferred.json()["job_id"], 5)
+            job = (await http.get(deferred.headers["location"])).json()
+            assert job["status"] == "done", job["error"]
+            assert job["session_id"] == session_id
+            assert job["result"]["response"]
+            assert (await http.get("/jobs/job_unknown")).status_code == 404
+
+    asyncio.run(run())
+
+
+def test_session_events_push_finished_jobs():
+    """Finished jobs of a session are pushed to its open event streams"""
+    import app as app_module
+
+    session_id = client.post("/chat", json={"message": "Hi"}).json()["session_id"]
+
+    class Request:
+        async def is_disconnected(self):
+            return False
+
+    async def listen():
+        stream = app_module._session_events(session_id, Request())
+        assert await stream.__anext__() == ": connected\n\n"
+        job = app_module.jobs.track("chat_turn", session_id)
+        # Completed from another thread, as job workers do
+        await asyncio.to_thread(app_module.jobs.complete, job, {"response": "done"})
+        event = await asyncio.wait_for(stream.__anext__(), 5)
+        await stream.aclose()
+        return job, event
+
+    job, event = asyncio.run(listen())
+    assert event.startswith(f"event: job\nid: {job.job_id}\ndata: ")
+    assert '"response": "done"' in event
+    assert session_id not in app_module._event_subscribers
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the benchmark baseline comparison
+"""
+
+import json
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_lucy import compare, save_baseline
+
+
+def _result(min_us, median_us=None):
+    return {"min_us": min_us, "median_us": median_us or min_us, "calls_per_batch": 100}
+
+
+def test_compare_flags_a_synthetic_regression():
+    baseline = {"results": {"fast": _result(10.0), "steady": _result(20.0)}}
+    results = {"fast": _result(13.0), "steady": _result(21.0), "added": _result(5.0)}
+
+    report, regressions = compare(results, baseline, threshold=0.15)
+    assert regressions == ["fast"]
+    fast_line = next(line for line in report.splitlines() if line.startswith("fast"))
+    assert "+30.0%" in fast_line and "REGRESSION" in fast_line
+    assert "new" in next(line for line in report.splitlines() if line.startswith("added"))
+
+    # A faster run is never a regression, however large the change
+    assert compare({"fast": _result(2.0)}, baseline)[1] == []
+
+
+def test_per_benchmark_tolerance_overrides_the_threshold():
+    baseline = {"results": {"noisy": {**_result(100.0), "tolerance": 0.5},
+                            "tight": {**_result(10.0), "tolerance": 0.05}}}
+    results = {"noisy": _result(140.0), "tight": _result(10.6)}
+    assert compare(results, baseline, threshold=0.15)[1] == ["tight"]
+    assert compare({"noisy": _result(160.0)}, baseline)[1] == ["noisy"]
+
+
+def test_save_keeps_other_entries_and_tolerances(tmp_path):
+    path = str(tmp_path / "baseline.json")
+    save_baseline({"noisy": _result(100.0), "other": _result(1.0)}, path)
+    with open(path) as f:
+        stored = json.load(f)
+    stored["results"]["noisy"]["tolerance"] = 0.5
+    with open(path, "w") as f:
+        json.dump(stored, f)
+
+    save_baseline({"noisy": _result(90.0)}, path)
+    with open(path) as f:
+        results = json.load(f)["results"]
+    assert results["noisy"] == {**_result(90.0), "tolerance": 0.5}
+    assert results["other"] == _result(1.0)
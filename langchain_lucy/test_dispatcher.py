@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for the session-affinity dispatcher
+"""
+
+import asyncio
+import os
+import sys
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dispatcher import HashRing, create_dispatcher
+
+
+def _worker(name: str, seen: list) -> FastAPI:
+    """Stand-in worker that records which sessions reached it"""
+    worker = FastAPI()
+
+    @worker.post("/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        seen.append(body["session_id"])
+        return {"session_id": body["session_id"], "worker": name}
+
+    @worker.post("/chat/batch")
+    async def chat_batch(request: Request):
+        items = (await request.json())["items"]
+        seen.extend(item["session_id"] for item in items)
+        results = [{"index": i, "session_id": item["session_id"], "status_code": 200,
+                    "result": {"worker": name, "message": item["message"]}, "error": None}
+                   for i, item in enumerate(items)]
+        return {"results": results, "succeeded": len(results), "failed": 0}
+
+    @worker.get("/sessions")
+    async def sessions():
+        return {"sessions": [{"session_id": s} for s in sorted(set(seen))], "total": len(set(seen))}
+
+    @worker.get("/analytics")
+    async def analytics():
+        sessions = sorted(set(seen))
+        if not sessions:
+            return {"message": "No sessions yet"}
+        return {"total_sessions": len(sessions), "task_distribution": {"E4a": len(sessions)},
+                "agent_usage": {"business_coach": len(seen)},
+                "completion_stats": {"reached_offer": 0, "avg_completed_tasks": 1.0}}
+
+    @worker.get("/metrics")
+    async def worker_metrics():
+        return PlainTextResponse(
+            "# HELP lucy_turns_total Turns\n# TYPE lucy_turns_total counter\n"
+            f'lucy_turns_total{{agent="business_coach"}} {len(seen)}\n'
+            "# HELP lucy_active_sessions Sessions\n# TYPE lucy_active_sessions gauge\n"
+            f"lucy_active_sessions {len(set(seen))}\n")
+
+    return worker
+
+
+def test_hash_ring_moves_only_removed_nodes_keys():
+    ring = HashRing(["a", "b", "c", "d"])
+    keys = [f"session-{i}" for i in range(4000)]
+    before = {key: ring.node_for(key) for key in keys}
+    counts = {node: list(before.values()).count(node) for node in ring.nodes}
+    assert min(counts.values()) > 600  # roughly even spread
+
+    ring.remove("c")
+    after = {key: ring.node_for(key) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert moved and all(before[key] == "c" for key in moved)
+
+
+def test_dispatcher_pins_sessions_to_one_worker():
+    seen = {"http://w0": [], "http://w1": [], "http://w2": []}
+    clients = {url: httpx.AsyncClient(transport=httpx.ASGITransport(app=_worker(url, calls)), base_url=url)
+               for url, calls in seen.items()}
+    dispatcher = create_dispatcher(list(seen), clients=clients)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=dispatcher)
+        async with httpx.AsyncClient(transport=transport, base_url="http://lucy") as client:
+            # New sessions get an id injected; later turns follow it to the same worker
+            first = await client.post("/chat", json={"message": "hi"})
+            session_id = first.json()["session_id"]
+            for _ in range(5):
+                turn = await client.post("/chat", json={"message": "again", "session_id": session_id})
+                assert turn.headers["x-lucy-worker"] == first.headers["x-lucy-worker"]
+
+            # A retried keyed first message lands in the same injected session
+            keyed = [await client.post("/chat", json={"message": "hi"}, headers={"Idempotency-Key": "k1"})
+                     for _ in range(2)]
+            assert keyed[0].json()["session_id"] == keyed[1].json()["session_id"]
+
+            items = [{"session_id": f"s{i % 6}", "message": str(i)} for i in range(18)]
+            batch = (await client.post("/chat/batch", json={"items": items})).json()
+            listing = (await client.get("/sessions")).json()
+            return session_id, batch, listing
+
+    session_id, batch, listing = asyncio.run(scenario())
+    owners = [url for url, calls in seen.items() if session_id in calls]
+    assert len(owners) == 1
+
+    assert batch["succeeded"] == 18
+    assert [result["result"]["message"] for result in batch["results"]] == [str(i) for i in range(18)]
+    for i in range(6):
+        assert len({r["result"]["worker"] for r in batch["results"] if r["session_id"] == f"s{i}"}) == 1
+    assert listing["workers"] == 3 and listing["total"] == 8
+
+
+def test_dispatcher_merges_analytics_and_metrics_across_workers():
+    seen = {"http://w0": [], "http://w1": [], "http://w2": []}
+    clients = {url: httpx.AsyncClient(transport=httpx.ASGITransport(app=_worker(url, calls)), base_url=url)
+               for url, calls in seen.items()}
+    dispatcher = create_dispatcher(list(seen), clients=clients)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=dispatcher)
+        async with httpx.AsyncClient(transport=transport, base_url="http://lucy") as client:
+            for i in range(12):
+                await client.post("/chat", json={"message": "hi", "session_id": f"s{i}"})
+            return (await client.get("/analytics")).json(), (await client.get("/metrics")).text
+
+    analytics, exposition = asyncio.run(scenario())
+    assert analytics["total_sessions"] == 12
+    assert analytics["task_distribution"] == {"E4a": 12}
+    assert analytics["agent_usage"] == {"business_coach": 12}
+    assert analytics["completion_stats"]["avg_completed_tasks"] == 1.0
+    assert set(analytics["workers"]) == set(seen)
+
+    lines = exposition.splitlines()
+    assert lines.count("# TYPE lucy_turns_total counter") == 1
+    for url, calls in seen.items():
+        assert f'lucy_turns_total{{worker="{url}",agent="business_coach"}} {len(calls)}' in lines
+        assert f'lucy_active_sessions{{worker="{url}"}} {len(calls)}' in lines
+    # Samples stay under their own family's header
+    assert lines.index("# TYPE lucy_active_sessions gauge") > max(
+        index for index, line in enumerate(lines) if line.startswith("lucy_turns_total"))
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the deterministic fake chat model
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm import FakeChatModel, FakeLLMError, parse_profile
+from lucy_ai import LucyAI, LucyTask
+
+
+def _recorded_sleeps(seed: int, profile: str = "heavy_tail"):
+    sleeps = []
+    llm = FakeChatModel(profile, seed=seed, sleep=sleeps.append)
+    for _ in range(20):
+        llm.invoke("You are Lucy's BusinessCoach specialist.")
+    return sleeps
+
+
+def test_latency_is_repeatable_per_seed():
+    """Same seed, same latency sequence; different seed, different sequence"""
+    assert _recorded_sleeps(7) == _recorded_sleeps(7)
+    assert _recorded_sleeps(7) != _recorded_sleeps(8)
+
+
+def test_profiles_parse_and_clamp():
+    """Presets and inline overrides parse into sane latency samples"""
+    fixed = parse_profile("fixed:fixed_ms=250")
+    assert fixed.kind == "fixed"
+    assert FakeChatModel(fixed, sleep=lambda s: None).profile.fixed_ms == 250
+    sleeps = _recorded_sleeps(1, "lognormal:median_ms=100,sigma=0.2,max_ms=500")
+    assert all(0 < s <= 0.5 for s in sleeps)
+
+
+def test_error_injection_and_streaming():
+    """Error rate 1 always fails; streaming yields the full reply in pieces"""
+    failing = FakeChatModel("instant", error_rate=1.0)
+    try:
+        failing.invoke("You are Lucy's Underwriter specialist.")
+        assert False, "expected FakeLLMError"
+    except FakeLLMError:
+        pass
+
+    llm = FakeChatModel("instant", responses={"underwriter": ["one two three"]})
+    chunks = [chunk.content for chunk in llm.stream("You are Lucy's Underwriter specialist.")]
+    assert "".join(chunks) == "one two three"
+    assert len(chunks) == 3
+
+
+def test_bind_agent_overrides_responses():
+    """A shared model can be bound with per-call canned replies without changing it"""
+    llm = FakeChatModel("instant", responses={"underwriter": ["shared"]})
+    assert llm.bind_agent("underwriter", ["pinned"]).invoke("hi").content == "pinned"
+    assert llm.bind_agent("underwriter").invoke("hi").content == "shared"
+
+
+def test_lucy_ai_uses_fake_provider(monkeypatch):
+    """LucyAI routes agent calls through the fake model when selected"""
+    monkeypatch.setenv("LUCY_FAKE_LLM_PROFILE", "instant")
+    lucy = LucyAI("demo-key", llm_provider="fake")
+    response, state = lucy.chat("Hi, I need a loan")
+    response, state = lucy.chat("Kawangware Market, Lane 3", photos=["a.jpg", "b.jpg"], state=state)
+    assert lucy.photo_verifier.llm.calls == 1
+    assert response.startswith("Great photos!")
+    assert state.current_task == LucyTask.E4A
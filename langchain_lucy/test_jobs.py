@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for background jobs and asynchronous photo analysis
+"""
+
+import os
+import sys
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from jobs import JobQueue, DONE, FAILED
+from lucy_ai import LucyAI, LucyTask
+
+
+def test_jobs_run_in_background_and_keep_status():
+    queue = JobQueue(workers=2, retain=3)
+    release = threading.Event()
+    queue.register("slow", lambda payload: release.wait(5) and payload["n"] * 2)
+    queue.register("broken", lambda payload: 1 / 0)
+    queue.start()
+    try:
+        slow = queue.submit("slow", {"n": 21}, session_id="s1")
+        broken = queue.submit("broken", {})
+        assert queue.wait(broken.job_id, timeout=5).status == FAILED
+        assert "ZeroDivisionError" in broken.error
+        assert queue.get(slow.job_id).status in ("queued", "running")
+
+        release.set()
+        assert queue.wait(slow.job_id, timeout=5).result == 42
+        for n in range(3):
+            queue.wait(queue.submit("slow", {"n": n}).job_id, timeout=5)
+        assert queue.get(slow.job_id) is None  # oldest finished jobs are dropped
+    finally:
+        queue.close()
+
+
+def test_photo_analysis_runs_while_coaching_continues():
+    queue = JobQueue(workers=1)
+    lucy = LucyAI("demo-key", jobs=queue)
+    release = threading.Event()
+    analyze = lucy.photo_verifier.analyze_photos
+    lucy.photo_verifier.analyze_photos = lambda *args: release.wait(5) and analyze(*args)
+    queue.start()
+    try:
+        _, state = lucy.chat("Hi", session_id="s1")
+        response, state = lucy.chat("My shop is in Gikomba Market", photos=["in.jpg", "out.jpg"], state=state)
+        assert "taking a closer look" in response
+        assert state.current_task == LucyTask.E4A
+        pending = state.customer_data.photo_analysis
+        assert pending["status"] == "pending" and queue.get(pending["job_id"]).session_id == "s1"
+
+        release.set()
+        queue.wait(pending["job_id"], timeout=5)
+        assert lucy.photo_analysis_status(state)["status"] == "done"
+        _, state = lucy.chat("I run a grocery shop", state=state)
+        assert state.customer_data.photo_analysis["status"] == "done"
+        assert "Photo Analysis" in state.customer_data.photo_analysis["note"]
+
+        # A pending analysis whose job was lost with a previous process is queued again
+        state.customer_data.photo_analysis = {**pending, "job_id": "job_gone", "queue": "earlier-process"}
+        assert lucy.sync_photo_analysis(state)
+        assert state.customer_data.photo_analysis["queue"] == queue.instance_id
+        assert queue.wait(state.customer_data.photo_analysis["job_id"], timeout=5).status == DONE
+
+        # One this process ran but no longer retains is not analysed (and billed) again
+        submitted = queue.stats()["jobs"]
+        state.customer_data.photo_analysis = {**pending, "job_id": "job_trimmed"}
+        assert lucy.sync_photo_analysis(state)
+        assert state.customer_data.photo_analysis["status"] == "failed"
+        assert queue.stats()["jobs"] == submitted
+    finally:
+        queue.close()
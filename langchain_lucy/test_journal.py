@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for the session journal
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from lucy_ai import LucyAI
+import journal as session_journal
+from journal import Journal
+import state_codec
+
+JOURNEY = ["Hi", "I run a salon in Nairobi", "I love making people feel confident",
+           "About 20 customers a day, 8000 KES in sales", "Stock and a new chair", "yes"]
+
+
+def _play(journal, lucy, session_id, messages, state=None):
+    for message in messages:
+        before = session_journal.mark(state)
+        _, state = lucy.chat(message, state=state)
+        journal.record_turn(session_id, before, state, message)
+    return state
+
+
+def test_replay_rebuilds_sessions(tmp_path):
+    lucy = LucyAI("demo-key")
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.start()
+    kept = _play(journal, lucy, "kept", JOURNEY)
+    _play(journal, lucy, "dropped", JOURNEY[:2])
+    journal.record_drop("dropped")
+    journal.close()
+
+    recovered = Journal(str(tmp_path)).recover()
+    assert list(recovered) == ["kept"]
+    assert state_codec.to_primitive(recovered["kept"]) == state_codec.to_primitive(kept)
+
+
+def test_group_commit_shares_fsyncs(tmp_path, monkeypatch):
+    fsyncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(session_journal.os, "fsync", lambda fd: (fsyncs.append(fd), real_fsync(fd)))
+    journal = Journal(str(tmp_path))
+    journal.start()
+    lucy = LucyAI("demo-key")
+    _, state = lucy.chat("Hi")
+
+    threads = [threading.Thread(target=journal.record_put, args=(f"s{i}", state)) for i in range(64)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    assert len(Journal(str(tmp_path)).recover()) == 64
+    assert 1 <= len(fsyncs) <= 64
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    lucy = LucyAI("demo-key")
+    journal = Journal(str(tmp_path), fsync=False)
+    journal.start()
+    state = _play(journal, lucy, "s", JOURNEY[:3])
+    journal.close()
+
+    path = journal._path("journal", journal.generation)
+    with open(path, "ab") as f:
+        f.write(b"\x00\x00\x01\x00garbage")  # half-written record from a crash
+    recovered = Journal(str(tmp_path)).recover()
+    assert len(recovered["s"].conversation_history) == len(state.conversation_history)
+
+
+def test_compaction_folds_segments_into_snapshot(tmp_path):
+    lucy = LucyAI("demo-key")
+    journal = Journal(str(tmp_path), fsync=False, segment_bytes=1)
+    journal.start()
+    state = _play(journal, lucy, "s", JOURNEY)
+    journal.close()
+
+    restarted = Journal(str(tmp_path), fsync=False)
+    recovered = restarted.recover()
+    restarted.start()
+    restarted.compact()
+    restarted.close()
+    # Only the fresh snapshot and the (empty) open segment are left
+    assert sorted(os.listdir(tmp_path)) == [f"journal-{restarted.generation:08d}.log",
+                                            f"snapshot-{restarted.generation:08d}.bin"]
+
+    again = Journal(str(tmp_path)).recover()
+    assert state_codec.to_primitive(again["s"]) == state_codec.to_primitive(recovered["s"]) \
+        == state_codec.to_primitive(state)
+
+
+def test_workers_get_their_own_locked_directory(tmp_path, monkeypatch):
+    """Dispatcher workers journal under worker-<id>; a directory in use cannot be opened twice"""
+    monkeypatch.setenv("LUCY_JOURNAL_DIR", str(tmp_path))
+    monkeypatch.setenv("LUCY_WORKER_ID", "0")
+    first = session_journal.open_journal()
+    monkeypatch.setenv("LUCY_WORKER_ID", "1")
+    second = session_journal.open_journal()
+    assert first.directory == os.path.join(str(tmp_path), "worker-0")
+    assert second.directory == os.path.join(str(tmp_path), "worker-1")
+
+    if session_journal.FCNTL_AVAILABLE:
+        with pytest.raises(RuntimeError, match="in use"):
+            Journal(first.directory)
+    first.close()
+    second.close()
+    Journal(first.directory).close()  # the lock is released on close
+
+
+def test_failed_write_raises_and_later_records_still_replay(tmp_path, monkeypatch):
+    """A waiter is told its record is not durable; the journal carries on in a fresh segment"""
+    lucy = LucyAI("demo-key")
+    journal = Journal(str(tmp_path))
+    journal.start()
+    state = _play(journal, lucy, "s", JOURNEY[:2])
+
+    real_fsync = os.fsync
+
+    def failing_fsync(fd):
+        monkeypatch.setattr(session_journal.os, "fsync", real_fsync)
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(session_journal.os, "fsync", failing_fsync)
+    with pytest.raises(session_journal.JournalWriteError, match="No space left"):
+        journal.record_put("lost", state)
+    journal.record_put("kept", state)
+    journal.close()
+
+    recovered = Journal(str(tmp_path)).recover()
+    assert "kept" in recovered and "s" in recovered
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for the load generator's in-process mode
+"""
+
+import asyncio
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app
+from loadtest import run_load
+
+
+def test_load_generator_completes_journeys():
+    """Concurrent virtual customers all reach the OFFER stage in demo mode"""
+    report = asyncio.run(run_load(customers=3, journeys=6, seed=1)).to_dict()
+    assert report["journeys"] == 6
+    assert report["reached_offer"] == 6
+    assert report["errors"] == {}
+    assert set(report["per_task"]) == {"B1", "E4a", "E4b", "B4", "E6", "L3", "L5"}
+    assert report["per_step"]["1"]["count"] == 6
+
+
+def test_in_process_run_uses_the_fake_llm_and_shuts_the_app_down(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-not-a-real-key")
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+    providers = []
+    startup = app.startup
+
+    def recording_startup():
+        started = startup()
+        providers.append(app.lucy_ai.llm_provider)
+        return started
+
+    monkeypatch.setattr(app, "startup", recording_startup)
+    report = asyncio.run(run_load(customers=2, journeys=2, seed=3)).to_dict()
+
+    assert report["reached_offer"] == 2 and report["errors"] == {}
+    assert providers == ["fake"]
+    assert app.lucy_ai.llm.profile.kind == "fixed" and app.lucy_ai.llm.profile.fixed_ms == 0.0
+    assert "LLM_PROVIDER" not in os.environ
+    assert not app._started  # run_load started the app, so it shut it down
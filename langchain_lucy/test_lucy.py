@@ -175,6 +175,36 @@ def test_agent_specialization():
         else:
             print(f"⚠️  Expected {case['expected_agent']}, got {agent}")
 
+def test_offer_acceptance_is_idempotent():
+    """Offers are stored on the state and a repeated "yes" does not re-run acceptance"""
+    
+    lucy = LucyAI("demo-key")
+    calls = []
+    store = lucy.store_customer_acceptance
+    lucy.store_customer_acceptance = lambda **kwargs: calls.append(kwargs) or store(**kwargs)
+    
+    state = LucyState(current_task=LucyTask.OFFER)
+    state.customer_data.daily_sales = 5000
+    state.customer_data.loan_uses = ["Purchase inventory/stock"]
+    
+    # First message gets the greeting; showing the offer twice issues a single stored offer
+    lucy.chat("Hello", state=state)
+    lucy.chat("Show me the offer", state=state)
+    lucy.chat("Show me the offer again", state=state)
+    assert len(state.offers) == 1
+    offer = state.current_offer
+    assert offer.loan_amount == 15500
+    
+    lucy.chat("Yes, I accept", state=state)
+    lucy.chat("Yes, I accept", state=state)
+    assert len(calls) == 1
+    assert calls[0]["loanAmount"] == offer.loan_amount
+    assert state.offer_decisions[offer.offer_id]["accepted"] is True
+    
+    # Declining after acceptance is a no-op too
+    lucy.chat("No", state=state)
+    assert len(calls) == 1
+
 def display_architecture_overview():
     """Display the architecture overview"""
     
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for structured logging
+"""
+
+import io
+import json
+import logging
+import os
+import sys
+import threading
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from lucy_ai import LucyAI
+from lucy_logging import (ContextFilter, JsonFormatter, NonBlockingQueueHandler, SamplingFilter, get_logger,
+                          log_context, setup_logging, shutdown_logging)
+
+
+def _record(level=logging.INFO, message="turn finished", fields=None, exc_info=None):
+    record = logging.LogRecord("lucy.test", level, __file__, 1, message, (), exc_info)
+    if fields is not None:
+        record.fields = fields
+    ContextFilter().filter(record)
+    return record
+
+
+def test_json_formatter_writes_context_and_fields():
+    with log_context(session_id="s1", task="E4a"):
+        record = _record(fields={"agent": "business_coach", "duration_ms": 12.5})
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "INFO" and entry["logger"] == "lucy.test"
+    assert entry["event"] == "turn finished"
+    assert entry["session_id"] == "s1" and entry["task"] == "E4a"
+    assert entry["agent"] == "business_coach" and entry["duration_ms"] == 12.5
+    assert entry["ts"].endswith("+00:00")
+
+    # No context: the keys are left out rather than written empty
+    assert set(json.loads(JsonFormatter().format(_record()))) == {"ts", "level", "logger", "event"}
+
+    try:
+        raise ValueError("bad photo")
+    except ValueError:
+        failed = _record(logging.ERROR, exc_info=sys.exc_info())
+    assert "ValueError: bad photo" in json.loads(JsonFormatter().format(failed))["exception"]
+
+
+def test_sampling_filter_keeps_a_fraction_of_debug_only():
+    sampler = SamplingFilter({"DEBUG": 0.25, "INFO": 1.0}, seed=3)
+    kept = sum(sampler.filter(_record(logging.DEBUG)) for _ in range(4000))
+    assert 800 < kept < 1200
+    assert all(sampler.filter(_record(logging.INFO)) for _ in range(100))
+    assert all(sampler.filter(_record(logging.WARNING)) for _ in range(100))
+
+    none = SamplingFilter({"DEBUG": 0.0})
+    assert not any(none.filter(_record(logging.DEBUG)) for _ in range(100))
+
+
+def test_log_context_nests_and_resets():
+    with log_context(session_id="outer", task="B1"):
+        with log_context(task="E4a"):
+            inner = _record()
+        after_inner = _record()
+    outside = _record()
+    assert (inner.session_id, inner.task) == ("outer", "E4a")
+    assert (after_inner.session_id, after_inner.task) == ("outer", "B1")
+    assert (outside.session_id, outside.task) == ("", "")
+
+
+def test_chat_turn_does_not_leave_task_on_the_thread():
+    """A reused worker thread must not log the previous turn's task"""
+    seen = []
+
+    def turn():
+        lucy = LucyAI("demo-key")
+        _, state = lucy.chat("Hi")
+        lucy.chat("I run a salon in Nairobi", state=state)
+        seen.append(_record().task)
+
+    worker = threading.Thread(target=turn)
+    worker.start()
+    worker.join()
+    turn()
+    assert seen == ["", ""]
+
+
+def test_logging_can_be_shut_down_and_set_up_again():
+    """Restarting logging replaces the handler instead of stacking another one"""
+    lucy = logging.getLogger("lucy")
+    out = io.StringIO()
+    try:
+        shutdown_logging()
+        assert not any(isinstance(h, NonBlockingQueueHandler) for h in lucy.handlers)
+        setup_logging(level="INFO", stream=out)
+        setup_logging(level="INFO", stream=out)
+        assert sum(isinstance(h, NonBlockingQueueHandler) for h in lucy.handlers) == 1
+
+        get_logger("test").info("once")
+        shutdown_logging()  # flushes the queue
+        assert [json.loads(line)["event"] for line in out.getvalue().splitlines()] == ["once"]
+    finally:
+        shutdown_logging()
+        setup_logging()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for perceptual-hash duplicate photo detection
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from lucy_ai import LucyAI, LucyTask
+from photo_index import MultiIndexHash, PhotoIndex, hamming
+
+
+def test_multi_index_search_matches_brute_force():
+    rng = random.Random(7)
+    table = MultiIndexHash(max_distance=6)
+    stored = [rng.getrandbits(64) for _ in range(5000)]
+    # Plant near-duplicates of a few hashes at distances 1..8
+    for distance in range(1, 9):
+        bits = rng.sample(range(64), distance)
+        stored.append(stored[distance] ^ sum(1 << bit for bit in bits))
+    for position, value in enumerate(stored):
+        table.add(value, position)
+
+    for query in stored[:10] + [rng.getrandbits(64) for _ in range(10)]:
+        expected = sorted(position for position, value in enumerate(stored) if hamming(query, value) <= 6)
+        assert sorted(position for _, position in table.search(query)) == expected
+
+
+def _photo(path, seed, size=(640, 480), quality=90):
+    Image = pytest.importorskip("PIL.Image")
+    rng = random.Random(seed)
+    image = Image.new("RGB", (16, 12))
+    image.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(16 * 12)])
+    image.resize(size, Image.BILINEAR).save(path, quality=quality)
+    return path
+
+
+def test_resubmitted_photo_is_flagged_across_sessions(tmp_path):
+    original = _photo(str(tmp_path / "shop.jpg"), seed=1)
+    # Same scene, re-encoded smaller and at lower quality
+    copy = _photo(str(tmp_path / "copy.jpg"), seed=1, size=(320, 240), quality=60)
+    other = _photo(str(tmp_path / "other.jpg"), seed=2)
+    paths = {"shop": original, "copy": copy, "other": other}
+    index = PhotoIndex(paths.get)
+
+    assert index.check(["shop"], "alice") == {}
+    assert index.check(["shop"], "alice") == {}  # resending your own photo is fine
+    flagged = index.check(["copy", "other"], "bob")
+    assert list(flagged) == ["copy"]
+    assert flagged["copy"][0]["session_id"] == "alice"
+    assert list(index.check(["other", "copy"], "carol")) == ["other", "copy"]
+
+    # The same photo listed twice is not its own duplicate; a near-copy in the same message is
+    fresh = PhotoIndex(paths.get)
+    assert fresh.check(["other", "other"], "dave") == {}
+    assert list(fresh.check(["shop", "shop", "copy"], "dave")) == ["copy"]
+
+
+def test_photo_verifier_holds_b1_until_fresh_photos(tmp_path):
+    paths = {"a_inside": _photo(str(tmp_path / "a1.jpg"), seed=3),
+             "a_outside": _photo(str(tmp_path / "a2.jpg"), seed=4),
+             "b_inside": _photo(str(tmp_path / "b1.jpg"), seed=3, quality=50),
+             "b_fresh": _photo(str(tmp_path / "b2.jpg"), seed=5)}
+    lucy = LucyAI("demo-key", photo_index=PhotoIndex(paths.get))
+
+    _, alice = lucy.chat("Hi")
+    _, alice = lucy.chat("My shop is in Gikomba Market", photos=["a_inside", "a_outside"], state=alice)
+    assert alice.current_task == LucyTask.E4A
+
+    _, bob = lucy.chat("Hi")
+    response, bob = lucy.chat("My shop is in Gikomba Market", photos=["b_inside"], state=bob)
+    assert "already received" in response
+    assert bob.customer_data.duplicate_photos == ["b_inside"]
+    assert bob.current_task == LucyTask.B1
+
+    _, bob = lucy.chat("Here is a new one", photos=["b_fresh"], state=bob)
+    assert bob.current_task == LucyTask.E4A
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Tests for vision preprocessing of customer photos
+"""
+
+from concurrent.futures import Future
+import base64
+import io
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from lucy_ai import LucyAI, AIMessage
+from photo_prep import PhotoPreprocessor, PHOTO_PREP
+from journal import Journal
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _phone_photo(path):
+    """A 4000x3000 JPEG shot in portrait (EXIF orientation 6) with GPS-style metadata"""
+    image = Image.new("RGB", (4000, 3000), (200, 120, 40))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: rotate 90 CW
+    exif[0x010F] = "PhoneMaker"  # Make
+    image.save(path, quality=95, exif=exif.tobytes())
+    return path
+
+
+def test_photos_are_stripped_downscaled_and_cached(tmp_path):
+    source = _phone_photo(str(tmp_path / "raw.jpg"))
+    prep = PhotoPreprocessor(str(tmp_path / "derived"), {"ph_raw": source}.get)
+    try:
+        derived = prep.prepare_many(["ph_raw", "missing"])
+        assert derived[1] is None
+        with Image.open(derived[0]) as image:
+            assert image.size == (768, 1024)  # upright, short side 768
+            assert not image.getexif()
+        assert os.path.getsize(derived[0]) < os.path.getsize(source)
+
+        cached_before = PHOTO_PREP.labels("cached").value
+        assert prep.prepare_many(["ph_raw"]) == derived[:1]
+        assert PHOTO_PREP.labels("cached").value == cached_before + 1
+    finally:
+        prep.close()
+
+
+class RecordingLLM:
+    is_fake = True
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke(self, messages):
+        self.calls.append(messages)
+        return AIMessage(content="Lovely shop! What do you sell?")
+
+
+def test_photo_verifier_sends_prepared_images(tmp_path):
+    source = _phone_photo(str(tmp_path / "raw.jpg"))
+    llm = RecordingLLM()
+    prep = PhotoPreprocessor(str(tmp_path / "derived"), {"ph_raw": source}.get)
+    try:
+        lucy = LucyAI("demo-key", llm=llm, photo_prep=prep)
+        _, state = lucy.chat("Hi")
+        lucy.chat("My shop is in Gikomba", photos=["ph_raw"], state=state)
+    finally:
+        prep.close()
+
+    content = llm.calls[-1][-1].content
+    assert content[0]["type"] == "text"
+    url = content[1]["image_url"]["url"]
+    assert url.startswith("data:image/jpeg;base64,")
+    with Image.open(io.BytesIO(base64.b64decode(url.split(",", 1)[1]))) as image:
+        assert max(image.size) <= 2048 and min(image.size) <= 768
+
+
+def test_pool_started_from_app_script_leaves_journal_alone(tmp_path):
+    """`python app.py` (Procfile): spawned prep workers re-import the script and must not touch the journal"""
+    httpx = pytest.importorskip("httpx")
+    pytest.importorskip("uvicorn")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    journal_dir = tmp_path / "journal"
+    env = {**os.environ, "PORT": str(port), "LLM_PROVIDER": "fake", "LUCY_FAKE_LLM_PROFILE": "instant",
+           "LUCY_JOURNAL_DIR": str(journal_dir), "LUCY_PHOTO_DIR": str(tmp_path / "photos")}
+    env.pop("LUCY_WORKER_ID", None)
+    server = subprocess.Popen([sys.executable, "app.py"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=10) as http:
+            for _ in range(200):
+                try:
+                    http.get("/")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.05)
+            photo = _phone_photo(str(tmp_path / "raw.jpg"))
+            with open(photo, "rb") as f:
+                photo_id = http.post("/photos", files=[("photos", ("shop.jpg", f, "image/jpeg"))]).json()["photos"][0]["photo_id"]
+            session_id = http.post("/chat", json={"message": "Hi"}).json()["session_id"]
+            http.post("/chat", json={"message": "My shop is in Gikomba Market", "photos": [photo_id],
+                                     "session_id": session_id})
+            for _ in range(300):
+                analysis = http.get(f"/session/{session_id}").json()["photo_analysis"]
+                if analysis["status"] != "pending":
+                    break
+                time.sleep(0.05)
+            assert analysis["status"] == "done", analysis
+            assert http.post("/chat", json={"message": "I run a salon business",
+                                            "session_id": session_id}).json()["version"] == 3
+            assert server.poll() is None
+    finally:
+        server.terminate()
+        server.wait(10)
+
+    assert sorted(os.listdir(journal_dir)) == ["journal-00000001.log"]
+    assert Journal(str(journal_dir)).recover()[session_id].version == 3
+
+
+class StalledPool:
+    """Executor whose jobs never finish, like a pool with a hung worker"""
+
+    def submit(self, *args, **kwargs):
+        return Future()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_stalled_pool_falls_back_to_the_uploaded_photo(tmp_path):
+    source = _phone_photo(str(tmp_path / "raw.jpg"))
+    prep = PhotoPreprocessor(str(tmp_path / "derived"), {"ph_raw": source}.get, executor=StalledPool(), timeout=0.2)
+    timeouts_before = PHOTO_PREP.labels("timeout").value
+
+    started = time.monotonic()
+    urls = prep.data_urls(["ph_raw", "missing"])
+    assert time.monotonic() - started < 2
+
+    with open(source, "rb") as f:
+        assert urls == ["data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")]
+    assert PHOTO_PREP.labels("timeout").value == timeouts_before + 1
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed photo store and streaming multipart receiver
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from photo_store import PhotoStore, MultipartPhotoReceiver, PhotoUploadError, is_photo_id
+
+BOUNDARY = "lucyboundary"
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00JFIF" + os.urandom(50000)
+PNG = b"\x89PNG\r\n\x1a\n" + os.urandom(3000)
+
+
+def _multipart(*files):
+    body = b""
+    for name, data in files:
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"photos\"; filename=\"{name}\"\r\n"
+                 f"Content-Type: application/octet-stream\r\n\r\n").encode() + data + b"\r\n"
+    body += f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhello\r\n".encode()
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def _receive(store, body, chunk_size=1000, max_files=10):
+    receiver = MultipartPhotoReceiver(store, f"multipart/form-data; boundary={BOUNDARY}", max_files)
+    for offset in range(0, len(body), chunk_size):
+        receiver.feed(body[offset:offset + chunk_size])
+    return receiver.finish()
+
+
+def test_uploads_are_streamed_and_deduplicated(tmp_path):
+    store = PhotoStore(str(tmp_path))
+    first = _receive(store, _multipart(("inside.jpg", JPEG), ("outside.png", PNG)))
+    assert [photo["content_type"] for photo in first] == ["image/jpeg", "image/png"]
+    assert [photo["bytes"] for photo in first] == [len(JPEG), len(PNG)]
+    assert not any(photo["duplicate"] for photo in first)
+    assert all(is_photo_id(photo["photo_id"]) and photo["photo_id"] in store for photo in first)
+    with open(store.path_for(first[0]["photo_id"]), "rb") as f:
+        assert f.read() == JPEG
+
+    again = _receive(store, _multipart(("copy.jpg", JPEG)), chunk_size=7)
+    assert again[0]["photo_id"] == first[0]["photo_id"] and again[0]["duplicate"]
+    assert os.listdir(os.path.join(str(tmp_path), "incoming")) == []
+
+
+def test_rejects_oversized_and_non_image_uploads(tmp_path):
+    store = PhotoStore(str(tmp_path), max_bytes=10000)
+    with pytest.raises(PhotoUploadError) as too_large:
+        _receive(store, _multipart(("big.jpg", JPEG)))
+    assert too_large.value.status_code == 413
+
+    with pytest.raises(PhotoUploadError) as not_image:
+        _receive(store, _multipart(("notes.txt", b"just some text, not a photo")))
+    assert not_image.value.status_code == 415
+
+    with pytest.raises(PhotoUploadError) as too_many:
+        _receive(store, _multipart(("a.png", PNG), ("b.png", PNG)), max_files=1)
+    assert too_many.value.status_code == 413
+    assert os.listdir(os.path.join(str(tmp_path), "incoming")) == []
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the loan pricing engine
+"""
+
+import os
+import random
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pricing import PricingPolicy, price_book, price_offer
+
+
+def _reference_amount(daily_sales):
+    """The formula as originally written in UnderwriterAgent.generate_loan_offer"""
+    monthly_gross = daily_sales * 26 if daily_sales else 20000
+    monthly_net = monthly_gross * 0.6
+    base_amount = max(10000, int(monthly_net * 0.2))
+    loan_amount = min(50000, base_amount)
+    return round(loan_amount / 500) * 500
+
+
+def test_price_offer_matches_original_formula():
+    offer = price_offer(3000)
+    assert offer.monthly_net == 46800.0
+    assert offer.loan_amount == 10000
+    assert offer.total_due == 11800.0
+    assert price_offer(None).monthly_gross == 20000
+    assert price_offer(20000).loan_amount == 50000
+    for daily_sales in [1, 4999, 5128, 5449, 5450, 9000, 12345.6]:
+        assert price_offer(daily_sales).loan_amount == _reference_amount(daily_sales)
+
+
+def test_price_book_agrees_with_scalar_path():
+    rng = random.Random(7)
+    book = [0, None, 5449.5] + [rng.uniform(0, 20000) for _ in range(2000)]
+    priced = price_book(book)
+    for i, daily_sales in enumerate(book):
+        offer = price_offer(daily_sales)
+        assert priced["loan_amount"][i] == offer.loan_amount
+        assert priced["total_due"][i] == offer.total_due
+
+    policy = PricingPolicy(max_amount=80000, loan_to_net_ratio=0.3)
+    assert list(price_book([20000], policy)["loan_amount"]) == [price_offer(20000, policy).loan_amount]
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for per-agent prompt budgets
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm import FakeChatModel
+from lucy_ai import CustomerData, LucyAI, LucyTask
+from prompt_budget import AgentBudget, PromptBudget, TRUNCATION_MARKER, allocate
+
+TEMPLATE = "The customer loves: '{loves}' about their {business_type}. Now ask about their goal."
+
+
+def test_fit_truncates_only_what_does_not_fit():
+    """Short variables pass through; long ones are cut to the budget, keeping both ends"""
+    budget = PromptBudget({"business_coach": AgentBudget(max_input_tokens=120, max_output_tokens=50)})
+    short = budget.fit("business_coach", TEMPLATE, loves="my customers", business_type="salon")
+    assert short == TEMPLATE.format(loves="my customers", business_type="salon")
+
+    loves = "START " + "the smiles " * 500 + " END"
+    prompt = budget.fit("business_coach", TEMPLATE, fixed="You are Lucy's coach.", loves=loves, business_type="salon")
+    assert TRUNCATION_MARKER in prompt and "START" in prompt and "END" in prompt
+    assert "salon" in prompt  # the small variable keeps its full size
+    assert budget.count(prompt) + budget.count("You are Lucy's coach.") <= 120 + 2
+    assert allocate({"a": 10, "b": 500, "c": 500}, 210) == {"a": 10, "b": 100, "c": 100}
+
+
+class RecordingModel(FakeChatModel):
+    def invoke(self, messages, **kwargs):
+        self.sent = messages
+        return super().invoke(messages, **kwargs)
+
+    def bind_agent(self, agent, responses=None):
+        bound = RecordingModel(self.profile, self.seed, responses=self.responses, agent=agent)
+        bound._rngs = self._rngs
+        return bound
+
+
+def test_lucy_ai_budgets_customer_input_and_records_usage():
+    """A huge customer answer is truncated before the coach call and each call is counted"""
+    budget = PromptBudget({"business_coach": AgentBudget(max_input_tokens=300, max_output_tokens=100)})
+    lucy = LucyAI("demo-key", llm=RecordingModel("instant"), budget=budget)
+    _, state = lucy.chat("Hi")
+    _, state = lucy.chat("Kawangware Market, Lane 3", photos=["a.jpg", "b.jpg"], state=state)
+
+    customer = CustomerData(business_type="salon", what_they_love="making people feel confident " * 400)
+    lucy.business_coach.build_rapport(customer, LucyTask.E4B)
+    system, human = lucy.business_coach.llm.sent
+    assert TRUNCATION_MARKER in human.content and "salon" in human.content
+    assert budget.count(system.content) + budget.count(human.content) <= 300 + 2
+
+    usage = budget.usage()
+    assert usage["business_coach"]["calls"] == 1
+    assert usage["business_coach"]["prompt_tokens"] > 0
+    assert usage["photo_verifier"]["calls"] == 1
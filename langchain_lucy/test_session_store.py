@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for the bounded session cache
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from lucy_ai import LucyAI, LucyState
+import session_store
+from session_store import SessionCache, snapshot_size
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(**kwargs):
+    clock = Clock()
+    evicted = []
+    cache = SessionCache(sizer=lambda state: 100, clock=clock,
+                         on_evict=lambda sid, state, reason: evicted.append((sid, reason)), **kwargs)
+    return cache, clock, evicted
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache, _, evicted = _cache(max_entries=3)
+    for sid in "abc":
+        cache[sid] = LucyState()
+    assert cache.get("a") is not None  # touch: b is now least recently used
+    list(cache.items())  # listing does not count as activity
+    cache["d"] = LucyState()
+    assert evicted == [("b", "entries")]
+    assert set(cache) == {"a", "c", "d"}
+
+    cache, _, evicted = _cache(max_entries=0, max_bytes=250)
+    for sid in "abc":
+        cache[sid] = LucyState()
+    assert evicted == [("a", "bytes")]
+    assert cache.resident_bytes == 200
+    assert cache.stats()["evictions"] == {"idle": 0, "entries": 0, "bytes": 1}
+
+
+def test_idle_sessions_expire():
+    cache, clock, evicted = _cache(idle_ttl=60)
+    cache["old"] = LucyState()
+    clock.now = 30
+    cache["fresh"] = LucyState()
+    clock.now = 70
+    assert "old" not in cache and cache.get("old") is None
+    assert evicted == [("old", "idle")]
+
+    clock.now = 200
+    assert cache.expire() == 1
+    assert len(cache) == 0 and cache.resident_bytes == 0
+
+
+def test_snapshot_size_grows_with_history():
+    state = LucyState()
+    empty = snapshot_size(state)
+    state.customer_data.challenge = "x" * 1000
+    assert snapshot_size(state) > empty + 1000
+
+
+def test_running_size_estimate_tracks_snapshot(monkeypatch):
+    """Writes add the size of what the turn appended; full encodes only on resync"""
+    full_encodes = []
+    monkeypatch.setattr(session_store, "snapshot_size",
+                        lambda state: full_encodes.append(1) or snapshot_size(state))
+    cache = SessionCache(resync_every=4)
+    lucy = LucyAI("demo-key")
+    state = None
+    for message in ["Hi", "I run a salon in Nairobi", "I love making people feel confident",
+                    "About 20 customers a day, 8000 KES in sales", "Stock and a new chair", "yes",
+                    "Show me my offer", "Yes, I accept"]:
+        _, state = lucy.chat(message, state=state)
+        cache["s"] = state
+        assert abs(cache.size_of("s") - snapshot_size(state)) <= 0.1 * snapshot_size(state)
+    assert len(full_encodes) == 2  # first write, then every 4th
+
+    del cache["s"]
+    cache["s"] = state
+    assert len(full_encodes) == 3
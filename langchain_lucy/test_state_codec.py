@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for the LucyState snapshot codec
+"""
+
+import os
+import sys
+from dataclasses import fields
+
+import pytest
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import state_codec
+from lucy_ai import LANGCHAIN_AVAILABLE, AIMessage, LucyAI, LucyState, LucyTask, CustomerData, LoanOffer
+
+
+def _offer_stage_state() -> LucyState:
+    lucy = LucyAI("demo-key")
+    state = None
+    for message, photos in [
+        ("Hi, I need a loan for my shop", None),
+        ("I have a grocery shop in Kawangware Market, Lane 3", ["inside.jpg", "outside.jpg"]),
+        ("I run a small grocery selling household items", None),
+        ("I love helping my community", None),
+        ("I serve 25 customers daily and make 3000 KES per day", None),
+        ("My challenge is running out of popular items", None),
+        ("I want to use the loan for more stock and inventory", None),
+        ("Yes, I'm ready for the offer!", None),
+        ("Show me the offer", None),
+        ("Yes, I accept", None),
+    ]:
+        _, state = lucy.chat(message, photos, state)
+    return state
+
+
+def _assert_same(decoded: LucyState, original: LucyState):
+    assert decoded.current_task is original.current_task
+    assert decoded.customer_data == original.customer_data
+    assert decoded.session_id == original.session_id
+    assert decoded.offers == original.offers
+    assert decoded.offer_decisions == original.offer_decisions
+    assert [(type(m), m.content) for m in decoded.conversation_history] == \
+        [(type(m), m.content) for m in original.conversation_history]
+
+
+@pytest.mark.parametrize("use_msgpack", [True, False])
+def test_round_trip(use_msgpack):
+    if use_msgpack and not state_codec.MSGPACK_AVAILABLE:
+        pytest.skip("msgpack not installed")
+    state = _offer_stage_state()
+    assert state.offers and state.offer_decisions
+    blob = state_codec.encode(state, use_msgpack=use_msgpack)
+    _assert_same(state_codec.decode(blob), state)
+
+
+def test_schema_covers_every_field():
+    """Adding a dataclass field without extending the codec schema fails here"""
+    for cls in (LucyState, CustomerData, LoanOffer):
+        assert state_codec.SCHEMA[cls] == tuple(spec.name for spec in fields(cls))
+
+
+@pytest.mark.parametrize("use_msgpack", [True, False])
+def test_round_trip_keeps_llm_message_fields(use_msgpack):
+    """Ids, tool calls and token usage on an LLM reply survive a snapshot"""
+    if use_msgpack and not state_codec.MSGPACK_AVAILABLE:
+        pytest.skip("msgpack not installed")
+    fields = {
+        "additional_kwargs": {"refusal": None},
+        "id": "run-7f3a",
+        "response_metadata": {"model_name": "gpt-4o-mini", "finish_reason": "tool_calls"},
+        "tool_calls": [{"name": "price_offer", "args": {"daily_sales": 3000}, "id": "call_1",
+                        "type": "tool_call"}],
+        "usage_metadata": {"input_tokens": 412, "output_tokens": 38, "total_tokens": 450},
+    }
+    if LANGCHAIN_AVAILABLE:
+        reply = AIMessage(content="Let me price that for you", **fields)
+    else:
+        reply = AIMessage("Let me price that for you")
+        reply.__dict__.update(fields)
+    state = _offer_stage_state()
+    state.conversation_history.append(reply)
+
+    decoded = state_codec.decode(state_codec.encode(state, use_msgpack=use_msgpack))
+    _assert_same(decoded, state)
+    message = decoded.conversation_history[-1]
+    for name, value in fields.items():
+        assert getattr(message, name) == value, name
+
+
+def test_older_snapshot_fills_appended_fields_with_defaults():
+    primitive = state_codec.to_primitive(_offer_stage_state())
+    # A snapshot written before offers/offer_decisions were appended to LucyState
+    old = primitive[:5]
+    old[2] = old[2][:13]  # ...and before completed_tasks was appended to CustomerData
+    decoded = state_codec.from_primitive(old)
+    assert decoded.offers == [] and decoded.offer_decisions == {}
+    assert decoded.customer_data.completed_tasks == []
+    assert decoded.current_task is LucyTask.OFFER
+
+
+def test_rejects_newer_and_corrupt_snapshots():
+    blob = state_codec.encode(LucyState(), use_msgpack=False)
+    newer = blob.replace(b"[1,", b"[99,", 1)
+    for bad in (b"", b"\x07abc", newer, blob[:-3]):
+        with pytest.raises(state_codec.StateCodecError):
+            state_codec.decode(bad)
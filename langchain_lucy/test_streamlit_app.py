@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Smoke tests for the Streamlit demo (root streamlit_app.py)
+The page functions run against a recording stand-in for the Streamlit API, so
+they are exercised whether or not Streamlit is installed
+"""
+
+import importlib
+import os
+import sys
+
+import pytest
+
+# Add the current directory and the repository root to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SessionState(dict):
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+class Element:
+    """Any Streamlit element or container: records calls and returns more elements"""
+
+    def __init__(self, calls):
+        self._calls = calls
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            if name == "columns":
+                spec = args[0] if args else kwargs["spec"]
+                return [Element(self._calls) for _ in range(spec if isinstance(spec, int) else len(spec))]
+            return Element(self._calls)
+        return call
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeStreamlit(Element):
+    def __init__(self):
+        super().__init__([])
+        self.session_state = SessionState()
+        self.sidebar = Element(self._calls)
+
+    @staticmethod
+    def cache_resource(func):
+        return func
+
+    @staticmethod
+    def cache_data(func):
+        return func
+
+    @staticmethod
+    def fragment(func=None, **kwargs):
+        return func if func is not None else (lambda inner: inner)
+
+    def button(self, *args, **kwargs):
+        self._calls.append(("button", args, kwargs))
+        return False
+
+    def rendered(self, name):
+        return [args[0] for called, args, _ in self._calls if called == name and args]
+
+
+def _import_demo(monkeypatch):
+    st = FakeStreamlit()
+    monkeypatch.setitem(sys.modules, "streamlit", st)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("LLM_PROVIDER", raising=False)
+    sys.modules.pop("streamlit_app", None)
+    return importlib.import_module("streamlit_app"), st
+
+
+@pytest.fixture
+def demo(monkeypatch):
+    yield _import_demo(monkeypatch)
+    sys.modules.pop("streamlit_app", None)
+
+
+def test_multi_agent_demo_runs_every_agent_to_completion(demo):
+    streamlit_app, st = demo
+    streamlit_app.initialize_session_state()
+    streamlit_app.run_multi_agent_demo("Hi, I sell vegetables in Kawangware and need more stock")
+
+    assert set(st.session_state.agent_status.values()) == {"complete"}
+    progress = st.session_state.task_progress
+    assert not progress["B1"]  # no photos were sent
+    assert all(progress[task] for task in ("E4a", "E4b", "E6", "B4", "L3", "L5"))
+    assert any("All agents finished" in text for text in st.rendered("text"))
+    assert not st.rendered("error")
+
+
+def test_journey_chat_fragment_draws_only_messages_since_the_full_run(demo):
+    streamlit_app, st = demo
+    streamlit_app.initialize_session_state()
+    st.session_state.conversation_history = [
+        {"role": "user", "content": f"earlier message {i}"} for i in range(20)]
+
+    streamlit_app.render_customer_journey()
+    assert sum("earlier message" in text for text in st.rendered("markdown")) == 20
+
+    # A widget interaction reruns only the chat fragment
+    st._calls.clear()
+    streamlit_app.add_customer_message("new message")
+    streamlit_app.render_journey_chat()
+    drawn = [text for text in st.rendered("markdown") if "message" in text]
+    assert drawn == ["new message"]
+
+
+def test_multi_agent_demo_runs_without_the_agent_package(monkeypatch):
+    """When lucy_multi_agent cannot be imported the demo falls back to a canned reply"""
+    monkeypatch.setitem(sys.modules, "lucy_multi_agent.crew", None)
+    streamlit_app, st = _import_demo(monkeypatch)
+    try:
+        streamlit_app.initialize_session_state()
+        streamlit_app.run_multi_agent_demo("Hi, I sell vegetables")
+    finally:
+        sys.modules.pop("streamlit_app", None)
+
+    assert "Demo mode: Hi, I sell vegetables" in st.rendered("markdown")
+    assert not st.rendered("error")
@@ -3,56 +3,173 @@ Lucy 2.0 Multi-Agent Crew - Demonstrating Specialized Agent Benefits
 """
 
 import os
-from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Optional
 
-def create_lucy_crew(customer_message: str = "", customer_photos: list = None, location: str = "") -> str:
-    """
-    Lucy 2.0 Multi-Agent Workflow - CrewAI Cloud Compatible
-    """
+AGENTS = ("photo_verifier", "business_coach", "underwriter")
+
+# on_progress(agent, status) with status "active" or "complete"; called from worker threads
+ProgressCallback = Callable[[str, str], None]
+# on_token(agent, text) with each piece of an agent's output as it is generated
+TokenCallback = Callable[[str, str], None]
+
+@dataclass
+class CrewBackend:
+    """What create_lucy_crew runs the agents on; build once with load_backend and reuse"""
+    crew: Any = None  # CrewAI crew, when CrewAI and an API key are available
+    llm: Any = None  # Offline fake model under LLM_PROVIDER=fake
+    error: str = ""  # Why the simulated workflow is used instead
+
+def load_backend() -> CrewBackend:
+    """Resolve the agent backend: the fake LLM, a CrewAI crew, or the simulation"""
+    
+    # LLM_PROVIDER=fake runs the agents against the deterministic offline model
+    if os.getenv("LLM_PROVIDER", "").lower() == "fake":
+        try:
+            from langchain_lucy.fake_llm import FakeChatModel
+            return CrewBackend(llm=FakeChatModel.from_env())
+        except ImportError as e:
+            return CrewBackend(error=str(e))
     
     # Try to use actual CrewAI first, fallback to demonstration
     try:
         # Check if we can import CrewAI properly
         from crewai import Crew
-        import os
         
         # Check for required environment variables
         if not os.getenv("OPENAI_API_KEY"):
             raise ValueError("OPENAI_API_KEY not found")
         
         # Try to create actual CrewAI crew
-        crew = Crew(
+        return CrewBackend(crew=Crew(
             agents_config='config/agents.yaml',
             tasks_config='config/tasks.yaml',
             verbose=True
-        )
-        
-        # Run the crew with inputs
-        inputs = {
-            'customer_message': customer_message,
-            'customer_photos': customer_photos or [],
-            'location': location
-        }
-        
-        result = crew.kickoff(inputs=inputs)
-        return f"🤖 **CrewAI Multi-Agent Result:**\n\n{str(result)}"
-        
+        ))
     except Exception as e:
-        # Fallback to demonstration mode
-        return simulate_multi_agent_workflow(
-            customer_message=customer_message,
-            customer_photos=customer_photos or [],
-            location=location,
-            error_info=str(e)
-        )
-
-def simulate_multi_agent_workflow(customer_message: str, customer_photos: list, location: str, error_info: str = "") -> str:
+        return CrewBackend(error=str(e))
+
+def create_lucy_crew(customer_message: str = "", customer_photos: list = None, location: str = "",
+                     on_progress: Optional[ProgressCallback] = None, backend: Optional[CrewBackend] = None,
+                     on_token: Optional[TokenCallback] = None) -> str:
+    """
+    Lucy 2.0 Multi-Agent Workflow - CrewAI Cloud Compatible
+    """
+    backend = backend or load_backend()
+    error_info = backend.error
+    
+    if backend.llm is not None:
+        return run_fake_crew(customer_message, customer_photos or [], location, on_progress, backend.llm, on_token)
+    
+    if backend.crew is not None:
+        try:
+            # Run the crew with inputs
+            inputs = {
+                'customer_message': customer_message,
+                'customer_photos': customer_photos or [],
+                'location': location
+            }
+            
+            # The crew runs as one kickoff, so every agent is active for its duration
+            for agent in AGENTS:
+                _report(on_progress, agent, "active")
+            # A shared crew is copied per run so concurrent kickoffs keep separate task state
+            result = backend.crew.copy().kickoff(inputs=inputs)
+            for agent in AGENTS:
+                _report(on_progress, agent, "complete")
+            return f"🤖 **CrewAI Multi-Agent Result:**\n\n{str(result)}"
+        except Exception as e:
+            error_info = str(e)
+    
+    # Fallback to demonstration mode
+    return simulate_multi_agent_workflow(
+        customer_message=customer_message,
+        customer_photos=customer_photos or [],
+        location=location,
+        error_info=error_info,
+        on_progress=on_progress,
+        on_token=on_token
+    )
+
+def _report(on_progress: Optional[ProgressCallback], agent: str, status: str):
+    if on_progress is not None:
+        on_progress(agent, status)
+
+def simulated_outputs(customer_message: str, customer_photos: list) -> Dict[str, str]:
+    """Each agent's demonstration output"""
+    return {
+        "photo_verifier": simulate_photo_verifier(customer_photos),
+        "business_coach": simulate_business_coach(customer_message),
+        "underwriter": simulate_underwriter(customer_message)
+    }
+
+def run_agents(customer_message: str, customer_photos: list, llm: Any = None,
+               on_progress: Optional[ProgressCallback] = None,
+               on_token: Optional[TokenCallback] = None) -> Dict[str, str]:
+    """Run the three agents concurrently and return each one's section
+    
+    The agents work from the same customer input and do not read each other's
+    output, so the run takes as long as the slowest agent rather than the sum.
+    Without an llm the simulated outputs are returned directly; with one they
+    are its canned replies, so the model only adds latency. With on_token the
+    model is streamed and each piece is reported as it arrives.
+    """
+    outputs = simulated_outputs(customer_message, customer_photos)
+    
+    def run(agent: str) -> str:
+        _report(on_progress, agent, "active")
+        try:
+            if llm is None:
+                _report(on_token, agent, outputs[agent])
+                return outputs[agent]
+            bound = llm.bind_agent(agent, [outputs[agent]])
+            if on_token is None:
+                return bound.invoke(customer_message).content
+            pieces = []
+            for chunk in bound.stream(customer_message):
+                pieces.append(chunk.content)
+                on_token(agent, chunk.content)
+            return "".join(pieces)
+        finally:
+            _report(on_progress, agent, "complete")
+    
+    with ThreadPoolExecutor(len(AGENTS), thread_name_prefix="lucy-agent") as pool:
+        futures = {agent: pool.submit(run, agent) for agent in AGENTS}
+        return {agent: future.result() for agent, future in futures.items()}
+
+def run_fake_crew(customer_message: str, customer_photos: list, location: str,
+                  on_progress: Optional[ProgressCallback] = None, llm: Any = None,
+                  on_token: Optional[TokenCallback] = None) -> str:
+    """Run the three agents against the fake LLM (see langchain_lucy/fake_llm.py)"""
+    if llm is None:
+        from langchain_lucy.fake_llm import FakeChatModel
+        llm = FakeChatModel.from_env()
+    
+    # Canned replies are the simulated agent outputs; the fake adds the latency profile
+    sections = run_agents(customer_message, customer_photos, llm, on_progress, on_token)
+    return format_multi_agent_result(
+        customer_message,
+        sections["photo_verifier"],
+        sections["business_coach"],
+        sections["underwriter"]
+    )
+
+def simulate_multi_agent_workflow(customer_message: str, customer_photos: list, location: str, error_info: str = "",
+                                  on_progress: Optional[ProgressCallback] = None,
+                                  on_token: Optional[TokenCallback] = None) -> str:
     """Simulate the multi-agent workflow benefits"""
     
     # Simulate agent specialization
-    photo_analysis = simulate_photo_verifier(customer_photos)
-    coaching_insights = simulate_business_coach(customer_message) 
-    underwriting_assessment = simulate_underwriter(customer_message)
+    sections = run_agents(customer_message, customer_photos, on_progress=on_progress, on_token=on_token)
+    
+    return format_multi_agent_result(
+        customer_message, sections["photo_verifier"], sections["business_coach"], sections["underwriter"], error_info
+    )
+
+def format_multi_agent_result(customer_message: str, photo_analysis: str, coaching_insights: str,
+                              underwriting_assessment: str, error_info: str = "") -> str:
+    """Assemble the per-agent sections into Lucy's multi-agent report"""
     
     return f"""🤖 **Lucy 2.0 Multi-Agent System Demo**
 
@@ -6,7 +6,10 @@ Interactive Streamlit App demonstrating multi-agent benefits over single-agent a
 import streamlit as st
 import time
 import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from types import SimpleNamespace
 from typing import Dict, List, Any
 import sys
 import os
@@ -15,13 +18,19 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 try:
-    from lucy_multi_agent.crew import create_lucy_crew, simulate_multi_agent_workflow
+    from lucy_multi_agent.crew import create_lucy_crew, simulate_multi_agent_workflow, load_backend
     from lucy_multi_agent.crew import simulate_photo_verifier, simulate_business_coach, simulate_underwriter
 except ImportError:
     # Fallback if imports fail
-    def create_lucy_crew(customer_message=""):
+    def create_lucy_crew(customer_message="", customer_photos=None, location="", on_progress=None, backend=None,
+                         on_token=None):
         return f"Demo mode: {customer_message}"
 
+    def load_backend():
+        return SimpleNamespace(crew=None, llm=None, error="lucy_multi_agent is not importable")
+
+from langchain_lucy.pricing import price_offer, PricedOffer
+
 # Page configuration
 st.set_page_config(
     page_title="Lucy 2.0 Multi-Agent Demo",
@@ -73,6 +82,25 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_crew_backend(llm_provider: str, has_api_key: bool):
+    """Agent backend (LLM client or CrewAI crew) built once and shared by every session and rerun
+
+    The arguments are only the cache key: load_backend reads the environment
+    itself, and a simulation fallback cached while OPENAI_API_KEY was missing
+    is replaced once the key is set.
+    """
+    return load_backend()
+
+def current_crew_backend():
+    """The cached backend for the current LLM_PROVIDER and OPENAI_API_KEY"""
+    return get_crew_backend(os.getenv("LLM_PROVIDER", "").lower(), bool(os.getenv("OPENAI_API_KEY")))
+
+@st.cache_data
+def get_priced_offer(daily_sales: float) -> PricedOffer:
+    """Offer terms for a daily sales figure, memoized across reruns"""
+    return price_offer(daily_sales)
+
 def initialize_session_state():
     """Initialize session state variables"""
     if 'messages' not in st.session_state:
@@ -106,6 +134,8 @@ def initialize_session_state():
         }
     if 'conversation_history' not in st.session_state:
         st.session_state.conversation_history = []
+    if 'journey_rendered' not in st.session_state:
+        st.session_state.journey_rendered = 0
 
 def render_header():
     """Render the main header"""
@@ -124,50 +154,43 @@ def render_header():
     with col4:
         st.markdown('<div class="metrics-card"><h3>95%</h3><p>Quality Consistency</p></div>', unsafe_allow_html=True)
 
+# Agent card contents and the critical-path tasks each agent completes
+AGENT_CARDS = {
+    'photo_verifier': ("📸 PhotoVerifier Agent", "<strong>Task:</strong> B1 - Photo Analysis",
+                       "Authenticity, Stock Density, Photo Income Notes"),
+    'business_coach': ("💡 BusinessCoach Agent", "<strong>Tasks:</strong> E4a, E4b, E6 - Relationship & Goals",
+                       "Outside-in Coaching, Asset Creation"),
+    'underwriter': ("📊 Underwriter Agent", "<strong>Tasks:</strong> B4, L3, L5 - Risk & Loans",
+                    "Risk Assessment, Loan Structuring"),
+}
+AGENT_TASKS = {
+    'photo_verifier': ['B1'],
+    'business_coach': ['E4a', 'E4b', 'E6'],
+    'underwriter': ['B4', 'L3', 'L5'],
+}
+
+def render_agent_card(agent_name: str, container=None):
+    """Render one agent's status card (into a placeholder when given)"""
+    title, tasks, specialization = AGENT_CARDS[agent_name]
+    status = st.session_state.agent_status[agent_name]
+    card_class = f"agent-card agent-{status}" if status != 'waiting' else "agent-card"
+    
+    (container or st).markdown(f"""
+    <div class="{card_class}">
+        <h4>{title}</h4>
+        <p>{tasks}</p>
+        <p><strong>Status:</strong> {status.title()}</p>
+        <p><strong>Specialization:</strong> {specialization}</p>
+    </div>
+    """, unsafe_allow_html=True)
+
 def render_agent_status():
     """Render agent status cards"""
     st.subheader("🔍 Agent Activity Dashboard")
     
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        status = st.session_state.agent_status['photo_verifier']
-        card_class = f"agent-card agent-{status}" if status != 'waiting' else "agent-card"
-        
-        st.markdown(f"""
-        <div class="{card_class}">
-            <h4>📸 PhotoVerifier Agent</h4>
-            <p><strong>Task:</strong> B1 - Photo Analysis</p>
-            <p><strong>Status:</strong> {status.title()}</p>
-            <p><strong>Specialization:</strong> Authenticity, Stock Density, Photo Income Notes</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        status = st.session_state.agent_status['business_coach']
-        card_class = f"agent-card agent-{status}" if status != 'waiting' else "agent-card"
-        
-        st.markdown(f"""
-        <div class="{card_class}">
-            <h4>💡 BusinessCoach Agent</h4>
-            <p><strong>Tasks:</strong> E4a, E4b, E6 - Relationship & Goals</p>
-            <p><strong>Status:</strong> {status.title()}</p>
-            <p><strong>Specialization:</strong> Outside-in Coaching, Asset Creation</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        status = st.session_state.agent_status['underwriter']
-        card_class = f"agent-card agent-{status}" if status != 'waiting' else "agent-card"
-        
-        st.markdown(f"""
-        <div class="{card_class}">
-            <h4>📊 Underwriter Agent</h4>
-            <p><strong>Tasks:</strong> B4, L3, L5 - Risk & Loans</p>
-            <p><strong>Status:</strong> {status.title()}</p>
-            <p><strong>Specialization:</strong> Risk Assessment, Loan Structuring</p>
-        </div>
-        """, unsafe_allow_html=True)
+    for column, agent_name in zip(st.columns(3), AGENT_CARDS):
+        with column:
+            render_agent_card(agent_name)
 
 def render_task_progress():
     """Render critical path task progress"""
@@ -240,24 +263,6 @@ def render_comparison_view():
         </div>
         """, unsafe_allow_html=True)
 
-def simulate_agent_work(agent_name: str, duration: int = 2):
-    """Simulate agent working with progress indication"""
-    st.session_state.agent_status[agent_name] = 'active'
-    
-    # Create a progress bar for the agent
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for i in range(duration * 10):
-        progress = (i + 1) / (duration * 10)
-        progress_bar.progress(progress)
-        status_text.text(f"{agent_name.replace('_', ' ').title()} working... {progress:.0%}")
-        time.sleep(0.1)
-    
-    st.session_state.agent_status[agent_name] = 'complete'
-    status_text.text(f"{agent_name.replace('_', ' ').title()} completed!")
-    progress_bar.empty()
-
 def render_chat_interface():
     """Render the main chat interface"""
     st.subheader("💬 Interactive Demo")
@@ -298,40 +303,98 @@ def render_chat_interface():
             show_langfuse_demo()
 
 def run_multi_agent_demo(message: str, photos: List = None):
-    """Run the multi-agent demonstration"""
+    """Run the multi-agent demonstration
+
+    Status and token events from the agents are drawn as they arrive. With a
+    CrewAI backend the crew is one sequential kickoff that reports no per-agent
+    progress, so all three agents show as active until it returns and the
+    output appears at the end.
+    """
+    backend = current_crew_backend()
     st.success("🤖 Starting Multi-Agent Processing...")
     
     # Show real-time agent activity
     with st.expander("🔍 Real-Time Agent Activity", expanded=True):
-        if photos:
-            st.write("📸 **PhotoVerifier Agent**: Analyzing uploaded photos...")
-            simulate_agent_work('photo_verifier', 3)
-            st.session_state.task_progress['B1'] = True
-        
-        st.write("💡 **BusinessCoach Agent**: Building rapport and setting goals...")
-        simulate_agent_work('business_coach', 4)
-        st.session_state.task_progress['E4a'] = True
-        st.session_state.task_progress['E4b'] = True
-        st.session_state.task_progress['E6'] = True
-        
-        st.write("📊 **Underwriter Agent**: Assessing risk and structuring loan...")
-        simulate_agent_work('underwriter', 3)
-        st.session_state.task_progress['B4'] = True
-        st.session_state.task_progress['L3'] = True
-        st.session_state.task_progress['L5'] = True
-    
-    # Generate and display results
+        for agent_name in AGENT_CARDS:
+            st.session_state.agent_status[agent_name] = 'waiting'
+        cards = {agent_name: column.empty() for column, agent_name in zip(st.columns(3), AGENT_CARDS)}
+        for agent_name, card in cards.items():
+            render_agent_card(agent_name, card)
+        progress_bar = st.progress(0)
+        status_text = st.empty()
+        if backend.crew is not None and backend.llm is None:
+            st.caption("CrewAI runs the agents in one sequential kickoff: all three stay active "
+                       "until it finishes, and their output appears at the end.")
+    
+    # Each agent's section fills in as its tokens arrive
     st.subheader("📄 Multi-Agent System Output")
-    
-    try:
-        result = create_lucy_crew(
+    output = st.empty()
+    with output.container():
+        sections = {}
+        for agent_name, (title, _, _) in AGENT_CARDS.items():
+            st.markdown(f"#### {title}")
+            sections[agent_name] = st.empty()
+    streamed = {agent_name: "" for agent_name in AGENT_CARDS}
+    
+    # The agents run concurrently in the crew; their callbacks fire on worker
+    # threads, so they only queue events and this thread updates the page
+    events = queue.Queue()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(1, thread_name_prefix="lucy-crew") as pool:
+        run = pool.submit(
+            create_lucy_crew,
             customer_message=message,
             customer_photos=photos or [],
-            location="Kawangware"
+            location="Kawangware",
+            backend=backend,
+            on_progress=lambda agent_name, status: events.put(('status', agent_name, status)),
+            on_token=lambda agent_name, text: events.put(('token', agent_name, text))
         )
-        st.markdown(result)
+        completed = 0
+        finished = False
+        while not finished:
+            try:
+                batch = [events.get(timeout=0.1)]
+            except queue.Empty:
+                if not run.done():
+                    continue
+                # The run may have queued its last events after the timeout; drain them below
+                batch, finished = [], True
+            # Take everything already queued so each section redraws once per batch, not per token
+            while True:
+                try:
+                    batch.append(events.get_nowait())
+                except queue.Empty:
+                    break
+            changed = set()
+            for kind, agent_name, value in batch:
+                if kind == 'token':
+                    streamed[agent_name] += value
+                    changed.add(agent_name)
+                    continue
+                st.session_state.agent_status[agent_name] = value
+                render_agent_card(agent_name, cards[agent_name])
+                label = agent_name.replace('_', ' ').title()
+                if value == 'complete':
+                    completed += 1
+                    progress_bar.progress(completed / len(AGENT_CARDS))
+                    status_text.text(f"{label} completed!")
+                    for task in AGENT_TASKS[agent_name]:
+                        # B1 needs photos; without them the PhotoVerifier only states its requirements
+                        if task != 'B1' or photos:
+                            st.session_state.task_progress[task] = True
+                else:
+                    status_text.text(f"{label} working...")
+            for agent_name in changed:
+                sections[agent_name].markdown(streamed[agent_name] + " ▌")
+    progress_bar.empty()
+    status_text.text(f"All agents finished in {time.perf_counter() - started:.1f}s")
+    
+    # Swap the live sections for the assembled report
+    try:
+        output.markdown(run.result())
     except Exception as e:
-        st.error(f"Demo error: {e}")
+        output.error(f"Demo error: {e}")
         st.markdown("**Demo Result**: Multi-agent system processing complete!")
 
 def reset_demo():
@@ -346,7 +409,7 @@ def reset_demo():
         'E6': False, 'B4': False, 'L3': False, 'L5': False
     }
     st.success("🔄 Demo reset successfully!")
-    st.experimental_rerun()
+    st.rerun()
 
 def show_langfuse_demo():
     """Show Langfuse tracing demonstration"""
@@ -419,28 +482,8 @@ def render_sidebar():
     
     # Show different info based on demo mode
     if demo_mode == "customer_journey":
-        st.sidebar.subheader("🗺️ Journey Progress")
-        journey_steps = ['B1', 'E4a', 'E4b', 'B4', 'E6', 'L3', 'L5', 'OFFER']
-        current_step = st.session_state.journey_step
-        current_index = journey_steps.index(current_step) if current_step in journey_steps else 0
-        
-        for i, step in enumerate(journey_steps):
-            if i < current_index:
-                st.sidebar.success(f"✅ {step} - Complete")
-            elif i == current_index:
-                st.sidebar.info(f"➡️ {step} - Current")
-            else:
-                st.sidebar.write(f"⏳ {step} - Pending")
-        
-        st.sidebar.markdown("---")
-        st.sidebar.subheader("📊 Current Data")
-        data = st.session_state.customer_data
-        if data.get('location'):
-            st.sidebar.write(f"📍 {data['location']}")
-        if data.get('business_type'):
-            st.sidebar.write(f"🏪 {data['business_type']}")  
-        if data.get('sales_data', {}).get('daily_sales'):
-            st.sidebar.write(f"💰 {data['sales_data']['daily_sales']:,} KES/day")
+        with st.sidebar:
+            render_journey_sidebar()
     
     else:
         # Information section
@@ -466,23 +509,42 @@ def render_sidebar():
         - **Deployment:** Streamlit Cloud
         """)
 
-def render_customer_journey():
-    """Render the customer journey experience"""
-    st.subheader("👤 Experience Lucy 2.0 as a Customer")
-    
-    col1, col2 = st.columns([3, 1])
-    with col1:
-        st.markdown("Go through the actual Lucy workflow step-by-step as if you were applying for a loan.")
-    with col2:
-        if st.button("🔄 Start Over", key="reset_journey"):
-            reset_customer_journey()
+JOURNEY_STEPS = ['B1', 'E4a', 'E4b', 'B4', 'E6', 'L3', 'L5', 'OFFER']
+
+# The chat pane is a fragment: widget interactions inside it rerun only that
+# pane. A step change reruns the whole page, which is when the progress and
+# sidebar panes redraw; they have nothing to update in between
+
+def render_journey_sidebar():
+    """Sidebar journey progress and collected data (call inside `with st.sidebar`)"""
+    st.subheader("🗺️ Journey Progress")
+    current_step = st.session_state.journey_step
+    current_index = JOURNEY_STEPS.index(current_step) if current_step in JOURNEY_STEPS else 0
     
-    # Progress indicator
-    journey_steps = ['B1', 'E4a', 'E4b', 'B4', 'E6', 'L3', 'L5', 'OFFER']
-    current_index = journey_steps.index(st.session_state.journey_step)
+    for i, step in enumerate(JOURNEY_STEPS):
+        if i < current_index:
+            st.success(f"✅ {step} - Complete")
+        elif i == current_index:
+            st.info(f"➡️ {step} - Current")
+        else:
+            st.write(f"⏳ {step} - Pending")
     
-    progress_cols = st.columns(len(journey_steps))
-    for i, step in enumerate(journey_steps):
+    st.markdown("---")
+    st.subheader("📊 Current Data")
+    data = st.session_state.customer_data
+    if data.get('location'):
+        st.write(f"📍 {data['location']}")
+    if data.get('business_type'):
+        st.write(f"🏪 {data['business_type']}")  
+    if data.get('sales_data', {}).get('daily_sales'):
+        st.write(f"💰 {data['sales_data']['daily_sales']:,} KES/day")
+
+def render_journey_progress():
+    """Step indicator and progress bar for the journey"""
+    current_index = JOURNEY_STEPS.index(st.session_state.journey_step)
+    
+    progress_cols = st.columns(len(JOURNEY_STEPS))
+    for i, step in enumerate(JOURNEY_STEPS):
         with progress_cols[i]:
             if i < current_index:
                 st.success(f"✅ {step}")
@@ -491,22 +553,54 @@ def render_customer_journey():
             else:
                 st.write(f"⏳ {step}")
     
-    st.progress(current_index / (len(journey_steps) - 1))
-    
-    # Conversation history
-    st.subheader("💬 Conversation with Lucy")
-    
-    # Display conversation history
-    for message in st.session_state.conversation_history:
+    st.progress(current_index / (len(JOURNEY_STEPS) - 1))
+
+def render_chat_messages(messages: List[Dict[str, Any]]):
+    """Draw conversation messages as chat bubbles"""
+    for message in messages:
         if message['role'] == 'assistant':
             with st.chat_message("assistant", avatar="🤖"):
                 st.markdown(message['content'])
         else:
             with st.chat_message("user", avatar="👤"):
                 st.markdown(message['content'])
+
+@st.fragment
+def render_journey_chat():
+    """Messages added since the last full run, then the current step's inputs
+
+    Earlier messages are drawn once per full run by render_customer_journey and
+    stay on the page while this fragment reruns, so widget interactions do not
+    replay the whole conversation.
+    """
+    new_messages = st.container()
     
     # Current step interface
     render_current_journey_step()
+    
+    with new_messages:
+        render_chat_messages(st.session_state.conversation_history[st.session_state.journey_rendered:])
+
+def render_customer_journey():
+    """Render the customer journey experience"""
+    st.subheader("👤 Experience Lucy 2.0 as a Customer")
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown("Go through the actual Lucy workflow step-by-step as if you were applying for a loan.")
+    with col2:
+        if st.button("🔄 Start Over", key="reset_journey"):
+            reset_customer_journey()
+    
+    # Progress indicator
+    render_journey_progress()
+    
+    # Conversation so far, then the live chat pane
+    st.subheader("💬 Conversation with Lucy")
+    history = st.session_state.conversation_history
+    render_chat_messages(history)
+    st.session_state.journey_rendered = len(history)
+    render_journey_chat()
 
 def reset_customer_journey():
     """Reset the customer journey to start over"""
@@ -566,10 +660,11 @@ def add_customer_message(content: str):
     })
 
 def advance_to_step(next_step: str):
-    """Advance to the next step in the journey"""
+    """Advance to the next step in the journey (called from the chat pane)"""
     st.session_state.journey_step = next_step
     if next_step in st.session_state.task_progress:
         st.session_state.task_progress[next_step] = True
+    # A full rerun, so the progress and sidebar panes show the new step
     st.rerun()
 
 def render_step_b1():
@@ -935,21 +1030,13 @@ def render_loan_offer():
     # Calculate loan offer based on collected data
     data = st.session_state.customer_data
     daily_sales = data.get('sales_data', {}).get('daily_sales', 1000)
-    monthly_gross = daily_sales * 26
-    monthly_net = monthly_gross * 0.6  # 40% COGS
-    
-    # Basic loan calculation (20% of net monthly income)
-    base_amount = max(10000, int(monthly_net * 0.2))
-    loan_amount = min(50000, base_amount)  # Cap at 50K for first loans
-    
-    # Round to nearest 500
-    loan_amount = round(loan_amount / 500) * 500
+    priced = get_priced_offer(daily_sales)
+    monthly_net = priced.monthly_net
+    loan_amount = priced.loan_amount
     
     # Terms
-    tenure_days = 30
-    daily_rate = 0.006  # 0.6%
-    total_interest = loan_amount * daily_rate * tenure_days
-    total_due = loan_amount + total_interest
+    tenure_days = priced.tenure_days
+    total_due = priced.total_due
     
     # Due date (30 days from now)
     from datetime import datetime, timedelta